@@ -0,0 +1,32 @@
+"""Add indexes for the most used access paths
+
+Revision ID: 5c2e9a7d41b3
+Revises: 1daa250ee6c3
+Create Date: 2026-10-18 12:00:00.000000
+
+"""
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision = '5c2e9a7d41b3'
+down_revision = '1daa250ee6c3'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.create_index('ix_meal_records_trip_day_meal_product', 'meal_records',
+                    ['trip_id', 'day_number', 'meal_number', 'product_id'])
+    op.create_index('ix_tripaccess_trip_user', 'tripaccess', ['trip_id', 'user_id'])
+    op.create_index('ix_sharinglinks_expiration_date', 'sharinglinks', ['expiration_date'])
+    op.create_index('ix_passwordlinks_expiration_date', 'passwordlinks', ['expiration_date'])
+    op.create_index('ix_users_login', 'users', ['login'])
+
+
+def downgrade() -> None:
+    op.drop_index('ix_users_login', 'users')
+    op.drop_index('ix_passwordlinks_expiration_date', 'passwordlinks')
+    op.drop_index('ix_sharinglinks_expiration_date', 'sharinglinks')
+    op.drop_index('ix_tripaccess_trip_user', 'tripaccess')
+    op.drop_index('ix_meal_records_trip_day_meal_product', 'meal_records')
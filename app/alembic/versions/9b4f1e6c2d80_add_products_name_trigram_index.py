@@ -0,0 +1,26 @@
+"""Add trigram index for products search
+
+Revision ID: 9b4f1e6c2d80
+Revises: 5c2e9a7d41b3
+Create Date: 2026-10-18 13:00:00.000000
+
+"""
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision = '9b4f1e6c2d80'
+down_revision = '5c2e9a7d41b3'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.execute('CREATE EXTENSION IF NOT EXISTS pg_trgm')
+    op.create_index('ix_products_name_trgm', 'products', ['name'],
+                    postgresql_using='gin',
+                    postgresql_ops={'name': 'gin_trgm_ops'})
+
+
+def downgrade() -> None:
+    op.drop_index('ix_products_name_trgm', 'products')
@@ -0,0 +1,47 @@
+"""Make meal records unique per trip, day, meal and product
+
+Revision ID: a4d6e8f0b2c1
+Revises: e1f8b3a6c5d2
+Create Date: 2026-10-18 16:00:00.000000
+
+"""
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision = 'a4d6e8f0b2c1'
+down_revision = 'e1f8b3a6c5d2'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    # merge duplicates into the first record, day totals stay the same
+    op.execute(
+        'UPDATE meal_records SET mass = ('
+        '    SELECT SUM(duplicates.mass) FROM meal_records AS duplicates'
+        '    WHERE duplicates.trip_id = meal_records.trip_id'
+        '    AND duplicates.day_number = meal_records.day_number'
+        '    AND duplicates.meal_number = meal_records.meal_number'
+        '    AND duplicates.product_id = meal_records.product_id'
+        ') WHERE id IN ('
+        '    SELECT MIN(id) FROM meal_records'
+        '    GROUP BY trip_id, day_number, meal_number, product_id'
+        '    HAVING COUNT(*) > 1'
+        ')'
+    )
+    op.execute(
+        'DELETE FROM meal_records WHERE id NOT IN ('
+        '    SELECT MIN(id) FROM meal_records'
+        '    GROUP BY trip_id, day_number, meal_number, product_id'
+        ')'
+    )
+    op.drop_index('ix_meal_records_trip_day_meal_product', 'meal_records')
+    op.create_index('ix_meal_records_trip_day_meal_product', 'meal_records',
+                    ['trip_id', 'day_number', 'meal_number', 'product_id'], unique=True)
+
+
+def downgrade() -> None:
+    op.drop_index('ix_meal_records_trip_day_meal_product', 'meal_records')
+    op.create_index('ix_meal_records_trip_day_meal_product', 'meal_records',
+                    ['trip_id', 'day_number', 'meal_number', 'product_id'])
@@ -0,0 +1,41 @@
+"""Add background jobs table
+
+Revision ID: b7e2c9d4f1a3
+Revises: a4d6e8f0b2c1
+Create Date: 2026-10-18 17:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'b7e2c9d4f1a3'
+down_revision = 'a4d6e8f0b2c1'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.create_table('jobs',
+                    sa.Column('id', sa.Integer(), nullable=False),
+                    sa.Column('kind', sa.String(), nullable=False),
+                    sa.Column('payload', sa.String(), nullable=False),
+                    sa.Column('status',
+                              sa.Enum('Pending', 'Running', 'Done', 'Failed', name='jobstatus'),
+                              nullable=False),
+                    sa.Column('attempts', sa.Integer(), nullable=False),
+                    sa.Column('run_at', sa.DateTime(), nullable=False),
+                    sa.Column('created_at', sa.DateTime(), nullable=False),
+                    sa.Column('started_at', sa.DateTime(), nullable=True),
+                    sa.Column('finished_at', sa.DateTime(), nullable=True),
+                    sa.Column('last_error', sa.String(), nullable=True),
+                    sa.PrimaryKeyConstraint('id')
+                    )
+    op.create_index('ix_jobs_status_run_at', 'jobs', ['status', 'run_at'])
+
+
+def downgrade() -> None:
+    op.drop_index('ix_jobs_status_run_at', 'jobs')
+    op.drop_table('jobs')
+    sa.Enum(name='jobstatus').drop(op.get_bind())
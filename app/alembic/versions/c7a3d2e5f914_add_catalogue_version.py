@@ -0,0 +1,29 @@
+"""Add products catalogue version
+
+Revision ID: c7a3d2e5f914
+Revises: 9b4f1e6c2d80
+Create Date: 2026-10-18 14:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'c7a3d2e5f914'
+down_revision = '9b4f1e6c2d80'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.create_table('catalogue_version',
+                    sa.Column('id', sa.Integer(), nullable=False),
+                    sa.Column('version', sa.Integer(), nullable=False),
+                    sa.PrimaryKeyConstraint('id')
+                    )
+    op.execute('INSERT INTO catalogue_version (id, version) VALUES (1, 0)')
+
+
+def downgrade() -> None:
+    op.drop_table('catalogue_version')
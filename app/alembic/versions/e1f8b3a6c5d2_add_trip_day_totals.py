@@ -0,0 +1,47 @@
+"""Add precalculated trip day totals
+
+Revision ID: e1f8b3a6c5d2
+Revises: c7a3d2e5f914
+Create Date: 2026-10-18 15:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'e1f8b3a6c5d2'
+down_revision = 'c7a3d2e5f914'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.create_table('trip_day_totals',
+                    sa.Column('trip_id', sa.Integer(), nullable=False),
+                    sa.Column('day_number', sa.Integer(), nullable=False),
+                    sa.Column('meal_number', sa.Integer(), nullable=False),
+                    sa.Column('calories', sa.Float(), nullable=False),
+                    sa.Column('proteins', sa.Float(), nullable=False),
+                    sa.Column('fats', sa.Float(), nullable=False),
+                    sa.Column('carbs', sa.Float(), nullable=False),
+                    sa.Column('mass', sa.Float(), nullable=False),
+                    sa.ForeignKeyConstraint(['trip_id'], ['trips.id'], ),
+                    sa.PrimaryKeyConstraint('trip_id', 'day_number', 'meal_number')
+                    )
+    op.execute('''
+        INSERT INTO trip_day_totals
+            (trip_id, day_number, meal_number, calories, proteins, fats, carbs, mass)
+        SELECT meal_records.trip_id, meal_records.day_number, meal_records.meal_number,
+               SUM(products.calories * meal_records.mass / 100.0),
+               SUM(products.proteins * meal_records.mass / 100.0),
+               SUM(products.fats * meal_records.mass / 100.0),
+               SUM(products.carbs * meal_records.mass / 100.0),
+               SUM(meal_records.mass)
+        FROM meal_records JOIN products ON products.id = meal_records.product_id
+        GROUP BY meal_records.trip_id, meal_records.day_number, meal_records.meal_number
+    ''')
+
+
+def downgrade() -> None:
+    op.drop_table('trip_day_totals')
@@ -0,0 +1,53 @@
+# Gunicorn settings, every one of them can be overridden from the environment.
+#
+# GUNICORN_WORKER_CLASS selects the serving mode:
+#   sync    - one request per process at a time (default)
+#   gthread - GUNICORN_THREADS requests per process, blocking calls (DB, Brevo,
+#             VK, reCAPTCHA) release the GIL, so it needs no extra dependencies
+#   gevent  - GUNICORN_WORKER_CONNECTIONS greenlets per process, requires the
+#             gevent and psycogreen packages to be installed
+import os
+
+bind = os.environ.get('GUNICORN_BIND', '0.0.0.0:8000')
+worker_class = os.environ.get('GUNICORN_WORKER_CLASS', 'sync')
+workers = int(os.environ.get('GUNICORN_WORKERS', 4))
+threads = int(os.environ.get('GUNICORN_THREADS', 8 if worker_class == 'gthread' else 1))
+worker_connections = int(os.environ.get('GUNICORN_WORKER_CONNECTIONS', 200))
+timeout = int(os.environ.get('GUNICORN_TIMEOUT', 30))
+keepalive = int(os.environ.get('GUNICORN_KEEPALIVE', 5))
+accesslog = '-'
+errorlog = '-'
+
+# every concurrent request of a worker may hold a database connection, the
+# pool is sized for them unless it is configured explicitly, but greenlets
+# have to queue for connections so postgres max_connections is not exceeded
+concurrency = worker_connections if worker_class == 'gevent' else threads
+os.environ.setdefault('DATABASE_POOL_SIZE', str(min(max(concurrency, 5), 20)))
+os.environ.setdefault('HTTP_POOL_SIZE', str(max(concurrency, 10)))
+
+# per worker metrics snapshots, see organizer.utils.metrics
+os.environ.setdefault('METRICS_DIR', '/tmp/organizer-metrics')
+
+
+def metrics_store():
+    from organizer.utils.metrics import MetricsStore
+    return MetricsStore(os.environ['METRICS_DIR'])
+
+
+def on_starting(server):
+    # metrics of workers from previous runs must not be reported
+    metrics_store().clear()
+
+
+def child_exit(server, worker):
+    # counters of the worker are kept, so they never go back
+    metrics_store().retire(worker.pid)
+
+
+def post_fork(server, worker):
+    if worker_class != 'gevent':
+        return
+
+    # psycopg2 blocks the whole process unless it cooperates with gevent
+    from psycogreen.gevent import patch_psycopg
+    patch_psycopg()
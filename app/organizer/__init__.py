@@ -38,6 +38,36 @@ def create_app(test_config=None):
     app.config.from_mapping(
         SECRET_KEY=secret_key,
         DATABASE=db_url,
+        DATABASE_POOL_SIZE=int(os.environ.get('DATABASE_POOL_SIZE', 5)),
+        DATABASE_MAX_OVERFLOW=int(os.environ.get('DATABASE_MAX_OVERFLOW', 10)),
+        DATABASE_POOL_RECYCLE=int(os.environ.get('DATABASE_POOL_RECYCLE', 1800)),
+        DATABASE_POOL_PRE_PING=os.environ.get('DATABASE_POOL_PRE_PING', '1') == '1',
+        LAST_SEEN_UPDATE_INTERVAL=int(os.environ.get('LAST_SEEN_UPDATE_INTERVAL', 300)),
+        LAST_SEEN_FLUSH_INTERVAL=int(os.environ.get('LAST_SEEN_FLUSH_INTERVAL', 60)),
+        USER_CACHE_TTL=int(os.environ.get('USER_CACHE_TTL', 60)),
+        USER_CACHE_SIZE=int(os.environ.get('USER_CACHE_SIZE', 10000)),
+        PRODUCTS_COUNT_CACHE_TTL=int(os.environ.get('PRODUCTS_COUNT_CACHE_TTL', 60)),
+        PRODUCTS_COUNT_CACHE_SIZE=int(os.environ.get('PRODUCTS_COUNT_CACHE_SIZE', 1024)),
+        REPORT_CACHE=os.environ.get('REPORT_CACHE', 'memory'),
+        REPORT_CACHE_SIZE=int(os.environ.get('REPORT_CACHE_SIZE', 256)),
+        SQL_STATS_LOG=os.environ.get('SQL_STATS_LOG', '0') == '1',
+        SQL_STATS_SERVER_TIMING=os.environ.get('SQL_STATS_SERVER_TIMING', '0') == '1',
+        SQL_REPEATED_THRESHOLD=int(os.environ.get('SQL_REPEATED_THRESHOLD', 5)),
+        METRICS_DIR=os.environ.get('METRICS_DIR', os.path.join(app.instance_path, 'metrics')),
+        METRICS_FLUSH_INTERVAL=int(os.environ.get('METRICS_FLUSH_INTERVAL', 5)),
+        METRICS_TOKEN=os.environ.get('METRICS_TOKEN', None),
+        JOBS_RUN_INLINE=os.environ.get('JOBS_RUN_INLINE', '0') == '1',
+        JOBS_MAX_ATTEMPTS=int(os.environ.get('JOBS_MAX_ATTEMPTS', 5)),
+        JOBS_RETRY_DELAY=int(os.environ.get('JOBS_RETRY_DELAY', 30)),
+        JOBS_TIMEOUT=int(os.environ.get('JOBS_TIMEOUT', 600)),
+        LINK_CLEANUP_INTERVAL=int(os.environ.get('LINK_CLEANUP_INTERVAL', 0)),
+        LINK_CLEANUP_BATCH_SIZE=int(os.environ.get('LINK_CLEANUP_BATCH_SIZE', 1000)),
+        HTTP_POOL_SIZE=int(os.environ.get('HTTP_POOL_SIZE', 10)),
+        HTTP_BREAKER_THRESHOLD=int(os.environ.get('HTTP_BREAKER_THRESHOLD', 5)),
+        HTTP_BREAKER_COOLDOWN=int(os.environ.get('HTTP_BREAKER_COOLDOWN', 30)),
+        BREVO_API_URL=os.environ.get('BREVO_API_URL', 'https://api.brevo.com/v3/smtp/email'),
+        VK_OAUTH_URL=os.environ.get('VK_OAUTH_URL', 'https://oauth.vk.com'),
+        VK_API_URL=os.environ.get('VK_API_URL', 'https://api.vk.com/method'),
         PERMANENT_SESSION_LIFETIME=session_lifetime,
         SERVER_NAME=server_name,
         SESSION_COOKIE_SECURE=True,
@@ -81,6 +111,33 @@ def create_app(test_config=None):
     from . import db
     db.init_app(app)
 
+    from . import bench
+    bench.init_app(app)
+
+    from .utils import last_seen
+    last_seen.init_app(app)
+
+    from .utils import user_cache
+    user_cache.init_app(app)
+
+    from .utils import report_cache
+    report_cache.init_app(app)
+
+    from .utils import sql_stats
+    sql_stats.init_app(app)
+
+    from .utils import metrics as request_metrics
+    request_metrics.init_app(app)
+
+    from .utils import http
+    http.init_app(app)
+
+    from .utils import jobs
+    jobs.init_app(app)
+
+    from .utils import link_cleanup
+    link_cleanup.init_app(app)
+
     from . import auth
     app.register_blueprint(auth.bp)
 
@@ -90,6 +147,9 @@ def create_app(test_config=None):
     from . import api
     app.register_blueprint(api.BP)
 
+    from . import metrics
+    app.register_blueprint(metrics.bp)
+
     @app.context_processor
     def inject_props():
         from . import schema
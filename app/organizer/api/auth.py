@@ -15,7 +15,7 @@ from organizer.db import create_user, get_session
 from organizer.schema import AccessGroup, PasswordLink, User
 from organizer.strings import STRING_TABLE
 from organizer.utils.auth import is_captcha_enabled, check_captcha
-from organizer.utils.email import send_email
+from organizer.utils.jobs import enqueue_job
 
 BP = Blueprint('auth', __name__, url_prefix='/auth')
 
@@ -29,7 +29,7 @@ def user():
         'displayed_name': g.user.displayed_name,
         'access_group': g.user.access_group.name,
         'user_type': g.user.user_type.name,
-        'photo_url': g.user.photo_url if 'photo_url' in g.user._fields else None
+        'photo_url': g.user.photo_url
     }
 
 
@@ -119,21 +119,16 @@ def forgot():
         uuid = str(uuid4())
         session.add(PasswordLink(uuid=uuid,
                                  user_id=user.id))
-        session.commit()
 
-    # send a link via send-in-blue
-    if 'BREVO_API_KEY' in current_app.config:
-        reset_link = url_for('auth.reset', token=uuid, _external=True, _scheme='https')
-        email_body = render_template('reset_password_email.html', sitename=current_app.config['SERVER_NAME'], reset_link=reset_link)
-        try:
-            send_email(form_login,
-                    STRING_TABLE['Forgot email subject'],
-                    email_body)
-        except RuntimeError:
-            data = json.dumps({
-                'message': STRING_TABLE['Forgot email error']
-            })
-            return Response(data, status=422, content_type='application/json')
+        # send a link via send-in-blue out of the request
+        if 'BREVO_API_KEY' in current_app.config:
+            reset_link = url_for('auth.reset', token=uuid, _external=True, _scheme='https')
+            email_body = render_template('reset_password_email.html', sitename=current_app.config['SERVER_NAME'], reset_link=reset_link)
+            enqueue_job(session, 'email',
+                        address=form_login,
+                        subject=STRING_TABLE['Forgot email subject'],
+                        body=email_body)
+        session.commit()
 
     return {
         'message': STRING_TABLE['Forgot ok']
@@ -150,9 +145,7 @@ def reset():
         abort(400)
 
     with get_session() as session:
-        session.query(PasswordLink).filter(PasswordLink.expiration_date < current_time).delete()
-        session.commit()
-
+        # other expired links are purged by a maintenance task, see utils.link_cleanup
         link = session.query(PasswordLink).filter(PasswordLink.uuid == token).first()
         if not link:
             abort(400)
@@ -160,6 +153,9 @@ def reset():
         session.delete(link)
         session.commit()
 
+        if link.expiration_date < current_time:
+            abort(400)
+
         user = session.query(User).filter(User.id == link.user_id).one()
         user.password = generate_password_hash(password)
         session.commit()
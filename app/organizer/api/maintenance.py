@@ -1,8 +1,8 @@
-from flask import Blueprint, g, abort
+from flask import Blueprint, abort
 from sqlalchemy import text, select, func
 
 from organizer.auth import api_login_required_group
-from organizer.db import get_session
+from organizer.db import get_engine, get_session
 from organizer.schema import AccessGroup, Product, MealRecord, Trip
 
 BP = Blueprint("maintenance", __name__, url_prefix="/maintenance")
@@ -11,7 +11,7 @@ BP = Blueprint("maintenance", __name__, url_prefix="/maintenance")
 @BP.post("/vacuum")
 @api_login_required_group(AccessGroup.Administrator)
 def vacuum():
-    with g.engine.connect() as connection:
+    with get_engine().connect() as connection:
         connection.execution_options(isolation_level="AUTOCOMMIT")
         connection.execute(text("VACUUM (FULL, ANALYZE)"))
 
@@ -1,15 +1,19 @@
-from collections import defaultdict
-from datetime import datetime, date, timedelta, timezone
+from datetime import date, timedelta
 from typing import Any
 import math
 
-from flask import Blueprint, abort, request, url_for, g
-from sqlalchemy import update, select
+from flask import Blueprint, abort, request, url_for
+from sqlalchemy import delete, literal, or_, select, union_all
+from sqlalchemy.orm import Session
 
 from organizer.auth import api_login_required_group
 from organizer.db import get_session
-from organizer.schema import AccessGroup, Trip, MealRecord, Product, Units
-from organizer.utils.auth import user_has_trip_access
+from organizer.schema import AccessGroup, MealRecord, TripDayTotal, Units
+from organizer.utils.auth import get_trip_info, require_trip
+from organizer.utils.catalogue import get_catalogue
+from organizer.utils.conditional import touch_trip, trip_conditional_get
+from organizer.utils.day_totals import TOTALS_COLUMNS, add_day_totals, refresh_day_totals
+from organizer.utils.upsert import insert_or_increment
 
 BP = Blueprint('meals', __name__, url_prefix='/meals')
 
@@ -38,38 +42,33 @@ def add():
 
     try:
         assert trip_uid
-        with get_session() as session:
-            trip = session.query(Trip).filter(Trip.uid == trip_uid).first()
-            assert trip
-
-            if not user_has_trip_access(trip,
-                                        g.user.id,
-                                        g.user.access_group == AccessGroup.Administrator,
-                                        session):
-                abort(403)
-
-            diff = trip.till_date - trip.from_date
-            day_number = int(day_number)
-            assert day_number > 0
-            assert day_number <= diff.days + 1
-
         assert meal_name in meals_map
 
+        day_number = int(day_number)
         mass = int(mass)
         assert mass > 0
 
         unit = int(unit)
         assert unit in [x.value for x in Units]
+
+        product_id = int(json['product_id'])
     except (ValueError, AssertionError):
         return {"result": False}
 
-    product_id = json['product_id']
+    # five statements: the trip with the access, the catalogue version, the
+    # meal and totals upserts and the trip touch
     with get_session() as session:
-        product = session.execute(
-            select(Product.id, Product.grams)
-            .where(Product.id == product_id, Product.archived == False)
-        ).first()
+        trip = get_trip_info(session, trip_uid)
+        if not trip:
+            return {'result': False}
+
+        if not trip.has_access:
+            abort(403)
+
+        if not 0 < day_number <= trip.days_count:
+            return {'result': False}
 
+        product = get_catalogue(session).get_active(product_id)
         if not product:
             return {'result': False}
 
@@ -79,30 +78,25 @@ def add():
             if unit != Units.GRAMMS.value:
                 return {'result': False}
         elif unit == Units.PIECES.value:
-            mass = grams * mass
+            mass = int(grams * mass)
 
         meal_number = meals_map[meal_name]
 
-        existing_record = session.query(MealRecord).filter(MealRecord.trip_id == trip.id,
-                                                           MealRecord.product_id == product.id,
-                                                           MealRecord.day_number == day_number,
-                                                           MealRecord.meal_number == meal_number).first()
-        if existing_record:
-            existing_record.mass += mass
-        else:
-            session.add(MealRecord(trip_id=trip.id,
-                                   product_id=product.id,
-                                   day_number=day_number,
-                                   meal_number=meal_number,
-                                   mass=mass))
-        session.commit()
-
-        # update the last time trip was touched
+        # concurrent additions of the same product are merged by the database
         session.execute(
-            update(Trip)
-            .where(Trip.id == trip.id)
-            .values(last_update=datetime.now(timezone.utc))
+            insert_or_increment(session, MealRecord,
+                                ['trip_id', 'day_number', 'meal_number', 'product_id'], ['mass']),
+            {
+                'trip_id': trip.id,
+                'product_id': product.id,
+                'day_number': day_number,
+                'meal_number': meal_number,
+                'mass': mass,
+            }
         )
+        add_day_totals(session, trip.id, day_number, meal_number, product, mass)
+
+        touch_trip(session, trip.id)
         session.commit()
         return {'result': True}
 
@@ -132,19 +126,11 @@ def edit():
         if not meal_info:
             abort(400)
 
-        trip = session.execute(
-            select(Trip).where(Trip.id == meal_info.trip_id)
-        ).scalar_one()
-
-        if not user_has_trip_access(trip,
-                                    g.user.id,
-                                    g.user.access_group == AccessGroup.Administrator,
-                                    session):
-            abort(403)
+        trip = require_trip(session, trip_id=meal_info.trip_id, edit=True)
 
-        product = session.execute(
-            select(Product).where(Product.id == meal_info.product_id)
-        ).scalar_one()
+        product = get_catalogue(session).get(meal_info.product_id)
+        if not product:
+            abort(400)
 
         if product.grams is not None:
             meal_info.mass = int(mass * product.grams)
@@ -152,7 +138,8 @@ def edit():
             if unit == Units.PIECES.value:
                 abort(400)
             meal_info.mass = mass
-        trip.last_update = datetime.now(timezone.utc)
+        refresh_day_totals(session, [trip.id], [meal_info.day_number])
+        touch_trip(session, trip.id)
         session.commit()
 
     return {'result': True}
@@ -170,21 +157,16 @@ def remove():
         abort(400)
 
     with get_session() as session:
-        meal_info = session.query(MealRecord.trip_id).filter(MealRecord.id == meal_id).first()
+        meal_info = session.query(MealRecord.trip_id, MealRecord.day_number).filter(
+            MealRecord.id == meal_id).first()
         if not meal_info:
             return {'result': False}
 
-        trip = session.query(Trip).filter(Trip.id == meal_info.trip_id).one()
-        if not user_has_trip_access(trip,
-                                    g.user.id,
-                                    g.user.access_group == AccessGroup.Administrator,
-                                    session):
-            abort(403)
+        trip = require_trip(session, trip_id=meal_info.trip_id, edit=True)
 
         session.query(MealRecord).filter(MealRecord.id == meal_id).delete()
-        session.commit()
-
-        trip.last_update = datetime.now(timezone.utc)
+        refresh_day_totals(session, [trip.id], [meal_info.day_number])
+        touch_trip(session, trip.id)
         session.commit()
         return {'result': True}
 
@@ -203,84 +185,78 @@ def clear():
         abort(400)
 
     with get_session() as session:
-        trip = session.query(Trip).filter(Trip.uid == trip_uid).first()
-        if not trip:
-            abort(404)
-
-        if not user_has_trip_access(trip,
-                                    g.user.id,
-                                    g.user.access_group == AccessGroup.Administrator,
-                                    session):
-            abort(403)
+        trip = require_trip(session, trip_uid, edit=True)
 
         session.query(MealRecord).filter(MealRecord.trip_id == trip.id,
                                          MealRecord.day_number == day_number).delete()
-        trip.last_update = datetime.now(timezone.utc)
+        refresh_day_totals(session, [trip.id], [day_number])
+        touch_trip(session, trip.id)
         session.commit()
 
     return {'result': True}
 
 
-def extract_meals(trip_id: int, day_number: int):
-    with get_session() as session:
-        meals_info = session.execute(
-            select(
-                MealRecord.id,
-                MealRecord.trip_id,
-                MealRecord.meal_number,
-                MealRecord.product_id,
-                MealRecord.mass,
-                Product.name,
-                Product.calories,
-                Product.proteins,
-                Product.fats,
-                Product.carbs
-            )
-            .join(Product)
-            .where(MealRecord.trip_id == trip_id, MealRecord.day_number == day_number)
-            .order_by(MealRecord.id)
-        ).all()
-        meals_map = {
-            0: 'breakfast',
-            1: 'lunch',
-            2: 'dinner',
-            3: 'snacks'
-        }
+MEALS_MAP = {
+    0: 'breakfast',
+    1: 'lunch',
+    2: 'dinner',
+    3: 'snacks'
+}
 
-        output: dict[str, list[Any]] = {}
-        for val in meals_map.values():
-            output[val] = []
-
-        for meal_info in meals_info:
-            meal_record = {
-                'id': meal_info.id,
-                'name': meal_info.name,
-                'mass': meal_info.mass,
-                'calories': meal_info.calories * meal_info.mass / 100.0,
-                'proteins': meal_info.proteins * meal_info.mass / 100.0,
-                'fats': meal_info.fats * meal_info.mass / 100.0,
-                'carbs': meal_info.carbs * meal_info.mass / 100.0,
-                'product_id': meal_info.product_id
-            }
-            output[meals_map[meal_info.meal_number]].append(meal_record)
-        return output
+
+def extract_meals_by_day(session: Session, trip_id: int, first_day: int, last_day: int):
+    meals_info = session.execute(
+        select(
+            MealRecord.id,
+            MealRecord.day_number,
+            MealRecord.meal_number,
+            MealRecord.product_id,
+            MealRecord.mass
+        )
+        .where(MealRecord.trip_id == trip_id,
+               MealRecord.day_number >= first_day,
+               MealRecord.day_number <= last_day)
+        .order_by(MealRecord.day_number, MealRecord.id)
+    ).all()
+
+    output: dict[int, dict[str, list[Any]]] = {}
+    for day_number in range(first_day, last_day + 1):
+        output[day_number] = {val: [] for val in MEALS_MAP.values()}
+
+    catalogue = get_catalogue(session)
+    for meal_info in meals_info:
+        product = catalogue.get(meal_info.product_id)
+        if not product:
+            # the catalogue is read after the records, so it has all of their products
+            abort(500)
+        meal_record = {
+            'id': meal_info.id,
+            'name': product.name,
+            'mass': meal_info.mass,
+            'calories': product.calories * meal_info.mass / 100.0,
+            'proteins': product.proteins * meal_info.mass / 100.0,
+            'fats': product.fats * meal_info.mass / 100.0,
+            'carbs': product.carbs * meal_info.mass / 100.0,
+            'product_id': meal_info.product_id
+        }
+        output[meal_info.day_number][MEALS_MAP[meal_info.meal_number]].append(meal_record)
+    return output
 
 
 @BP.get('/<trip_uid>')
 @api_login_required_group(AccessGroup.User)
+@trip_conditional_get()
 def get(trip_uid: str):
     with get_session() as session:
-        trip = session.query(Trip).filter(Trip.uid == trip_uid).first()
-        if not trip:
-            abort(404)
-
-        days_count = (trip.till_date - trip.from_date).days + 1
+        trip = require_trip(session, trip_uid)
+        days_count = trip.days_count
+        meals = extract_meals_by_day(session, trip.id, 1, days_count)
 
     days = [
         {
             'number': i + 1,
             'date': format_date(trip.from_date, i + 1),
-            'meals': extract_meals(trip.id, i + 1),
+            'meals': meals[i + 1],
             'reload_link': url_for('api.meals.get_day_meals', trip_uid=trip.uid, day_number=i + 1)
         } for i in range(days_count)
     ]
@@ -289,109 +265,328 @@ def get(trip_uid: str):
 
 @BP.get('/<trip_uid>/<int:day_number>')
 @api_login_required_group(AccessGroup.User)
+@trip_conditional_get()
 def get_day_meals(trip_uid: str, day_number: int):
     with get_session() as session:
-        trip = session.query(Trip).filter(Trip.uid == trip_uid).first()
-        if not trip:
+        trip = require_trip(session, trip_uid)
+        if day_number > trip.days_count or day_number < 1:
             abort(404)
 
-        days_count = (trip.till_date - trip.from_date).days + 1
-        if day_number > days_count or day_number < 1:
-            abort(404)
+        meals = extract_meals_by_day(session, trip.id, day_number, day_number)
 
         return {
             'day': {
                 'number': day_number,
                 'date': format_date(trip.from_date, day_number),
-                'meals': extract_meals(trip.id, day_number),
+                'meals': meals[day_number],
                 'reload_link': url_for('api.meals.get_day_meals', trip_uid=trip.uid, day_number=day_number)
             }
         }
 
 
-@BP.post('/<trip_uid>/cycle')
+@BP.get('/<trip_uid>/totals')
 @api_login_required_group(AccessGroup.User)
-def cycle(trip_uid: str):
+@trip_conditional_get()
+def get_totals(trip_uid: str):
     with get_session() as session:
-        trip = session.query(Trip).filter(Trip.uid == trip_uid).first()
-        if not trip:
-            return abort(404)
+        trip = require_trip(session, trip_uid)
+        days_count = trip.days_count
+        totals = session.execute(
+            select(TripDayTotal)
+            .where(TripDayTotal.trip_id == trip.id, TripDayTotal.day_number <= days_count)
+        ).scalars().all()
 
-        if not user_has_trip_access(trip,
-                                    g.user.id,
-                                    g.user.access_group == AccessGroup.Administrator,
-                                    session):
-            return abort(403)
+    def empty_totals():
+        return {column: 0.0 for column in TOTALS_COLUMNS}
 
-    data = request.json
-    if not data:
-        return abort(400)
+    days = [
+        {
+            'number': i + 1,
+            'meals': {meal: empty_totals() for meal in MEALS_MAP.values()},
+            'total': empty_totals()
+        } for i in range(days_count)
+    ]
 
-    if 'src-start' not in data or 'src-end' not in data:
-        return abort(400)
+    for total in totals:
+        day = days[total.day_number - 1]
+        for column in TOTALS_COLUMNS:
+            day['meals'][MEALS_MAP[total.meal_number]][column] = getattr(total, column)
+            day['total'][column] += getattr(total, column)
 
-    if 'dst-start' not in data or 'dst-end' not in data:
-        return abort(400)
+    return {'days': days}
 
-    try:
-        src_start = int(data['src-start'])
-        src_end = int(data['src-end'])
-        dst_start = int(data['dst-start'])
-        dst_end = int(data['dst-end'])
-    except ValueError:
-        return abort(400)
 
-    if src_start <= 0 or src_end <= 0 or dst_start <= 0 or dst_end <= 0:
-        return abort(400)
+def ranges_conflict(first_start: int, first_end: int, second_start: int, second_end: int):
+    # ranges are touching each other
+    if first_start == second_start or first_start == second_end \
+            or first_end == second_start or first_end == second_end:
+        return True
 
-    if src_start > src_end or dst_start > dst_end:
-        return abort(400)
+    if second_start > first_start and second_start < first_end:
+        return True
 
-    # ranges are touching each other
-    if src_start == dst_start or src_start == dst_end or src_end == dst_start or src_end == dst_end:
-        return abort(400)
+    if second_end > first_start and second_end < first_end:
+        return True
 
-    if dst_start > src_start and dst_start < src_end:
-        return abort(400)
+    return second_start < first_start and second_end > first_end
 
-    if dst_end > src_start and dst_end < src_end:
-        return abort(400)
 
+def parse_cycle_ranges(data: dict[str, Any]):
+    src_start = int(data['src-start'])
+    src_end = int(data['src-end'])
+
+    if 'dst-ranges' in data:
+        dst_ranges = [(int(dst['start']), int(dst['end'])) for dst in data['dst-ranges']]
+    else:
+        dst_ranges = [(int(data['dst-start']), int(data['dst-end']))]
+
+    if src_start <= 0 or src_end <= 0 or src_start > src_end or not dst_ranges:
+        raise ValueError
+
+    for i, (dst_start, dst_end) in enumerate(dst_ranges):
+        if dst_start <= 0 or dst_end <= 0 or dst_start > dst_end:
+            raise ValueError
+
+        if ranges_conflict(src_start, src_end, dst_start, dst_end):
+            raise ValueError
+
+        for other_start, other_end in dst_ranges[:i]:
+            if ranges_conflict(other_start, other_end, dst_start, dst_end):
+                raise ValueError
+
+    return src_start, src_end, dst_ranges
+
+
+# sqlite allows up to 500 terms in a compound SELECT
+CYCLE_MAPPING_CHUNK_SIZE = 250
+
+
+def cycle_day_mappings(src_start: int, src_end: int, dst_ranges: list[tuple[int, int]]):
+    '''
+    Builds (src_day, dst_day) relations repeating the source days over
+    destinations, split to stay within the sqlite limit of compound SELECT terms.
+    '''
     src_days_count = src_end - src_start + 1
+    days = [
+        (src_start + (day_number - dst_start) % src_days_count, day_number)
+        for dst_start, dst_end in dst_ranges
+        for day_number in range(dst_start, dst_end + 1)
+    ]
+    return [
+        union_all(*(
+            select(literal(src_day).label('src_day'), literal(dst_day).label('dst_day'))
+            for src_day, dst_day in days[chunk_start:chunk_start + CYCLE_MAPPING_CHUNK_SIZE]
+        )).subquery('day_mapping')
+        for chunk_start in range(0, len(days), CYCLE_MAPPING_CHUNK_SIZE)
+    ]
 
-    with get_session() as session:
-        if 'overwrite' in data and data['overwrite'] is True:
-            session.query(MealRecord).filter(MealRecord.trip_id == trip.id,
-                                             MealRecord.day_number >= dst_start,
-                                             MealRecord.day_number <= dst_end).delete()
-            session.commit()
 
-        meals_info = session.query(MealRecord).filter(
-            MealRecord.trip_id == trip.id,
-            MealRecord.day_number >= src_start,
-            MealRecord.day_number <= src_start + src_days_count).order_by(
-                MealRecord.day_number).all()
+@BP.post('/<trip_uid>/cycle')
+@api_login_required_group(AccessGroup.User)
+def cycle(trip_uid: str):
+    with get_session() as session:
+        trip = require_trip(session, trip_uid, edit=True)
 
-        meals_per_day = defaultdict(list)
-        for meal in meals_info:
-            meals_per_day[meal.day_number - src_start].append(meal)
+        data = request.json
+        if not data:
+            return abort(400)
 
-        trip_duration = (trip.till_date - trip.from_date).days + 1
+        try:
+            src_start, src_end, dst_ranges = parse_cycle_ranges(data)
+        except (KeyError, TypeError, ValueError):
+            return abort(400)
 
-        if src_end > trip_duration or dst_end > trip_duration:
+        trip_duration = trip.days_count
+        if src_end > trip_duration or any(dst_end > trip_duration for _, dst_end in dst_ranges):
             return abort(400)
 
-        for day_number in range(dst_start, dst_end + 1):
-            idx = (day_number - dst_start) % src_days_count
-            for meal in meals_per_day[idx]:
-                new_record = MealRecord(trip_id=trip.id,
-                                        product_id=meal.product_id,
-                                        day_number=day_number,
-                                        meal_number=meal.meal_number,
-                                        mass=meal.mass)
-                session.add(new_record)
+        if 'overwrite' in data and data['overwrite'] is True:
+            session.execute(
+                delete(MealRecord)
+                .where(MealRecord.trip_id == trip.id)
+                .where(or_(*(MealRecord.day_number.between(dst_start, dst_end)
+                             for dst_start, dst_end in dst_ranges)))
+            )
+
+        inserted = 0
+        for day_mapping in cycle_day_mappings(src_start, src_end, dst_ranges):
+            # products already planned for the destination days get the copied mass added
+            inserted += session.execute(
+                insert_or_increment(
+                    session, MealRecord,
+                    ['trip_id', 'day_number', 'meal_number', 'product_id'], ['mass'],
+                    columns=['trip_id', 'product_id', 'day_number', 'meal_number', 'mass'],
+                    select=select(MealRecord.trip_id,
+                                  MealRecord.product_id,
+                                  day_mapping.c.dst_day,
+                                  MealRecord.meal_number,
+                                  MealRecord.mass)
+                    .join(day_mapping, MealRecord.day_number == day_mapping.c.src_day)
+                    .where(MealRecord.trip_id == trip.id)
+                    .order_by(day_mapping.c.dst_day, MealRecord.id)
+                )
+            ).rowcount  # type: ignore
+        refresh_day_totals(session, [trip.id], [
+            day_number
+            for dst_start, dst_end in dst_ranges
+            for day_number in range(dst_start, dst_end + 1)
+        ])
+        touch_trip(session, trip.id)
         session.commit()
 
     return {
-        'result': 'ok'
+        'result': 'ok',
+        'inserted': inserted
     }
+
+
+BATCH_OPERATIONS = ('add', 'edit', 'remove')
+
+
+def parse_batch_operation(operation: Any, trip_duration: int):
+    '''Checks the operation format, data is checked against the trip later'''
+    if not isinstance(operation, dict) or operation.get('op') not in BATCH_OPERATIONS:
+        raise ValueError('Unknown operation')
+
+    if operation['op'] == 'add':
+        meal_name = operation['meal_name']
+        if meal_name not in MEALS_MAP.values():
+            raise ValueError('Unknown meal')
+        day_number = int(operation['day_number'])
+        if day_number <= 0 or day_number > trip_duration:
+            raise ValueError('Day is out of the trip')
+        mass = int(operation['mass'])
+        if mass <= 0:
+            raise ValueError('Mass must be positive')
+        unit = Units(int(operation['unit']))
+        return {
+            'op': 'add',
+            'product_id': int(operation['product_id']),
+            'day_number': day_number,
+            'meal_number': next(number for number, name in MEALS_MAP.items() if name == meal_name),
+            'mass': mass,
+            'unit': unit,
+        }
+
+    meal_id = int(operation['meal_id'])
+    if operation['op'] == 'remove':
+        return {'op': 'remove', 'meal_id': meal_id}
+
+    mass = int(operation['mass'])
+    if mass < 0:
+        raise ValueError('Mass must not be negative')
+    return {'op': 'edit', 'meal_id': meal_id, 'mass': mass, 'unit': Units(int(operation['unit']))}
+
+
+@BP.post('/<trip_uid>/batch')
+@api_login_required_group(AccessGroup.User)
+def batch(trip_uid: str):
+    '''
+    Applies an ordered list of add, edit and remove operations in a single
+    transaction. Nothing is changed if any operation is invalid, results are
+    reported for every operation.
+    '''
+    data = request.json
+    if not isinstance(data, dict) or not isinstance(data.get('operations'), list):
+        return abort(400)
+
+    with get_session() as session:
+        trip = require_trip(session, trip_uid, edit=True)
+
+        trip_duration = trip.days_count
+        operations: list[dict[str, Any] | None] = []
+        results: list[dict[str, Any]] = []
+        for operation in data['operations']:
+            try:
+                operations.append(parse_batch_operation(operation, trip_duration))
+                results.append({'result': True})
+            except (KeyError, TypeError, ValueError) as exc:
+                operations.append(None)
+                results.append({'result': False, 'error': str(exc)})
+
+        meal_ids = {operation['meal_id'] for operation in operations
+                    if operation and operation['op'] != 'add'}
+        records = session.execute(
+            select(MealRecord).where(MealRecord.trip_id == trip.id, MealRecord.id.in_(meal_ids))
+        ).scalars().all()
+        records_by_id = {record.id: record for record in records}
+        records_by_key = {
+            (record.day_number, record.meal_number, record.product_id): record
+            for record in records
+        }
+
+        catalogue = get_catalogue(session)
+        affected_days: set[int] = set()
+        for operation, result in zip(operations, results):
+            if not operation:
+                continue
+
+            if operation['op'] == 'add':
+                product = catalogue.get_active(operation['product_id'])
+                if not product:
+                    result.update({'result': False, 'error': 'Unknown product'})
+                    continue
+
+                mass = operation['mass']
+                if product.grams is None:
+                    if operation['unit'] != Units.GRAMMS:
+                        result.update({'result': False, 'error': 'Product can not be measured in pieces'})
+                        continue
+                elif operation['unit'] == Units.PIECES:
+                    mass = int(product.grams * mass)
+
+                # merged by the database like in add, pending changes are flushed before
+                result['meal_id'] = session.execute(
+                    insert_or_increment(session, MealRecord,
+                                        ['trip_id', 'day_number', 'meal_number', 'product_id'], ['mass'])
+                    .returning(MealRecord.id),
+                    {
+                        'trip_id': trip.id,
+                        'product_id': product.id,
+                        'day_number': operation['day_number'],
+                        'meal_number': operation['meal_number'],
+                        'mass': mass,
+                    }
+                ).scalar_one()
+                merged = records_by_key.get((operation['day_number'], operation['meal_number'], product.id))
+                if merged:
+                    session.expire(merged)
+                affected_days.add(operation['day_number'])
+                continue
+
+            record = records_by_id.get(operation['meal_id'])
+            if not record:
+                result.update({'result': False, 'error': 'Unknown meal'})
+                continue
+
+            if operation['op'] == 'remove':
+                # deleted right away, the same product may be added again later in the batch
+                session.delete(record)
+                session.flush()
+                del records_by_id[record.id]
+                records_by_key.pop((record.day_number, record.meal_number, record.product_id), None)
+            else:
+                product = catalogue.get(record.product_id)
+                if not product:
+                    result.update({'result': False, 'error': 'Unknown product'})
+                    continue
+                if product.grams is not None:
+                    record.mass = int(operation['mass'] * product.grams)
+                elif operation['unit'] == Units.PIECES:
+                    result.update({'result': False, 'error': 'Product can not be measured in pieces'})
+                    continue
+                else:
+                    record.mass = operation['mass']
+            affected_days.add(record.day_number)
+
+        if not all(result['result'] for result in results):
+            session.rollback()
+            for result in results:
+                result.pop('meal_id', None)
+            return {'result': False, 'operations': results}
+
+        refresh_day_totals(session, [trip.id], affected_days)
+        touch_trip(session, trip.id)
+        session.commit()
+
+    return {'result': True, 'operations': results}
@@ -1,14 +1,17 @@
 import math
 from typing import Final
 
-from flask import Blueprint, request, url_for, abort
+from flask import Blueprint, current_app, request, url_for, abort
 from sentry_sdk import capture_exception
-from sqlalchemy import select, func
+from sqlalchemy import and_, case, func, literal, or_, select
 
 from organizer.auth import api_login_required_group
 from organizer.db import get_session
 from organizer.schema import Product, Units, AccessGroup
 from organizer.strings import STRING_TABLE
+from organizer.utils.catalogue import bump_catalogue_version, get_catalogue
+from organizer.utils.day_totals import refresh_product_day_totals
+from organizer.utils.ttl_cache import TTLCache
 
 
 BP = Blueprint('products', __name__, url_prefix='/products')
@@ -57,6 +60,31 @@ def check_input_data(json_data: dict):
             raise RuntimeError(STRING_TABLE['Products error incorrect grams'])
 
 
+def get_count_cache() -> TTLCache:
+    return current_app.extensions.setdefault(
+        'products_count_cache', TTLCache(current_app.config['PRODUCTS_COUNT_CACHE_TTL'],
+                                         current_app.config['PRODUCTS_COUNT_CACHE_SIZE'])
+    )
+
+
+def search_rank(search_request: str):
+    '''Ranks matches by position: name prefix, word prefix, anywhere else'''
+    if not search_request:
+        return literal(0)
+
+    # both sides are lowered by the database, sqlite lower() keeps non-ASCII letters as is
+    return case(
+        (Product.name.istartswith(search_request, autoescape=True), 0),
+        (Product.name.icontains(' ' + search_request, autoescape=True), 1),
+        else_=2
+    )
+
+
+def parse_cursor(cursor: str) -> tuple[int, int]:
+    rank, product_id = cursor.split(':')
+    return int(rank), int(product_id)
+
+
 @BP.get('/search')
 @api_login_required_group(AccessGroup.User)
 def search():
@@ -64,29 +92,52 @@ def search():
     page = int(request.args.get('page', 0))
     search_request = request.args.get('search', '')
 
-    with get_session() as session:
-        products_selector = select(Product).where(Product.archived == False)
-        products_count_selector = (
-            select(func.count()).select_from(Product).where(Product.archived == False)
-        )
+    after = None
+    if 'after' in request.args:
+        try:
+            after = parse_cursor(request.args['after'])
+        except ValueError:
+            abort(400)
 
-        if search_request:
-            search_pattern = Product.name.ilike(f"%{search_request}%")
-            products_selector = products_selector.where(search_pattern)
-            products_count_selector = products_count_selector.where(search_pattern)
+    rank = search_rank(search_request).label('rank')
+    filters = [Product.archived == False]
+    if search_request:
+        filters.append(Product.name.icontains(search_request, autoescape=True))
+
+    with get_session() as session:
+        products_selector = select(Product, rank).where(*filters)
+        if after is not None:
+            # keyset pagination, continues right after the last shown product
+            after_rank, after_id = after
+            products_selector = products_selector.where(
+                or_(rank > after_rank, and_(rank == after_rank, Product.id > after_id))
+            )
+        else:
+            products_selector = products_selector.offset(page * products_per_page)
 
         products = session.execute(
             products_selector
-            .order_by(Product.id)
-            .offset(page * products_per_page)
+            .order_by(rank, Product.id)
             .limit(products_per_page)
-        ).scalars()
-        products_count = session.execute(products_count_selector).scalar_one()
+        ).all()
+
+        count_cache = get_count_cache()
+        products_count = count_cache.get(search_request)
+        if products_count is None:
+            products_count = session.execute(
+                select(func.count()).select_from(Product).where(*filters)
+            ).scalar_one()
+            count_cache.put(search_request, products_count)
+
+        next_cursor = None
+        if len(products) == products_per_page:
+            next_cursor = f'{products[-1].rank}:{products[-1].Product.id}'
 
         return {
             'page': page,
             'products_per_page': products_per_page,
             'total_count': products_count,
+            'next': next_cursor,
             'products': [
                 {
                     'id': product.id,
@@ -98,7 +149,7 @@ def search():
                     'grams': product.grams,
                     'edit_link': url_for('api.products.edit', product_id=product.id),
                     'archive_link': url_for('api.products.archive', product_id=product.id)
-                } for product in products
+                } for product, _ in products
             ]
         }
 
@@ -106,11 +157,13 @@ def search():
 @BP.get('/units')
 @api_login_required_group(AccessGroup.User)
 def product_units():
-    product_id = request.args['id']
+    try:
+        product_id = int(request.args['id'])
+    except ValueError:
+        return {'result': False}
 
     with get_session() as session:
-        product = session.query(Product).filter(Product.id == product_id,
-                                                Product.archived == False).first()
+        product = get_catalogue(session).get_active(product_id)
 
         if not product:
             return {'result': False}
@@ -157,7 +210,9 @@ def add():
                        proteins=proteins, fats=fats,
                        carbs=carbs, grams=grams)
         session.add(prod)
+        bump_catalogue_version(session)
         session.commit()
+    get_count_cache().clear()
 
     return {
         'result': True
@@ -200,7 +255,10 @@ def edit(product_id: int):
         prod.fats = fats
         prod.carbs = carbs
         prod.grams = grams
+        bump_catalogue_version(session)
+        refresh_product_day_totals(session, product_id)
         session.commit()
+    get_count_cache().clear()
 
     return {
         'result': True
@@ -216,7 +274,9 @@ def archive(product_id: int):
             abort(404)
 
         prod.archived = True
+        bump_catalogue_version(session)
         session.commit()
+    get_count_cache().clear()
 
     return {
         'result': True
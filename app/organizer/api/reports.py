@@ -1,74 +1,98 @@
 from collections import defaultdict
 from typing import Any, Literal
 
-from flask import Blueprint, abort
-from sqlalchemy import select
+from flask import Blueprint, abort, request
+from sqlalchemy import and_, or_, select
 from sqlalchemy.sql import func
 
 from organizer.auth import api_login_required_group
 from organizer.db import get_session
-from organizer.schema import AccessGroup, Group, MealRecord, Product, Trip
+from organizer.schema import AccessGroup, Group, MealRecord, Trip
+from organizer.utils.auth import require_trip
+from organizer.utils.catalogue import get_catalogue
+from organizer.utils.conditional import trip_conditional_get
+from organizer.utils.report_cache import cached_report
 
 BP = Blueprint("reports", __name__, url_prefix="/reports")
 
 
 @BP.get("/shopping/<trip_uid>")
 @api_login_required_group(AccessGroup.User)
+@trip_conditional_get(extra_trips_arg="trips")
+@cached_report("shopping", extra_trips_arg="trips")
 def shopping(trip_uid: str):
+    trip_uids = [trip_uid]
+    if "trips" in request.args:
+        trip_uids += [uid for uid in request.args["trips"].split(",") if uid]
+
     with get_session() as session:
-        trip = session.execute(select(Trip).where(Trip.uid == trip_uid)).scalar()
-        if not trip:
+        trips = session.execute(select(Trip).where(Trip.uid.in_(trip_uids))).scalars().all()
+        if len(trips) != len(set(trip_uids)):
             return abort(404)
 
-        days_count = (trip.till_date - trip.from_date).days + 1
+        trip_ids = [trip.id for trip in trips]
+        persons = (
+            select(Group.trip_id, func.sum(Group.persons).label("persons"))
+            .where(Group.trip_id.in_(trip_ids))
+            .group_by(Group.trip_id)
+            .subquery()
+        )
 
-        persons_count = session.execute(
-            select(func.sum(Group.persons)).where(Group.trip_id == trip.id)
-        ).scalar()
+        # days after the end of a trip are ignored
+        days_filter = or_(
+            *(
+                and_(
+                    MealRecord.trip_id == trip.id,
+                    MealRecord.day_number <= (trip.till_date - trip.from_date).days + 1,
+                )
+                for trip in trips
+            )
+        )
 
         meals = session.execute(
-            select(MealRecord.mass, Product.id, Product.name, Product.grams)
-            .join(Product)
-            .where(MealRecord.trip_id == trip.id)
-            .where(MealRecord.day_number <= days_count)
+            select(
+                MealRecord.product_id,
+                func.sum(MealRecord.mass * persons.c.persons).label("mass"),
+            )
+            .join(persons, persons.c.trip_id == MealRecord.trip_id)
+            .where(days_filter)
+            .group_by(MealRecord.product_id)
+            .order_by(func.min(MealRecord.id))
         ).all()
+        catalogue = get_catalogue(session)
 
-    products: dict[int, dict[str, Any]] = {}
+    products: list[dict[str, Any]] = []
     for meal in meals:
-        if meal.id not in products:
-            products[meal.id] = {"id": meal.id, "name": meal.name, "mass": 0}
-            if meal.grams is not None:
-                products[meal.id]["pieces"] = 0
+        product = catalogue.get(meal.product_id)
+        if not product:
+            # the catalogue is read after the meals, so it has all of their products
+            abort(500)
+        products.append({"id": product.id, "name": product.name, "mass": meal.mass})
+        if product.grams is not None:
+            products[-1]["pieces"] = meal.mass / product.grams
 
-        products[meal.id]["mass"] += meal.mass * persons_count
-        if meal.grams is not None:
-            products[meal.id]["pieces"] += meal.mass * persons_count / meal.grams
-
-    return list(products.values())
+    return products
 
 
 @BP.get("/packing/<trip_uid>")
 @api_login_required_group(AccessGroup.User)
+@trip_conditional_get()
+@cached_report("packing")
 def packing(trip_uid: str):
     with get_session() as session:
-        trip = session.execute(select(Trip).where(Trip.uid == trip_uid)).scalar()
-        if not trip:
-            abort(404)
-
-        days_count = (trip.till_date - trip.from_date).days + 1
+        trip = require_trip(session, trip_uid)
+        days_count = trip.days_count
 
         meals = session.execute(
             select(
                 MealRecord.day_number,
                 MealRecord.meal_number,
                 MealRecord.mass,
-                Product.name,
-                Product.grams,
+                MealRecord.product_id,
             )
-            .join(Product)
             .where(MealRecord.trip_id == trip.id)
             .where(MealRecord.day_number <= days_count)
-            .order_by(MealRecord.day_number)
+            .order_by(MealRecord.day_number, MealRecord.id)
         ).all()
 
         person_groups = (
@@ -76,6 +100,7 @@ def packing(trip_uid: str):
             .scalars()
             .fetchall()
         )
+        catalogue = get_catalogue(session)
 
     products: dict[
         int,
@@ -87,17 +112,21 @@ def packing(trip_uid: str):
         ],
     ] = defaultdict(list)
     for meal in meals:
+        product = catalogue.get(meal.product_id)
+        if not product:
+            # the catalogue is read after the meals, so it has all of their products
+            abort(500)
         day: int = meal.day_number
         products[day].append(
             {
-                "name": meal.name,
+                "name": product.name,
                 "meal": meal.meal_number,
                 "mass": [meal.mass * persons for persons in person_groups],
             }
         )
 
-        if meal.grams is not None:
-            products[day][-1]["grams"] = meal.grams
+        if product.grams is not None:
+            products[day][-1]["grams"] = product.grams
 
     for arr in products.values():
         arr.sort(key=lambda x: x["meal"])
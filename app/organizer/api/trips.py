@@ -1,14 +1,12 @@
-import csv
 from datetime import datetime, timedelta, date, timezone
-import io
 import secrets
 from typing import Any
 from uuid import uuid4
 
-from flask import Blueprint, request, send_file, url_for, abort, g
+from flask import Blueprint, Response, request, stream_with_context, url_for, abort, g
 from sentry_sdk import capture_exception
-from sqlalchemy import select
-from sqlalchemy.orm import Session
+from sqlalchemy import case, func, insert, literal, or_, select, update
+from sqlalchemy.orm import Session, joinedload, selectinload
 
 from organizer.auth import api_login_required_group
 from organizer.db import get_session
@@ -22,10 +20,21 @@ from organizer.schema import (
     SharingLink,
 )
 from organizer.strings import STRING_TABLE
-from organizer.utils.auth import user_has_trip_access
+from organizer.utils.auth import require_trip
+from organizer.utils.conditional import trip_conditional_get
+from organizer.utils.day_totals import refresh_day_totals
+from organizer.utils.export import (
+    EXPORT_FORMATS,
+    stream_csv,
+    stream_json_lines,
+    stream_xlsx,
+    with_header,
+)
 
 BP = Blueprint('trips', __name__, url_prefix='/trips')
 
+DOWNLOAD_BATCH_SIZE = 500
+
 
 def gen_trip_uid(session: Session):
     while True:
@@ -35,85 +44,73 @@ def gen_trip_uid(session: Session):
             return new_uid
 
 
+def trip_query():
+    return select(Trip).options(selectinload(Trip.groups), joinedload(Trip.user))
+
+
+def serialize_trip(trip: Trip):
+    shared = False
+    if g.user.access_group != AccessGroup.Administrator:
+        if trip.created_by != g.user.id:
+            shared = True
+
+    groups = sorted(trip.groups, key=lambda group: group.group_number)
+
+    return {
+        'uid': trip.uid,
+        'trip': {
+            'name': trip.name,
+            'from_date': trip.from_date.isoformat(),
+            'till_date': trip.till_date.isoformat(),
+            'days_count': (trip.till_date - trip.from_date).days + 1,
+            'created_by': trip.created_by,
+            'last_update': trip.last_update,
+            'archived': trip.archived,
+            'groups': [group.persons for group in groups],
+            'user': trip.user.login,
+            'edit_link': url_for('api.trips.edit', trip_uid=trip.uid),
+            'copy_link': url_for('api.trips.copy', trip_uid=trip.uid),
+            'share_link': url_for('api.trips.share', trip_uid=trip.uid),
+            'archive_link': url_for('api.trips.archive', trip_uid=trip.uid),
+            'packing_link': f'/reports/packing/{trip.uid}',
+            'shopping_link': f'/reports/shopping/{trip.uid}',
+            'cycle_link': url_for('api.meals.cycle', trip_uid=trip.uid),
+            'download_link': url_for('api.trips.download', trip_uid=trip.uid),
+        },
+        'type': 'shared' if shared else 'user',
+        'attendees': sum(group.persons for group in groups),
+        'open_link': f'/meals/{trip.uid}',
+        'forget_link': url_for('trips.forget', trip_uid=trip.uid),
+    }
+
+
 def get_trip(trip_uid: str):
     with get_session() as session:
-        trip = session.query(Trip).where(Trip.uid == trip_uid).first()
+        trip = session.execute(trip_query().where(Trip.uid == trip_uid)).scalar()
         if not trip:
             abort(404)
 
-        shared = False
-        if g.user.access_group != AccessGroup.Administrator:
-            if trip.created_by != g.user.id:
-                shared = True
-
-        return {
-            'uid': trip.uid,
-            'trip': {
-                'name': trip.name,
-                'from_date': trip.from_date.isoformat(),
-                'till_date': trip.till_date.isoformat(),
-                'days_count': (trip.till_date - trip.from_date).days + 1,
-                'created_by': trip.created_by,
-                'last_update': trip.last_update,
-                'archived': trip.archived,
-                'groups': [group.persons for group in trip.groups],
-                'user': trip.user.login,
-                'edit_link': url_for('api.trips.edit', trip_uid=trip.uid),
-                'copy_link': url_for('api.trips.copy', trip_uid=trip.uid),
-                'share_link': url_for('api.trips.share', trip_uid=trip.uid),
-                'archive_link': url_for('api.trips.archive', trip_uid=trip.uid),
-                'packing_link': f'/reports/packing/{trip.uid}',
-                'shopping_link': f'/reports/shopping/{trip.uid}',
-                'cycle_link': url_for('api.meals.cycle', trip_uid=trip.uid),
-                'download_link': url_for('api.trips.download', trip_uid=trip.uid),
-            },
-            'type': 'shared' if shared else 'user',
-            'attendees': sum(group.persons for group in trip.groups),
-            'open_link': f'/meals/{trip.uid}',
-            'forget_link': url_for('trips.forget', trip_uid=trip.uid),
-        }
+        return serialize_trip(trip)
 
 
 @BP.get('/')
 @api_login_required_group(AccessGroup.User)
 def get_trips():
     with get_session() as session:
-        user_trips_req = None
-        shared_trips_req = None
-        if g.user.access_group == AccessGroup.Administrator:
-            user_trips_req = select(Trip)
-        else:
-            user_trips_req = select(Trip).where(Trip.created_by == g.user.id)
-            shared_trips_req = (
-                select(Trip.uid)
-                .join(TripAccess)
-                .where(TripAccess.user_id == g.user.id, Trip.archived == False)
-            )
-        user_trips_req = user_trips_req.where(Trip.archived == False)
-
-        user_trips = session.execute(user_trips_req).scalars()
-        shared_trips = (
-            session.execute(shared_trips_req).scalars()
-            if shared_trips_req is not None
-            else []
-        )
-
-        trips = []
-        for trip in user_trips:
-            trips.append(trip.uid)
-
-        for trip_uids in shared_trips:
-            trips.append(trip_uids)
-
-        output = []
-        for trip_uid in trips:
-            output.append(get_trip(trip_uid))
+        trips_req = trip_query().where(Trip.archived == False)
+        if g.user.access_group != AccessGroup.Administrator:
+            shared_trip_ids = select(TripAccess.trip_id).where(TripAccess.user_id == g.user.id)
+            trips_req = trips_req.where(
+                or_(Trip.created_by == g.user.id, Trip.id.in_(shared_trip_ids))
+            ).order_by(case((Trip.created_by == g.user.id, 0), else_=1))
 
-        return output
+        trips = session.execute(trips_req.order_by(Trip.id)).scalars()
+        return [serialize_trip(trip) for trip in trips]
 
 
 @BP.get('/get/<trip_uid>')
 @api_login_required_group(AccessGroup.User)
+@trip_conditional_get()
 def get_info(trip_uid: str):
     return get_trip(trip_uid)
 
@@ -122,9 +119,7 @@ def get_info(trip_uid: str):
 @api_login_required_group(AccessGroup.User)
 def share(trip_uid: str):
     with get_session() as session:
-        trip = session.query(Trip).filter(Trip.uid == trip_uid).first()
-        if not trip:
-            abort(404)
+        trip = require_trip(session, trip_uid)
 
         # it could be shared only by a creator or admin
         if (
@@ -159,15 +154,15 @@ def share(trip_uid: str):
 @api_login_required_group(AccessGroup.User)
 def archive(trip_uid: str):
     with get_session() as session:
-        trip = session.query(Trip).filter(Trip.uid == trip_uid).first()
-        if not trip:
-            abort(404)
-
+        trip = require_trip(session, trip_uid)
         if trip.created_by != g.user.id:
             abort(403)
 
-        trip.archived = True
-        trip.last_update = datetime.now(timezone.utc)
+        session.execute(
+            update(Trip)
+            .where(Trip.id == trip.id)
+            .values(archived=True, last_update=datetime.now(timezone.utc))
+        )
         session.commit()
 
     return {'status': 'ok'}
@@ -242,24 +237,20 @@ def edit(trip_uid: str):
         return abort(400)
 
     with get_session() as session:
-        trip = session.query(Trip).filter(Trip.uid == trip_uid).first()
-        if not trip:
-            abort(404)
-
-        if not user_has_trip_access(
-            trip, g.user.id, g.user.access_group == AccessGroup.Administrator, session
-        ):
-            abort(403)
-
-        trip.name = name
-        trip.from_date = from_date
-        trip.till_date = till_date
+        trip = require_trip(session, trip_uid, edit=True)
+
+        session.execute(
+            update(Trip)
+            .where(Trip.id == trip.id)
+            .values(name=name,
+                    from_date=from_date,
+                    till_date=till_date,
+                    last_update=datetime.now(timezone.utc))
+        )
 
         session.query(Group).filter(Group.trip_id == trip.id).delete()
-        for i, persons in enumerate(groups):
-            trip.groups.append(Group(group_number=i, persons=persons))
-
-        trip.last_update = datetime.now(timezone.utc)
+        session.add_all(Group(trip_id=trip.id, group_number=i, persons=persons)
+                        for i, persons in enumerate(groups))
         session.commit()
 
     return get_trip(trip_uid)
@@ -276,17 +267,7 @@ def copy(trip_uid: str):
         abort(400)
 
     with get_session() as session:
-        existing_trip = session.query(Trip).where(Trip.uid == trip_uid).first()
-        if not existing_trip:
-            abort(404)
-
-        if not user_has_trip_access(
-            existing_trip,
-            g.user.id,
-            g.user.access_group == AccessGroup.Administrator,
-            session,
-        ):
-            abort(403)
+        existing_trip = require_trip(session, trip_uid, edit=True)
 
         new_uid = gen_trip_uid(session)
         new_trip = Trip(
@@ -296,67 +277,50 @@ def copy(trip_uid: str):
             till_date=existing_trip.till_date,
             created_by=g.user.id,
         )
-
-        for i, group in enumerate(existing_trip.groups):
-            new_trip.groups.append(Group(group_number=i, persons=group.persons))
-
         session.add(new_trip)
-        session.commit()
-
-        new_id = new_trip.id
-
-        meal_records = (
-            session.query(MealRecord)
-            .where(MealRecord.trip_id == existing_trip.id)
-            .all()
+        session.flush()
+
+        # groups are renumbered from zero, like the trip edit does
+        session.execute(
+            insert(Group).from_select(
+                ['trip_id', 'group_number', 'persons'],
+                select(
+                    literal(new_trip.id),
+                    func.row_number().over(order_by=Group.group_number) - 1,
+                    Group.persons,
+                ).where(Group.trip_id == existing_trip.id),
+            )
         )
-        for meal in meal_records:
-            session.add(
-                MealRecord(
-                    trip_id=new_id,
-                    product_id=meal.product_id,
-                    day_number=meal.day_number,
-                    meal_number=meal.meal_number,
-                    mass=meal.mass,
+        session.execute(
+            insert(MealRecord).from_select(
+                ['trip_id', 'product_id', 'day_number', 'meal_number', 'mass'],
+                select(
+                    literal(new_trip.id),
+                    MealRecord.product_id,
+                    MealRecord.day_number,
+                    MealRecord.meal_number,
+                    MealRecord.mass,
                 )
+                .where(MealRecord.trip_id == existing_trip.id)
+                .order_by(MealRecord.id),
             )
+        )
+        refresh_day_totals(session, [new_trip.id])
         session.commit()
 
     return get_trip(new_uid)
 
 
-def send_csv_file(rows: list[list[Any]]):
-    file = io.StringIO()
-    writer = csv.writer(file, dialect='excel')
-    writer.writerows(rows)
-    file.seek(0, 0)
-
-    file_to_send = io.BytesIO()
-    data = file.read()
-    file_to_send.write(bytes([0xEF, 0xBB, 0xBF]))  # write BOM for Excel
-    file_to_send.write(data.encode(encoding='utf-8'))
-    file_to_send.seek(0, 0)
-
-    return send_file(
-        file_to_send,
-        mimetype='text/plain',
-        as_attachment=True,
-        download_name='data.csv',
-    )
-
-
 @BP.get('/download/<trip_uid>')
 @api_login_required_group(AccessGroup.User)
+@trip_conditional_get()
 def download(trip_uid: str):
-    csv_content = [
-        [
-            STRING_TABLE['CSV name'],
-            STRING_TABLE['CSV day'],
-            STRING_TABLE['CSV meal'],
-            STRING_TABLE['CSV mass'],
-            STRING_TABLE['CSV cals'],
-        ]
-    ]
+    export_format = request.args.get('format', 'csv')
+    if export_format not in EXPORT_FORMATS:
+        abort(400)
+
+    with get_session() as session:
+        trip = require_trip(session, trip_uid)
 
     meals_table = {
         0: STRING_TABLE['Meals breakfast title'],
@@ -365,35 +329,49 @@ def download(trip_uid: str):
         3: STRING_TABLE['Meals snacks title'],
     }
 
-    with get_session() as session:
-        trip = session.query(Trip).filter(Trip.uid == trip_uid).first()
-        if not trip:
-            abort(404)
-
-        days_count = (trip.till_date - trip.from_date).days + 1
-
-        data = session.execute(
-            select(
-                MealRecord.mass,
-                MealRecord.day_number,
-                MealRecord.meal_number,
-                Product.name,
-                Product.calories,
+    def generate_rows():
+        # rows are fetched in batches, the whole trip is never kept in memory
+        with get_session() as session:
+            records = session.execute(
+                select(
+                    MealRecord.mass,
+                    MealRecord.day_number,
+                    MealRecord.meal_number,
+                    Product.name,
+                    Product.calories,
+                )
+                .join(Product)
+                .where(MealRecord.trip_id == trip.id)
+                .where(MealRecord.day_number <= trip.days_count)
+                .order_by(MealRecord.day_number, MealRecord.meal_number, MealRecord.id)
+                .execution_options(yield_per=DOWNLOAD_BATCH_SIZE)
             )
-            .join(Product)
-            .where(MealRecord.trip_id == trip.id)
-            .where(MealRecord.day_number <= days_count)
-            .order_by(MealRecord.day_number, MealRecord.meal_number)
-        ).all()
-        for record in data:
-            csv_content.append(
-                [
+            for record in records:
+                yield [
                     record.name,
                     record.day_number,
                     meals_table[record.meal_number],
                     record.mass,
                     record.calories,
                 ]
-            )
 
-    return send_csv_file(csv_content)
+    if export_format == 'jsonl':
+        content = stream_json_lines(['name', 'day', 'meal', 'mass', 'calories'],
+                                    generate_rows())
+    else:
+        header = [
+            STRING_TABLE['CSV name'],
+            STRING_TABLE['CSV day'],
+            STRING_TABLE['CSV meal'],
+            STRING_TABLE['CSV mass'],
+            STRING_TABLE['CSV cals'],
+        ]
+        writer = stream_xlsx if export_format == 'xlsx' else stream_csv
+        content = writer(with_header(header, generate_rows()))
+
+    mimetype, download_name = EXPORT_FORMATS[export_format]
+    return Response(
+        stream_with_context(content),
+        mimetype=mimetype,
+        headers={'Content-Disposition': f'attachment; filename={download_name}'},
+    )
@@ -4,6 +4,8 @@ from werkzeug.security import generate_password_hash
 from organizer.auth import api_login_required_group
 from organizer.db import get_session
 from organizer.schema import AccessGroup, User
+from organizer.utils.last_seen import flush_last_seen
+from organizer.utils.user_cache import invalidate_cached_user
 
 BP = Blueprint("users", __name__, url_prefix="/users")
 
@@ -12,6 +14,9 @@ BP = Blueprint("users", __name__, url_prefix="/users")
 @api_login_required_group(AccessGroup.Administrator)
 def index():
     if request.method == "GET":
+        # make buffered access times visible in the listing
+        flush_last_seen()
+
         with get_session() as session:
             users = session.query(User).all()
 
@@ -97,6 +102,7 @@ def manage_user(user_id: int):
 
         user.access_group = AccessGroup[access_group]
         session.commit()
+        invalidate_cached_user(user.id)
 
         return {
             "id": user.id,
@@ -2,7 +2,6 @@ import functools
 from datetime import datetime, timedelta, timezone
 from urllib.parse import urlencode
 from typing import Any
-import requests
 
 from flask import Blueprint, render_template, request, g, redirect, url_for, \
                   session, flash, abort, current_app
@@ -12,6 +11,10 @@ from sentry_sdk import configure_scope, capture_exception
 from organizer.db import get_session
 from organizer.schema import PasswordLink, User, AccessGroup, VkUser, UserType
 from organizer.strings import STRING_TABLE
+from organizer.utils.http import http_request
+from organizer.utils.jobs import enqueue_job, job_handler
+from organizer.utils.last_seen import touch_last_seen
+from organizer.utils.user_cache import get_user_cache, invalidate_cached_user
 
 bp = Blueprint('auth', __name__, url_prefix='/auth')
 
@@ -31,11 +34,7 @@ def login_required_group(group):
                     'username': f'{name}'
                 }
 
-            # update last user login/access
-            with get_session() as sql_session:
-                user = sql_session.query(User).where(User.id == g.user.id).one()
-                user.last_logged_in = datetime.now(timezone.utc)
-                sql_session.commit()
+            touch_last_seen(g.user.id)
 
             return view(**kwargs)
         return wrapped_view_grouped
@@ -51,11 +50,7 @@ def api_login_required_group(group=None):
             if group and g.user.access_group.value < group.value:
                 abort(403)
 
-            # update last user login/access
-            with get_session() as sql_session:
-                user = sql_session.query(User).where(User.id == g.user.id).one()
-                user.last_logged_in = datetime.now(timezone.utc)
-                sql_session.commit()
+            touch_last_seen(g.user.id)
 
             return view(**kwargs)
         return api_wrapped_view_grouped
@@ -67,19 +62,25 @@ def load_logged_in_user():
     user_id = session.get('user_id')
     if user_id is None:
         g.user = None
-    else:
-        with get_session() as sql_session:
-            result = sql_session.query(User.user_type).filter(User.id == user_id).one()
-            if result.user_type == UserType.Vk:
-                result = sql_session.query(User.id, User.access_group,
-                                           User.displayed_name, User.login,
-                                           User.user_type, VkUser.photo_url).join(
-                                               VkUser).filter(User.id == user_id).one()
-            else:
-                result = sql_session.query(User.id, User.access_group,
-                                           User.displayed_name, User.login,
-                                           User.user_type).filter(User.id == user_id).one()
-            g.user = result
+        return
+
+    user_cache = get_user_cache()
+    cached_user = user_cache.get(user_id)
+    if cached_user is not None:
+        g.user = cached_user
+        return
+
+    with get_session() as sql_session:
+        # photo is only present for VK users, it is None for native ones
+        result = sql_session.query(User.id, User.access_group,
+                                   User.displayed_name, User.login,
+                                   User.user_type, VkUser.photo_url).outerjoin(
+                                       VkUser).filter(User.id == user_id).one()
+    g.user = result
+    # the cache is per worker and a demotion invalidates it only in one of
+    # them, so administrator privileges are always checked against the DB
+    if result.access_group != AccessGroup.Administrator:
+        user_cache.put(user_id, result)
 
 
 @bp.get('/', defaults={'path': ''})
@@ -117,7 +118,7 @@ def logout():
 
 @bp.get('/vk_login')
 def vk_login():
-    url = 'https://oauth.vk.com/authorize?'
+    url = current_app.config['VK_OAUTH_URL'] + '/authorize?'
     query = urlencode({
         'client_id': current_app.config['VK_CLIENT_ID'],
         'redirect_uri': url_for('auth.vk_redirect', _external=True, _scheme='https'),
@@ -145,10 +146,12 @@ def create_vk_user(sql_session, login, user_id, displayed_name, access_token, ex
     return added_user.id
 
 
-def login_as_vk_user(login, access_token, vk_user_id, displayed_name, expires_in, photo_url):
+def login_as_vk_user(login, access_token, vk_user_id, expires_in):
     with get_session() as sql_session:
         native_user = sql_session.query(User).filter(User.login == login).first()
         if not native_user:
+            # a new user can't be shown without a name, so it is requested right away
+            displayed_name, photo_url = request_vk_user_name_and_photo(access_token)
             native_user_id = create_vk_user(sql_session, login,
                                             vk_user_id, displayed_name,
                                             access_token, expires_in,
@@ -160,21 +163,23 @@ def login_as_vk_user(login, access_token, vk_user_id, displayed_name, expires_in
                                                        VkUser.user_id == native_user.id).one()
             vk_user.user_token = access_token
             vk_user.token_exp_time = datetime.now(timezone.utc) + timedelta(seconds=expires_in)
-            vk_user.photo_url = photo_url
+            # the photo is refreshed out of the request
+            enqueue_job(sql_session, 'vk_profile', vk_user_id=vk_user_id)
             sql_session.commit()
+            invalidate_cached_user(native_user_id)
 
         session.clear()
         session['user_id'] = native_user_id
 
 
 def request_vk_access_token(code) -> tuple[str, Any, Any]:
-    result = requests.get('https://oauth.vk.com/access_token',
+    result = http_request('vk', 'GET', current_app.config['VK_OAUTH_URL'] + '/access_token',
                           params={
                               'client_id': current_app.config['VK_CLIENT_ID'],
                               'client_secret': current_app.config['VK_APP_SECRET'],
                               'redirect_uri': url_for('auth.vk_redirect', _external=True, _scheme='https'),
                               'code': code
-                          }, timeout=10.0)
+                          })
 
     json_result = result.json()
     if 'error' in json_result:
@@ -185,12 +190,12 @@ def request_vk_access_token(code) -> tuple[str, Any, Any]:
 
 
 def request_vk_user_name_and_photo(access_token: str) -> tuple[str, str]:
-    result = requests.get('https://api.vk.com/method/users.get',
+    result = http_request('vk', 'GET', current_app.config['VK_API_URL'] + '/users.get',
                           params={
                               'fields': 'photo_50',
                               'access_token': access_token,
                               'v': '5.103'
-                          }, timeout=10.0)
+                          })
 
     json_result = result.json()
     if 'error' in json_result:
@@ -201,6 +206,16 @@ def request_vk_user_name_and_photo(access_token: str) -> tuple[str, str]:
     return f'{response_user["first_name"]} {response_user["last_name"]}', response_user['photo_50']
 
 
+@job_handler('vk_profile')
+def refresh_vk_profile(vk_user_id: int):
+    with get_session() as sql_session:
+        vk_user = sql_session.query(VkUser).filter(VkUser.id == vk_user_id).one()
+        _, vk_user.photo_url = request_vk_user_name_and_photo(vk_user.user_token)
+        sql_session.commit()
+        # other processes see the new photo when their cache expires
+        invalidate_cached_user(vk_user.user_id)
+
+
 @bp.get('/vk_redirect')
 def vk_redirect():
     code = request.args['code']
@@ -208,14 +223,10 @@ def vk_redirect():
 
     try:
         access_token, expires_in, vk_user_id = request_vk_access_token(code)
-        displayed_name, photo_url = request_vk_user_name_and_photo(access_token)
+        login_as_vk_user(f'vk_{vk_user_id}', access_token, vk_user_id, expires_in)
     except RuntimeError as exc:
         capture_exception(exc)
         flash(STRING_TABLE['Login errors vk error'])
-        return redirect(url_for('.login'))
-
-    login = f'vk_{vk_user_id}'
-    login_as_vk_user(login, access_token, vk_user_id,
-                     displayed_name, expires_in, photo_url)
+        return redirect(url_for('.index', path='login'))
 
     return redirect(redirect_location)
@@ -0,0 +1,91 @@
+import contextvars
+import json
+
+import click
+from flask import current_app
+from flask.cli import with_appcontext
+
+from organizer.bench.generator import DEFAULT_SCALE, SMALL_SCALE, BenchScale, generate_bench_data
+from organizer.bench.harness import format_load_results, format_results, run_benchmark, run_load_test
+from organizer.db import get_session, init_connection, re_init_schema
+
+
+@click.command('init-bench-data')
+@click.option('--users', default=DEFAULT_SCALE.users, show_default=True)
+@click.option('--trips', default=DEFAULT_SCALE.trips, show_default=True)
+@click.option('--products', default=DEFAULT_SCALE.products, show_default=True)
+@click.option('--max-trip-days', default=DEFAULT_SCALE.max_trip_days, show_default=True)
+@click.option('--products-per-meal', default=DEFAULT_SCALE.products_per_meal, show_default=True)
+@click.option('--shares-per-trip', default=DEFAULT_SCALE.shares_per_trip, show_default=True)
+@click.option('--seed', default=DEFAULT_SCALE.seed, show_default=True)
+@click.option('--small', is_flag=True, help='Generate a tiny data set for a quick check.')
+@with_appcontext
+def init_bench_data_command(small, **sizes):
+    """Clear the existing data and fill the tables with synthetic data for benchmarks."""
+    scale = SMALL_SCALE if small else BenchScale(**sizes)
+    init_connection()
+    re_init_schema()
+    with get_session() as session:
+        counts = generate_bench_data(session, scale)
+    for table, count in counts.items():
+        click.echo(f'{table}: {count}')
+    click.echo('Password of all users is "bench"')
+
+
+@click.command('bench')
+@click.option('--requests', 'requests_count', default=1000, show_default=True)
+@click.option('--seed', default=1, show_default=True)
+@click.option('--login', default=None, help='User to run as, the one with the most trips by default.')
+@click.option('--output', type=click.Path(dir_okay=False), help='Save results as JSON.')
+@click.option('--baseline', type=click.Path(exists=True, dir_okay=False),
+              help='Results JSON of a previous run to compare p95 with.')
+@with_appcontext
+def bench_command(requests_count, seed, login, output, baseline):
+    """Replay a representative API requests mix and report latencies and query counts."""
+    # requests are run outside of the command app context, otherwise they
+    # would share g and its per request memoized values
+    results = contextvars.Context().run(run_benchmark,
+                                        current_app._get_current_object(),  # type: ignore
+                                        requests_count, seed=seed, login=login)
+
+    baseline_results = None
+    if baseline:
+        with open(baseline, encoding='utf-8') as file:
+            baseline_results = json.load(file)
+    click.echo(format_results(results, baseline_results))
+
+    if output:
+        with open(output, 'w', encoding='utf-8') as file:
+            json.dump(results, file, indent=2)
+
+
+@click.command('load-test')
+@click.option('--url', default='http://localhost:8000', show_default=True, help='Running server to load.')
+@click.option('--concurrency', default=200, show_default=True, help='Clients sending requests at once.')
+@click.option('--requests', 'requests_count', default=5000, show_default=True)
+@click.option('--seed', default=1, show_default=True)
+@click.option('--login', default=None, help='User to run as, the one with the most trips by default.')
+@click.option('--output', type=click.Path(dir_okay=False), help='Save results as JSON.')
+@click.option('--baseline', type=click.Path(exists=True, dir_okay=False),
+              help='Results JSON of a previous run to compare throughput with.')
+@with_appcontext
+def load_test_command(url, concurrency, requests_count, seed, login, output, baseline):
+    """Replay the API requests mix against a running server from concurrent clients."""
+    results = run_load_test(current_app._get_current_object(),  # type: ignore
+                            url, requests_count, concurrency, seed=seed, login=login)
+
+    baseline_results = None
+    if baseline:
+        with open(baseline, encoding='utf-8') as file:
+            baseline_results = json.load(file)
+    click.echo(format_load_results(results, baseline_results))
+
+    if output:
+        with open(output, 'w', encoding='utf-8') as file:
+            json.dump(results, file, indent=2)
+
+
+def init_app(app):
+    app.cli.add_command(init_bench_data_command)
+    app.cli.add_command(bench_command)
+    app.cli.add_command(load_test_command)
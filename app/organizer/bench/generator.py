@@ -0,0 +1,207 @@
+import random
+from datetime import date, datetime, timedelta, timezone
+from typing import Any, Iterable, NamedTuple
+
+from sqlalchemy import insert, text
+from sqlalchemy.orm import Session
+from werkzeug.security import generate_password_hash
+
+from organizer.schema import (
+    AccessGroup,
+    Group,
+    MealRecord,
+    Product,
+    SharingLink,
+    Trip,
+    TripAccess,
+    User,
+    UserType,
+)
+from organizer.utils.day_totals import refresh_day_totals
+
+BENCH_PASSWORD = 'bench'
+
+ADJECTIVES = ['Dried', 'Smoked', 'Salted', 'Sweet', 'Spicy', 'Instant', 'Roasted', 'Frozen',
+              'Organic', 'Crunchy', 'Whole', 'Baked', 'Pickled', 'Honey', 'Fruit', 'Chocolate']
+NOUNS = ['oats', 'buckwheat', 'rice', 'lentils', 'beef jerk', 'chicken pate', 'sausage', 'cheese',
+         'crackers', 'nuts', 'raisins', 'apricots', 'soup', 'noodles', 'bread', 'cookies', 'bar',
+         'tea', 'coffee', 'sugar', 'milk powder', 'pasta', 'mashed potato', 'halva', 'candies']
+
+
+class BenchScale(NamedTuple):
+    '''Sizes of the generated data set'''
+    users: int = 2000
+    trips: int = 20000
+    products: int = 10000
+    max_trip_days: int = 14
+    products_per_meal: int = 4
+    shares_per_trip: float = 1.5
+    community_size: int = 20
+    seed: int = 1
+
+
+DEFAULT_SCALE = BenchScale()
+SMALL_SCALE = BenchScale(users=20, trips=60, products=200, max_trip_days=7, products_per_meal=3)
+
+BATCH_SIZE = 10000
+
+
+def insert_batches(session: Session, model: Any, rows: Iterable[dict[str, Any]]) -> int:
+    '''Inserts rows with executemany in batches, rows may be a generator'''
+    count = 0
+    batch: list[dict[str, Any]] = []
+    for row in rows:
+        batch.append(row)
+        if len(batch) == BATCH_SIZE:
+            session.execute(insert(model), batch)
+            count += len(batch)
+            batch = []
+    if batch:
+        session.execute(insert(model), batch)
+        count += len(batch)
+    return count
+
+
+def zipf_weights(count: int, exponent: float) -> list[float]:
+    '''Cumulative weights making the first items the most popular ones'''
+    weights = []
+    total = 0.0
+    for rank in range(1, count + 1):
+        total += rank ** -exponent
+        weights.append(total)
+    return weights
+
+
+def generate_products(rng: random.Random, scale: BenchScale):
+    for i in range(scale.products):
+        name = f'{rng.choice(ADJECTIVES)} {rng.choice(NOUNS)} {i}'
+        yield {
+            'id': i + 1,
+            'name': name,
+            'calories': round(rng.uniform(20, 650), 1),
+            'proteins': round(rng.uniform(0, 50), 1),
+            'fats': round(rng.uniform(0, 50), 1),
+            'carbs': round(rng.uniform(0, 90), 1),
+            'grams': round(rng.uniform(2, 60), 1) if rng.random() < 0.2 else None,
+            'archived': rng.random() < 0.02,
+        }
+
+
+def generate_users(scale: BenchScale):
+    password = generate_password_hash(BENCH_PASSWORD)
+    for i in range(scale.users):
+        yield {
+            'id': i + 1,
+            'login': f'bench{i}',
+            'password': password,
+            'displayed_name': f'Bench user {i}',
+            # the least active user is the administrator
+            'access_group': AccessGroup.Administrator if i == scale.users - 1 else AccessGroup.User,
+            'user_type': UserType.Native,
+            'last_logged_in': datetime.utcnow(),
+        }
+
+
+def generate_trips(rng: random.Random, scale: BenchScale, owners: list[int]):
+    first_day = date(2020, 1, 1)
+    for i, owner in enumerate(owners):
+        from_date = first_day + timedelta(days=rng.randrange(5 * 365))
+        yield {
+            'id': i + 1,
+            'uid': f'bench{i}',
+            'name': f'Bench trip {i}',
+            'from_date': from_date,
+            'till_date': from_date + timedelta(days=rng.randrange(scale.max_trip_days)),
+            'created_by': owner,
+            'last_update': datetime.utcnow(),
+            'archived': rng.random() < 0.05,
+        }
+
+
+def generate_groups(rng: random.Random, scale: BenchScale):
+    for trip_id in range(1, scale.trips + 1):
+        for group_number in range(rng.randint(1, 4)):
+            yield {'trip_id': trip_id, 'group_number': group_number, 'persons': rng.randint(1, 6)}
+
+
+def generate_shares(rng: random.Random, scale: BenchScale, owners: list[int]):
+    '''Trips are shared with members of the owner community, like friends do'''
+    for trip_id, owner in enumerate(owners, start=1):
+        community_start = (owner - 1) // scale.community_size * scale.community_size + 1
+        members = [user_id
+                   for user_id in range(community_start,
+                                        min(community_start + scale.community_size, scale.users + 1))
+                   if user_id != owner]
+        shares_count = min(int(rng.expovariate(1 / scale.shares_per_trip)), len(members))
+        for user_id in rng.sample(members, shares_count):
+            yield {'trip_id': trip_id, 'user_id': user_id}
+
+
+def generate_meal_records(rng: random.Random, scale: BenchScale, trips: list[dict[str, Any]]):
+    '''Every trip uses its own set of favourite products, popular products are preferred'''
+    product_ids = range(1, scale.products + 1)
+    popularity = zipf_weights(scale.products, 1.0)
+    for trip in trips:
+        palette = list(set(rng.choices(product_ids, cum_weights=popularity,
+                                       k=scale.products_per_meal * 6)))
+        days_count = (trip['till_date'] - trip['from_date']).days + 1
+        for day_number in range(1, days_count + 1):
+            for meal_number in range(4):
+                count = min(rng.randint(1, scale.products_per_meal), len(palette))
+                for product_id in rng.sample(palette, count):
+                    yield {
+                        'trip_id': trip['id'],
+                        'product_id': product_id,
+                        'day_number': day_number,
+                        'meal_number': meal_number,
+                        'mass': rng.randrange(10, 200, 5),
+                    }
+
+
+def generate_sharing_links(rng: random.Random, scale: BenchScale, owners: list[int]):
+    now = datetime.now(timezone.utc)
+    for trip_id, owner in enumerate(owners, start=1):
+        if rng.random() < 0.1:
+            yield {
+                'uuid': f'bench-link-{trip_id}',
+                'trip_id': trip_id,
+                'user_id': owner,
+                'expiration_date': now + timedelta(days=rng.randint(-10, 3)),
+            }
+
+
+def reset_sequences(session: Session):
+    # ids are generated here, sequences must continue after them
+    if session.get_bind().dialect.name != 'postgresql':
+        return
+
+    for table in ('users', 'trips', 'products', 'meal_records'):
+        session.execute(text(
+            f"SELECT setval(pg_get_serial_sequence('{table}', 'id'), "
+            f"COALESCE((SELECT MAX(id) FROM {table}), 1))"
+        ))
+
+
+def generate_bench_data(session: Session, scale: BenchScale) -> dict[str, int]:
+    '''Fills an empty database with synthetic data, returns counts of created rows'''
+    rng = random.Random(scale.seed)
+    # a few users plan most of the trips
+    owners = rng.choices(range(1, scale.users + 1), cum_weights=zipf_weights(scale.users, 0.7),
+                         k=scale.trips)
+    trips = list(generate_trips(rng, scale, owners))
+
+    counts = {
+        'products': insert_batches(session, Product, generate_products(rng, scale)),
+        'users': insert_batches(session, User, generate_users(scale)),
+        'trips': insert_batches(session, Trip, trips),
+        'groups': insert_batches(session, Group, generate_groups(rng, scale)),
+        'shares': insert_batches(session, TripAccess, generate_shares(rng, scale, owners)),
+        'sharing links': insert_batches(session, SharingLink,
+                                        generate_sharing_links(rng, scale, owners)),
+        'meal records': insert_batches(session, MealRecord,
+                                       generate_meal_records(rng, scale, trips)),
+    }
+    reset_sequences(session)
+    refresh_day_totals(session)
+    session.commit()
+    return counts
@@ -0,0 +1,294 @@
+import math
+import queue
+import random
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, NamedTuple
+
+import requests
+from flask import Flask, g, request_finished
+from flask.testing import FlaskClient
+from sqlalchemy import func, select
+
+from organizer.bench.generator import ADJECTIVES, BENCH_PASSWORD, NOUNS
+from organizer.db import get_session
+from organizer.schema import MealRecord, Trip, User
+
+
+class BenchContext(NamedTuple):
+    '''Data the scenarios pick request arguments from'''
+    trip_uids: list[str]
+    trip_days: dict[str, int]
+    meal_ids: list[int]
+    product_ids: list[int]
+
+
+def pick_trip(rng: random.Random, context: BenchContext) -> str:
+    return rng.choice(context.trip_uids)
+
+
+def trip_list(client: FlaskClient, rng: random.Random, context: BenchContext):
+    return client.get('/api/trips/')
+
+
+def meal_page(client: FlaskClient, rng: random.Random, context: BenchContext):
+    return client.get(f'/api/meals/{pick_trip(rng, context)}')
+
+
+def day_meals(client: FlaskClient, rng: random.Random, context: BenchContext):
+    trip_uid = pick_trip(rng, context)
+    return client.get(f'/api/meals/{trip_uid}/{rng.randint(1, context.trip_days[trip_uid])}')
+
+
+def add_meal(client: FlaskClient, rng: random.Random, context: BenchContext):
+    trip_uid = pick_trip(rng, context)
+    return client.post('/api/meals/add', json={
+        'trip_uid': trip_uid,
+        'meal_name': rng.choice(['breakfast', 'lunch', 'dinner', 'snacks']),
+        'day_number': rng.randint(1, context.trip_days[trip_uid]),
+        'mass': rng.randrange(10, 200, 5),
+        'unit': 0,
+        'product_id': rng.choice(context.product_ids),
+    })
+
+
+def edit_meal(client: FlaskClient, rng: random.Random, context: BenchContext):
+    return client.post('/api/meals/edit', json={
+        'meal_id': rng.choice(context.meal_ids),
+        'mass': rng.randrange(10, 200, 5),
+        'unit': 0,
+    })
+
+
+def shopping_report(client: FlaskClient, rng: random.Random, context: BenchContext):
+    return client.get(f'/api/reports/shopping/{pick_trip(rng, context)}')
+
+
+def packing_report(client: FlaskClient, rng: random.Random, context: BenchContext):
+    return client.get(f'/api/reports/packing/{pick_trip(rng, context)}')
+
+
+def product_search(client: FlaskClient, rng: random.Random, context: BenchContext):
+    term = rng.choice([rng.choice(ADJECTIVES), rng.choice(NOUNS)])[:rng.randint(3, 6)]
+    return client.get('/api/products/search', query_string={'search': term})
+
+
+Scenario = Callable[[FlaskClient, random.Random, BenchContext], Any]
+
+# name, scenario and its share in the requests mix
+API_MIX: list[tuple[str, Scenario, int]] = [
+    ('trip list', trip_list, 15),
+    ('meal page', meal_page, 25),
+    ('day meals', day_meals, 10),
+    ('add meal', add_meal, 15),
+    ('edit meal', edit_meal, 10),
+    ('shopping report', shopping_report, 8),
+    ('packing report', packing_report, 7),
+    ('product search', product_search, 10),
+]
+
+
+def busiest_user(app: Flask) -> str:
+    '''Login of the user with the most trips, the worst case for the most endpoints'''
+    with app.app_context():
+        with get_session() as session:
+            return session.execute(
+                select(User.login)
+                .join(Trip, Trip.created_by == User.id)
+                .group_by(User.id, User.login)
+                .order_by(func.count(Trip.id).desc(), User.id)
+                .limit(1)
+            ).scalar_one()
+
+
+def load_context(app: Flask, login: str) -> BenchContext:
+    with app.app_context():
+        with get_session() as session:
+            trips = session.execute(
+                select(Trip.id, Trip.uid, Trip.from_date, Trip.till_date)
+                .join(User, User.id == Trip.created_by)
+                .where(User.login == login)
+            ).all()
+            meal_ids = session.execute(
+                select(MealRecord.id)
+                .where(MealRecord.trip_id.in_([trip.id for trip in trips]))
+                .limit(10000)
+            ).scalars().all()
+            product_ids = session.execute(
+                select(MealRecord.product_id).distinct().limit(1000)
+            ).scalars().all()
+
+    # scenarios pick their arguments from these
+    if not trips or not meal_ids or not product_ids:
+        raise RuntimeError(f'{login} has no trips with meals to run the benchmark on')
+
+    return BenchContext(
+        trip_uids=[trip.uid for trip in trips],
+        trip_days={trip.uid: (trip.till_date - trip.from_date).days + 1 for trip in trips},
+        meal_ids=list(meal_ids),
+        product_ids=list(product_ids),
+    )
+
+
+def percentile(values: list[float], share: float) -> float:
+    '''Nearest-rank percentile of the values'''
+    ordered = sorted(values)
+    return ordered[max(math.ceil(share * len(ordered)) - 1, 0)]
+
+
+def summarize(latencies: list[float], queries: list[int], errors: int) -> dict[str, Any]:
+    return {
+        'requests': len(latencies),
+        'errors': errors,
+        'p50_ms': round(percentile(latencies, 0.5) * 1000, 2),
+        'p95_ms': round(percentile(latencies, 0.95) * 1000, 2),
+        'p99_ms': round(percentile(latencies, 0.99) * 1000, 2),
+        'queries_avg': round(sum(queries) / len(queries), 2),
+        'queries_max': max(queries),
+    }
+
+
+def run_benchmark(app: Flask, requests_count: int, seed: int = 1, warmup: int = 20,
+                  login: str | None = None) -> dict[str, dict[str, Any]]:
+    '''
+    Replays the API mix in-process against the app as the given user and
+    returns latency percentiles and query counts per scenario.
+    '''
+    login = login or busiest_user(app)
+    context = load_context(app, login)
+    rng = random.Random(seed)
+    client = app.test_client()
+    response = client.post('/api/auth/login/', json={'login': login, 'password': BENCH_PASSWORD})
+    if response.status_code != 200:
+        raise RuntimeError(f'Can not log in as {login}')
+
+    names = [name for name, _, _ in API_MIX]
+    scenarios = {name: scenario for name, scenario, _ in API_MIX}
+    weights = [weight for _, _, weight in API_MIX]
+
+    last_queries: list[int] = []
+
+    def record_queries(sender, response, **extra):
+        stats = g.get('sql_stats')
+        last_queries.append(stats.count if stats is not None else 0)
+
+    latencies: dict[str, list[float]] = {name: [] for name in names}
+    queries: dict[str, list[int]] = {name: [] for name in names}
+    errors = dict.fromkeys(names, 0)
+
+    with request_finished.connected_to(record_queries, app):
+        for i in range(warmup + requests_count):
+            name = rng.choices(names, weights)[0]
+            started = time.perf_counter()
+            response = scenarios[name](client, rng, context)
+            duration = time.perf_counter() - started
+            if i < warmup:
+                continue
+
+            latencies[name].append(duration)
+            queries[name].append(last_queries[-1])
+            if response.status_code >= 400:
+                errors[name] += 1
+
+    return {
+        name: summarize(latencies[name], queries[name], errors[name])
+        for name in names
+        if latencies[name]
+    }
+
+
+def format_results(results: dict[str, dict[str, Any]],
+                   baseline: dict[str, dict[str, Any]] | None = None) -> str:
+    header = f'{"endpoint":<18}{"requests":>9}{"errors":>7}{"p50 ms":>9}{"p95 ms":>9}' \
+             f'{"p99 ms":>9}{"queries":>9}'
+    if baseline:
+        header += f'{"p95 change":>12}'
+
+    lines = [header]
+    for name, summary in results.items():
+        line = f'{name:<18}{summary["requests"]:>9}{summary["errors"]:>7}' \
+               f'{summary["p50_ms"]:>9.2f}{summary["p95_ms"]:>9.2f}{summary["p99_ms"]:>9.2f}' \
+               f'{summary["queries_avg"]:>9.2f}'
+        if baseline and name in baseline and baseline[name]['p95_ms']:
+            change = summary['p95_ms'] / baseline[name]['p95_ms'] - 1
+            line += f'{change:>+12.1%}'
+        lines.append(line)
+    return '\n'.join(lines)
+
+
+class HttpBenchClient:
+    '''Sends scenario requests to a running server, mimics FlaskClient methods the scenarios use'''
+
+    def __init__(self, base_url: str):
+        self.base_url = base_url.rstrip('/')
+        self.session = requests.Session()
+
+    def get(self, path: str, query_string: dict[str, Any] | None = None) -> requests.Response:
+        return self.session.get(self.base_url + path, params=query_string, timeout=60)
+
+    def post(self, path: str, json: Any = None) -> requests.Response:
+        return self.session.post(self.base_url + path, json=json, timeout=60)
+
+
+def run_load_test(app: Flask, base_url: str, requests_count: int, concurrency: int,
+                  seed: int = 1, login: str | None = None) -> dict[str, Any]:
+    '''
+    Replays the API mix against a running server from concurrent clients,
+    each with its own session, and returns the throughput and latencies.
+    '''
+    login = login or busiest_user(app)
+    context = load_context(app, login)
+    rng = random.Random(seed)
+    names = [name for name, _, _ in API_MIX]
+    scenarios = {name: scenario for name, scenario, _ in API_MIX}
+    plan = rng.choices(names, [weight for _, _, weight in API_MIX], k=requests_count)
+
+    # clients log in one by one before the measurement, then each request
+    # borrows an idle client, so at most `concurrency` requests are in flight
+    clients: queue.SimpleQueue[HttpBenchClient] = queue.SimpleQueue()
+    for _ in range(concurrency):
+        client = HttpBenchClient(base_url)
+        response = client.post('/api/auth/login/', json={'login': login, 'password': BENCH_PASSWORD})
+        if response.status_code != 200:
+            raise RuntimeError(f'Can not log in as {login}')
+        # the session cookie is secure, but a local server is run over plain http
+        for cookie in client.session.cookies:
+            cookie.secure = False
+        clients.put(client)
+
+    def send(index: int) -> tuple[str, float, bool]:
+        client = clients.get()
+        name = plan[index]
+        started = time.perf_counter()
+        try:
+            failed = scenarios[name](client, random.Random(seed + index), context).status_code >= 400
+        except requests.RequestException:
+            failed = True
+        duration = time.perf_counter() - started
+        clients.put(client)
+        return name, duration, failed
+
+    with ThreadPoolExecutor(concurrency) as pool:
+        started = time.perf_counter()
+        results = list(pool.map(send, range(requests_count)))
+        elapsed = time.perf_counter() - started
+
+    latencies = [duration for _, duration, _ in results]
+    return {
+        'concurrency': concurrency,
+        'requests': requests_count,
+        'errors': sum(failed for _, _, failed in results),
+        'elapsed_s': round(elapsed, 2),
+        'throughput_rps': round(requests_count / elapsed, 1),
+        'p50_ms': round(percentile(latencies, 0.5) * 1000, 2),
+        'p95_ms': round(percentile(latencies, 0.95) * 1000, 2),
+        'p99_ms': round(percentile(latencies, 0.99) * 1000, 2),
+    }
+
+
+def format_load_results(results: dict[str, Any], baseline: dict[str, Any] | None = None) -> str:
+    lines = [f'{name:<18}{value:>12}' for name, value in results.items()]
+    if baseline and baseline.get('throughput_rps'):
+        change = results['throughput_rps'] / baseline['throughput_rps'] - 1
+        lines.append(f'{"throughput change":<18}{change:>+12.1%}')
+    return '\n'.join(lines)
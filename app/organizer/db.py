@@ -1,50 +1,96 @@
+import os
+import threading
 from contextlib import contextmanager
 from typing import Any, Generator
 
-from sqlalchemy import create_engine
-from sqlalchemy.orm import sessionmaker, scoped_session, Session
+from sqlalchemy import create_engine, Engine
+from sqlalchemy.orm import sessionmaker, Session
 
 import click
-from flask import current_app, g
+from flask import current_app
 from flask.cli import with_appcontext
 
 from werkzeug.security import generate_password_hash
 
 from organizer.schema import init_schema as init_schema_internal, BASE, User, AccessGroup
 from organizer.fake_data import init_fake_data_internal
+from organizer.utils.day_totals import find_inconsistent_trips, refresh_day_totals
+from organizer.utils.sql_stats import instrument_engine
+
+# threads of a worker may get the database for the first time at once
+DATABASE_LOCK = threading.Lock()
+
+
+class Database:
+    '''Engine and session factory shared by all requests of a worker process'''
+
+    def __init__(self, config):
+        self.engine: Engine = create_engine(
+            config['DATABASE'],
+            pool_size=config['DATABASE_POOL_SIZE'],
+            max_overflow=config['DATABASE_MAX_OVERFLOW'],
+            pool_pre_ping=config['DATABASE_POOL_PRE_PING'],
+            pool_recycle=config['DATABASE_POOL_RECYCLE'],
+        )
+        instrument_engine(self.engine)
+        self.sessionmaker = sessionmaker(bind=self.engine)
+        self.pid = os.getpid()
+        self.lock = threading.Lock()
+
+    def ensure_process(self):
+        # gunicorn forks workers after the app is created, pooled connections
+        # inherited from the parent must not be shared with the child
+        if self.pid == os.getpid():
+            return
+
+        with self.lock:
+            if self.pid != os.getpid():
+                self.engine.dispose(close=False)
+                self.pid = os.getpid()
+
+    def dispose(self):
+        self.engine.dispose()
+
+
+def get_database() -> Database:
+    database: Database | None = current_app.extensions.get('database')
+    if database is None:
+        with DATABASE_LOCK:
+            database = current_app.extensions.get('database')
+            if database is None:
+                database = Database(current_app.config)
+                current_app.extensions['database'] = database
+    database.ensure_process()
+    return database
+
+
+def get_engine() -> Engine:
+    return get_database().engine
 
 
 @contextmanager
 def get_session() -> Generator[Session, Any, Any]:
-    # this is the first request to the DB
-    if 'engine' not in g:
-        init_connection()
+    session = get_database().sessionmaker()
     try:
-        session = g.sessionmaker()
         yield session
     finally:
-        g.sessionmaker.remove()
+        session.close()
 
 
 def init_connection():
-    engine = create_engine(
-        current_app.config['DATABASE']
-    )
-    g.engine = engine
-    session_factory = sessionmaker(bind=engine)
-    g.sessionmaker = scoped_session(session_factory)
+    get_database()
 
 
-def close_connection(e=None):
-    g.pop('sessionmaker', None)
-    engine = g.pop('engine', None)
-    if engine is not None:
-        engine.dispose()
+def close_connection(app):
+    database: Database | None = app.extensions.pop('database', None)
+    if database is not None:
+        database.dispose()
 
 
 def re_init_schema():
-    BASE.metadata.drop_all(g.engine) # type: ignore
-    init_schema_internal(g.engine)
+    engine = get_engine()
+    BASE.metadata.drop_all(engine) # type: ignore
+    init_schema_internal(engine)
 
 
 def init_fake_data():
@@ -94,8 +140,27 @@ def create_admin_command(login, password):
     click.echo(f'Successfully created admin "{login}"')
 
 
+@click.command('rebuild-day-totals')
+@click.option('--check', is_flag=True, help='Only report trips with outdated totals.')
+@with_appcontext
+def rebuild_day_totals_command(check):
+    """Recalculate nutrition totals of all trips days."""
+    with get_session() as session:
+        inconsistent = find_inconsistent_trips(session)
+        if check:
+            if inconsistent:
+                click.echo(f'Inconsistent totals in trips: {", ".join(map(str, inconsistent))}')
+                raise SystemExit(1)
+            click.echo('All totals are consistent')
+            return
+
+        refresh_day_totals(session)
+        session.commit()
+    click.echo(f'Rebuilt day totals, {len(inconsistent)} trips were inconsistent')
+
+
 def init_app(app):
-    app.teardown_appcontext(close_connection)
     app.cli.add_command(init_empty_db_command)
     app.cli.add_command(init_fake_data_command)
     app.cli.add_command(create_admin_command)
+    app.cli.add_command(rebuild_day_totals_command)
@@ -1,6 +1,7 @@
 from datetime import datetime
 
 from organizer.schema import Trip, Product, MealRecord, User, AccessGroup, Group
+from organizer.utils.day_totals import refresh_day_totals
 
 
 def init_fake_data_internal(session):
@@ -91,4 +92,5 @@ def init_fake_data_internal(session):
 
     # to check whether reports ignore days way later than the last day
     session.add(MealRecord(trip_id=1, day_number=100, meal_number=0, product_id=2, mass=6000))
+    refresh_day_totals(session)
     session.commit()
@@ -0,0 +1,24 @@
+import hmac
+
+from flask import Blueprint, Response, abort, current_app, g, request
+
+from organizer.schema import AccessGroup
+from organizer.utils.metrics import collect_metrics
+
+bp = Blueprint('metrics', __name__)
+
+
+def scrape_allowed() -> bool:
+    token = current_app.config.get('METRICS_TOKEN')
+    if token and hmac.compare_digest(request.headers.get('Authorization', ''), f'Bearer {token}'):
+        return True
+
+    return g.user is not None and g.user.access_group == AccessGroup.Administrator
+
+
+@bp.get('/metrics')
+def metrics():
+    if not scrape_allowed():
+        abort(403)
+
+    return Response(collect_metrics(), mimetype='text/plain; version=0.0.4')
@@ -1,7 +1,7 @@
 import datetime
 from enum import Enum as PyEnum
 
-from sqlalchemy import ForeignKey
+from sqlalchemy import DDL, ForeignKey, Index, event
 from sqlalchemy.orm import relationship, declarative_base, Mapped, mapped_column
 
 
@@ -25,9 +25,20 @@ class UserType(PyEnum):
     Vk = 1
 
 
+class JobStatus(PyEnum):
+    '''State of a background job'''
+    Pending = 0
+    Running = 1
+    Done = 2
+    Failed = 3
+
+
 class User(BASE):
     '''Describes a native user'''
     __tablename__ = 'users'
+    __table_args__ = (
+        Index('ix_users_login', 'login'),
+    )
 
     id: Mapped[int] = mapped_column(primary_key=True)
     login: Mapped[str] = mapped_column(nullable=False)
@@ -78,6 +89,12 @@ class Group(BASE):
 class Product(BASE):
     '''Describes a product'''
     __tablename__ = 'products'
+    __table_args__ = (
+        # speeds up ILIKE '%term%' searches, requires pg_trgm extension
+        Index('ix_products_name_trgm', 'name',
+              postgresql_using='gin',
+              postgresql_ops={'name': 'gin_trgm_ops'}).ddl_if(dialect='postgresql'),
+    )
 
     id: Mapped[int] = mapped_column(primary_key=True)
     name: Mapped[str] = mapped_column(nullable=False)
@@ -89,9 +106,29 @@ class Product(BASE):
     archived: Mapped[bool] = mapped_column(default=False, nullable=False)
 
 
+class CatalogueVersion(BASE):
+    '''Describes the revision of products catalogue, bumped on every product change'''
+    __tablename__ = 'catalogue_version'
+
+    id: Mapped[int] = mapped_column(primary_key=True)
+    version: Mapped[int] = mapped_column(nullable=False, default=0)
+
+
+event.listen(
+    CatalogueVersion.__table__,
+    'after_create',
+    DDL('INSERT INTO catalogue_version (id, version) VALUES (1, 0)')
+)
+
+
 class MealRecord(BASE):
     '''Describes a meal record in a specific trip on a specific day'''
     __tablename__ = 'meal_records'
+    __table_args__ = (
+        # a product is stored once per meal, added mass is merged into the record
+        Index('ix_meal_records_trip_day_meal_product',
+              'trip_id', 'day_number', 'meal_number', 'product_id', unique=True),
+    )
 
     id: Mapped[int] = mapped_column(primary_key=True)
     trip_id: Mapped[int] = mapped_column(
@@ -107,6 +144,22 @@ class MealRecord(BASE):
     mass: Mapped[int] = mapped_column(nullable=False)
 
 
+class TripDayTotal(BASE):
+    '''Describes precalculated nutrition totals of a meal in a specific trip day'''
+    __tablename__ = 'trip_day_totals'
+
+    trip_id: Mapped[int] = mapped_column(
+        ForeignKey(Trip.__tablename__ + '.id'), primary_key=True
+    )
+    day_number: Mapped[int] = mapped_column(primary_key=True)
+    meal_number: Mapped[int] = mapped_column(primary_key=True)
+    calories: Mapped[float] = mapped_column(nullable=False)
+    proteins: Mapped[float] = mapped_column(nullable=False)
+    fats: Mapped[float] = mapped_column(nullable=False)
+    carbs: Mapped[float] = mapped_column(nullable=False)
+    mass: Mapped[float] = mapped_column(nullable=False)
+
+
 class VkUser(BASE):
     '''Describes a Vk registered user'''
     __tablename__ = 'vkusers'
@@ -123,6 +176,9 @@ class VkUser(BASE):
 class TripAccess(BASE):
     '''Describes what users can access what trips'''
     __tablename__ = 'tripaccess'
+    __table_args__ = (
+        Index('ix_tripaccess_trip_user', 'trip_id', 'user_id'),
+    )
 
     user_id: Mapped[int] = mapped_column(
         ForeignKey(User.__tablename__ + '.id'), primary_key=True
@@ -139,6 +195,9 @@ def make_expiration_date():
 class SharingLink(BASE):
     '''Describes a link the user shared'''
     __tablename__ = 'sharinglinks'
+    __table_args__ = (
+        Index('ix_sharinglinks_expiration_date', 'expiration_date'),
+    )
 
     uuid: Mapped[str] = mapped_column(nullable=False, primary_key=True)
     user_id: Mapped[int] = mapped_column(ForeignKey(User.__tablename__ + '.id'))
@@ -149,11 +208,41 @@ class SharingLink(BASE):
 class PasswordLink(BASE):
     '''Describes a record to restore a password'''
     __tablename__ = 'passwordlinks'
+    __table_args__ = (
+        Index('ix_passwordlinks_expiration_date', 'expiration_date'),
+    )
 
     uuid: Mapped[str] = mapped_column(nullable=False, primary_key=True)
     user_id: Mapped[int] = mapped_column(ForeignKey(User.__tablename__ + '.id'))
     expiration_date: Mapped[datetime.datetime] = mapped_column(nullable=False, default=make_expiration_date)
 
 
+class Job(BASE):
+    '''Describes a background job, e.g. an email to send'''
+    __tablename__ = 'jobs'
+    __table_args__ = (
+        Index('ix_jobs_status_run_at', 'status', 'run_at'),
+    )
+
+    id: Mapped[int] = mapped_column(primary_key=True)
+    kind: Mapped[str] = mapped_column(nullable=False)
+    # JSON encoded arguments of the job handler
+    payload: Mapped[str] = mapped_column(nullable=False)
+    status: Mapped[JobStatus] = mapped_column(nullable=False, default=JobStatus.Pending)
+    attempts: Mapped[int] = mapped_column(nullable=False, default=0)
+    run_at: Mapped[datetime.datetime] = mapped_column(nullable=False, default=datetime.datetime.utcnow)
+    created_at: Mapped[datetime.datetime] = mapped_column(nullable=False, default=datetime.datetime.utcnow)
+    started_at: Mapped[datetime.datetime | None] = mapped_column(nullable=True)
+    finished_at: Mapped[datetime.datetime | None] = mapped_column(nullable=True)
+    last_error: Mapped[str | None] = mapped_column(nullable=True)
+
+
+event.listen(
+    BASE.metadata,
+    'before_create',
+    DDL('CREATE EXTENSION IF NOT EXISTS pg_trgm').execute_if(dialect='postgresql')
+)
+
+
 def init_schema(engine):
     BASE.metadata.create_all(engine)
@@ -11,7 +11,6 @@ STRING_TABLE = {
     'Forgot invalid login': 'Неверный логин',
     'Forgot ok': 'Сообщение успешно отправлено',
     'Forgot email subject': 'Восстановление пароля',
-    'Forgot email error': 'Произошла неизвестная ошибка',
 
     'Trips edit error incorrect name': 'Некорректное имя',
     'Trips edit error incorrect groups': 'Некорректная информация о группах',
@@ -32,12 +32,10 @@ def forget(trip_uid: str):
 @login_required_group(AccessGroup.User)
 def access(uuid):
     with get_session() as session:
-        current_time = datetime.now(timezone.utc)
-        # clean up dead links
-        session.query(SharingLink).filter(SharingLink.expiration_date < current_time).delete()
-        session.commit()
-
-        link = session.query(SharingLink).filter(SharingLink.uuid == uuid).first()
+        # expired links are purged by a maintenance task, see utils.link_cleanup
+        link = session.query(SharingLink).filter(
+            SharingLink.uuid == uuid,
+            SharingLink.expiration_date >= datetime.now(timezone.utc)).first()
         if not link:
             return redirect('/trips/incorrect')
 
@@ -1,8 +1,12 @@
-import requests
-from flask import current_app
+from datetime import date, datetime
+from typing import NamedTuple
+
+from flask import abort, current_app, g
+from sqlalchemy import and_, select
 from sqlalchemy.orm import Session
 
-from organizer.schema import Trip, TripAccess
+from organizer.schema import AccessGroup, Trip, TripAccess
+from organizer.utils.http import http_request
 
 
 def is_captcha_enabled() -> bool:
@@ -11,10 +15,10 @@ def is_captcha_enabled() -> bool:
 
 def check_captcha(response: str) -> bool:
     url = 'https://www.google.com/recaptcha/api/siteverify'
-    answer = requests.post(url, data={
+    answer = http_request('recaptcha', 'POST', url, data={
         'secret': current_app.config['RECAPTCHA_SERVER_KEY'],
         'response': response
-    }, timeout=10.0)
+    })
 
     if answer.status_code != 200:
         raise ConnectionError('Error from google server')
@@ -22,11 +26,81 @@ def check_captcha(response: str) -> bool:
     return answer.json()['success']
 
 
-def user_has_trip_access(trip: Trip, user_id: int, admin: bool, session: Session) -> bool:
-    if trip.created_by == user_id or admin:
-        return True
+class TripInfo(NamedTuple):
+    '''Trip columns with the access of the current user to the trip'''
+    id: int
+    uid: str
+    name: str
+    created_by: int
+    from_date: date
+    till_date: date
+    archived: bool
+    last_update: datetime
+    has_access: bool
+
+    @property
+    def days_count(self) -> int:
+        return (self.till_date - self.from_date).days + 1
+
+
+def get_trip_info(session: Session, trip_uid: str | None = None,
+                  trip_id: int | None = None) -> TripInfo | None:
+    '''
+    Loads a trip together with the access of the current user in a single
+    query. The result is memoized for the request, so it reflects the trip
+    as it was at the first lookup.
+    '''
+    trips: dict[tuple[str, str | int | None], TripInfo | None] = g.setdefault('trip_infos', {})
+    key = ('uid', trip_uid) if trip_uid is not None else ('id', trip_id)
+    if key in trips:
+        return trips[key]
+
+    row = session.execute(
+        select(
+            Trip.id,
+            Trip.uid,
+            Trip.name,
+            Trip.created_by,
+            Trip.from_date,
+            Trip.till_date,
+            Trip.archived,
+            Trip.last_update,
+            TripAccess.user_id.label('access_user_id'),
+        )
+        .outerjoin(TripAccess, and_(TripAccess.trip_id == Trip.id,
+                                    TripAccess.user_id == g.user.id))
+        .where(Trip.uid == trip_uid if trip_uid is not None else Trip.id == trip_id)
+    ).one_or_none()
+
+    if not row:
+        trips[key] = None
+        return None
+
+    info = TripInfo(
+        id=row.id,
+        uid=row.uid,
+        name=row.name,
+        created_by=row.created_by,
+        from_date=row.from_date,
+        till_date=row.till_date,
+        archived=row.archived,
+        last_update=row.last_update,
+        has_access=(row.created_by == g.user.id
+                    or row.access_user_id is not None
+                    or g.user.access_group == AccessGroup.Administrator),
+    )
+    trips[('uid', info.uid)] = trips[('id', info.id)] = info
+    return info
+
+
+def require_trip(session: Session, trip_uid: str | None = None, trip_id: int | None = None,
+                 edit: bool = False) -> TripInfo:
+    '''Returns the trip or aborts if it does not exist or can not be edited by the user'''
+    trip = get_trip_info(session, trip_uid, trip_id)
+    if not trip:
+        abort(404)
 
-    trip_access = session.query(TripAccess).filter(TripAccess.trip_id == trip.id,
-                                                   TripAccess.user_id == user_id).first()
+    if edit and not trip.has_access:
+        abort(403)
 
-    return trip_access is not None
+    return trip
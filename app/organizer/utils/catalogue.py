@@ -0,0 +1,103 @@
+import math
+import threading
+from array import array
+from typing import NamedTuple
+
+from flask import current_app, g
+from sqlalchemy import select, update
+from sqlalchemy.orm import Session
+
+from organizer.schema import CatalogueVersion, Product
+
+
+class CatalogueProduct(NamedTuple):
+    id: int
+    name: str
+    calories: float
+    proteins: float
+    fats: float
+    carbs: float
+    grams: float | None
+    archived: bool
+
+
+class ProductCatalogue:
+    '''Compact copy of the products table, nutrition values are kept in arrays'''
+
+    def __init__(self, version: int, products: list[Product]):
+        self.version = version
+        self.positions: dict[int, int] = {}
+        self.names: list[str] = []
+        self.calories = array('d')
+        self.proteins = array('d')
+        self.fats = array('d')
+        self.carbs = array('d')
+        # NaN stands for products which can't be measured in pieces
+        self.grams = array('d')
+        self.archived = array('b')
+
+        for position, product in enumerate(products):
+            self.positions[product.id] = position
+            self.names.append(product.name)
+            self.calories.append(product.calories)
+            self.proteins.append(product.proteins)
+            self.fats.append(product.fats)
+            self.carbs.append(product.carbs)
+            self.grams.append(product.grams if product.grams is not None else math.nan)
+            self.archived.append(product.archived)
+
+    def get(self, product_id: int) -> CatalogueProduct | None:
+        position = self.positions.get(product_id)
+        if position is None:
+            return None
+
+        grams = self.grams[position]
+        return CatalogueProduct(
+            id=product_id,
+            name=self.names[position],
+            calories=self.calories[position],
+            proteins=self.proteins[position],
+            fats=self.fats[position],
+            carbs=self.carbs[position],
+            grams=None if math.isnan(grams) else grams,
+            archived=bool(self.archived[position])
+        )
+
+    def get_active(self, product_id: int) -> CatalogueProduct | None:
+        product = self.get(product_id)
+        if product is None or product.archived:
+            return None
+        return product
+
+
+CATALOGUE_LOCK = threading.Lock()
+
+
+def get_catalogue(session: Session) -> ProductCatalogue:
+    '''Returns the products catalogue, reloading it if another worker changed products'''
+    if 'catalogue' in g:
+        return g.catalogue
+
+    version = session.execute(
+        select(CatalogueVersion.version).where(CatalogueVersion.id == 1)
+    ).scalar() or 0
+
+    with CATALOGUE_LOCK:
+        catalogue: ProductCatalogue | None = current_app.extensions.get('catalogue')
+        if catalogue is None or catalogue.version != version:
+            products = session.execute(select(Product).order_by(Product.id)).scalars().all()
+            catalogue = ProductCatalogue(version, list(products))
+            current_app.extensions['catalogue'] = catalogue
+
+    g.catalogue = catalogue
+    return catalogue
+
+
+def bump_catalogue_version(session: Session):
+    '''Marks cached catalogues outdated, must be committed with the product change'''
+    session.execute(
+        update(CatalogueVersion)
+        .where(CatalogueVersion.id == 1)
+        .values(version=CatalogueVersion.version + 1)
+    )
+    g.pop('catalogue', None)
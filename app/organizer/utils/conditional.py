@@ -0,0 +1,90 @@
+import functools
+import hashlib
+from datetime import datetime, timezone
+from typing import Any
+
+from flask import Response, g, make_response, request
+from sqlalchemy import func, select, update
+from sqlalchemy.orm import Session
+
+from organizer.db import get_session
+from organizer.schema import CatalogueVersion, Trip
+
+
+def touch_trip(session: Session, trip_id: int):
+    '''Marks the trip as changed, so conditional GETs and cached reports are refreshed'''
+    session.execute(
+        update(Trip)
+        .where(Trip.id == trip_id)
+        .values(last_update=datetime.now(timezone.utc))
+    )
+
+
+def request_trip_uids(trip_uid: str, extra_trips_arg: str | None) -> frozenset[str]:
+    trip_uids = {trip_uid}
+    if extra_trips_arg and extra_trips_arg in request.args:
+        trip_uids.update(uid for uid in request.args[extra_trips_arg].split(',') if uid)
+    return frozenset(trip_uids)
+
+
+def get_trips_state(trip_uids: frozenset[str]) -> Any | None:
+    '''
+    Returns the last update time of the trips and the catalogue version,
+    or None if some trip does not exist. Memoized for the request.
+    '''
+    states: dict[frozenset[str], Any] = g.setdefault('trips_states', {})
+    if trip_uids in states:
+        return states[trip_uids]
+
+    with get_session() as session:
+        state = session.execute(
+            select(
+                func.count(Trip.id).label('trips_count'),
+                func.max(Trip.last_update).label('last_update'),
+                select(CatalogueVersion.version)
+                .where(CatalogueVersion.id == 1)
+                .scalar_subquery()
+                .label('catalogue_version'),
+            ).where(Trip.uid.in_(trip_uids))
+        ).one()
+
+    if state.trips_count != len(trip_uids):
+        state = None
+    states[trip_uids] = state
+    return state
+
+
+def trip_conditional_get(extra_trips_arg: str | None = None):
+    '''
+    Answers GET requests for data derived from trips with ETag and
+    Last-Modified headers, returning 304 if the client has the actual data.
+    The check costs a single query done before the view is called.
+    '''
+    def trip_conditional_get_decorator(view):
+        @functools.wraps(view)
+        def wrapped_view(trip_uid: str, **kwargs):
+            state = get_trips_state(request_trip_uids(trip_uid, extra_trips_arg))
+            if state is None:
+                # let the view report the missing trip
+                return view(trip_uid=trip_uid, **kwargs)
+
+            etag_source = '|'.join([
+                request.full_path,
+                str(g.user.id),
+                g.user.access_group.name,
+                state.last_update.isoformat(),
+                str(state.catalogue_version),
+            ])
+            etag = hashlib.sha1(etag_source.encode('utf-8')).hexdigest()
+
+            if request.if_none_match.contains(etag):
+                response = Response(status=304)
+            else:
+                response = make_response(view(trip_uid=trip_uid, **kwargs))
+
+            response.set_etag(etag)
+            response.last_modified = state.last_update
+            response.cache_control.no_cache = True
+            return response
+        return wrapped_view
+    return trip_conditional_get_decorator
@@ -0,0 +1,102 @@
+import math
+from typing import Iterable
+
+from sqlalchemy import delete, func, insert, select
+from sqlalchemy.orm import Session
+
+from organizer.schema import MealRecord, Product, TripDayTotal
+from organizer.utils.catalogue import CatalogueProduct
+from organizer.utils.upsert import insert_or_increment
+
+TOTALS_COLUMNS = ['calories', 'proteins', 'fats', 'carbs', 'mass']
+
+
+def day_totals_select(*filters):
+    return (
+        select(
+            MealRecord.trip_id,
+            MealRecord.day_number,
+            MealRecord.meal_number,
+            func.sum(Product.calories * MealRecord.mass / 100.0),
+            func.sum(Product.proteins * MealRecord.mass / 100.0),
+            func.sum(Product.fats * MealRecord.mass / 100.0),
+            func.sum(Product.carbs * MealRecord.mass / 100.0),
+            func.sum(MealRecord.mass),
+        )
+        .join(Product)
+        .where(*filters)
+        .group_by(MealRecord.trip_id, MealRecord.day_number, MealRecord.meal_number)
+    )
+
+
+def refresh_day_totals(session: Session, trip_ids: Iterable[int] | None = None,
+                       days: Iterable[int] | None = None):
+    '''Recalculates totals of the given trips and days, must be committed with the change'''
+    session.flush()
+    totals_filters = []
+    records_filters = []
+    if trip_ids is not None:
+        trip_ids = set(trip_ids)
+        totals_filters.append(TripDayTotal.trip_id.in_(trip_ids))
+        records_filters.append(MealRecord.trip_id.in_(trip_ids))
+    if days is not None:
+        days = set(days)
+        totals_filters.append(TripDayTotal.day_number.in_(days))
+        records_filters.append(MealRecord.day_number.in_(days))
+
+    session.execute(delete(TripDayTotal).where(*totals_filters))
+    session.execute(
+        insert(TripDayTotal).from_select(
+            ['trip_id', 'day_number', 'meal_number'] + TOTALS_COLUMNS,
+            day_totals_select(*records_filters)
+        )
+    )
+
+
+def add_day_totals(session: Session, trip_id: int, day_number: int, meal_number: int,
+                   product: CatalogueProduct, mass: float):
+    '''Adds a mass of the product to the meal totals without recalculating the day'''
+    session.execute(
+        insert_or_increment(session, TripDayTotal,
+                            ['trip_id', 'day_number', 'meal_number'], TOTALS_COLUMNS),
+        {
+            'trip_id': trip_id,
+            'day_number': day_number,
+            'meal_number': meal_number,
+            'calories': product.calories * mass / 100.0,
+            'proteins': product.proteins * mass / 100.0,
+            'fats': product.fats * mass / 100.0,
+            'carbs': product.carbs * mass / 100.0,
+            'mass': mass,
+        }
+    )
+
+
+def refresh_product_day_totals(session: Session, product_id: int):
+    trip_ids = session.execute(
+        select(MealRecord.trip_id).where(MealRecord.product_id == product_id).distinct()
+    ).scalars().all()
+    if trip_ids:
+        refresh_day_totals(session, trip_ids)
+
+
+def find_inconsistent_trips(session: Session) -> list[int]:
+    '''Compares stored totals with the ones calculated from meal records'''
+    expected = {
+        tuple(row[:3]): row[3:]
+        for row in session.execute(day_totals_select())
+    }
+    stored = {
+        (row.trip_id, row.day_number, row.meal_number):
+            [getattr(row, column) for column in TOTALS_COLUMNS]
+        for row in session.execute(select(TripDayTotal)).scalars()
+    }
+
+    inconsistent = set()
+    for key in expected.keys() | stored.keys():
+        if key not in expected or key not in stored or not all(
+            math.isclose(left, right, abs_tol=1e-6)
+            for left, right in zip(expected[key], stored[key])
+        ):
+            inconsistent.add(key[0])
+    return sorted(inconsistent)
@@ -1,7 +1,8 @@
-import requests
-
 from flask import current_app
 
+from organizer.utils.http import http_request
+from organizer.utils.jobs import job_handler
+
 
 def send_email(address: str, subject: str, body: str):
     headers = {
@@ -23,8 +24,13 @@ def send_email(address: str, subject: str, body: str):
         "htmlContent": body
     }
 
-    response = requests.post('https://api.brevo.com/v3/smtp/email',
-                             headers=headers, json=json, timeout=10)
+    response = http_request('brevo', 'POST', current_app.config['BREVO_API_URL'],
+                            headers=headers, json=json)
 
     if response.status_code != 201:
         raise RuntimeError(response.content.decode('utf-8'))
+
+
+@job_handler('email')
+def send_email_job(address: str, subject: str, body: str):
+    send_email(address, subject, body)
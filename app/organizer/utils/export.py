@@ -0,0 +1,122 @@
+import csv
+import io
+import json
+import zipfile
+from typing import Any, Iterable, Iterator
+from xml.sax.saxutils import escape
+
+BOM = bytes([0xEF, 0xBB, 0xBF])
+
+
+class ChunkBuffer(io.RawIOBase):
+    '''Write-only stream whose content is taken out in chunks by a generator'''
+
+    def __init__(self):
+        super().__init__()
+        self.chunks: list[bytes] = []
+        self.position = 0
+
+    def writable(self) -> bool:
+        return True
+
+    def write(self, data) -> int:
+        self.chunks.append(bytes(data))
+        self.position += len(data)
+        return len(data)
+
+    def tell(self) -> int:
+        return self.position
+
+    def take(self) -> bytes:
+        data = b''.join(self.chunks)
+        self.chunks.clear()
+        return data
+
+
+def stream_csv(rows: Iterable[list[Any]]) -> Iterator[bytes]:
+    '''Yields CSV lines prefixed with BOM so Excel detects UTF-8'''
+    yield BOM
+    line = io.StringIO()
+    writer = csv.writer(line, dialect='excel')
+    for row in rows:
+        writer.writerow(row)
+        yield line.getvalue().encode('utf-8')
+        line.seek(0)
+        line.truncate()
+
+
+def stream_json_lines(header: list[str], rows: Iterable[list[Any]]) -> Iterator[bytes]:
+    '''Yields every row as a JSON object keyed by header'''
+    for row in rows:
+        yield (json.dumps(dict(zip(header, row)), ensure_ascii=False) + '\n').encode('utf-8')
+
+
+XLSX_CONTENT_TYPES = '''<?xml version="1.0" encoding="UTF-8" standalone="yes"?>
+<Types xmlns="http://schemas.openxmlformats.org/package/2006/content-types">
+<Default Extension="rels" ContentType="application/vnd.openxmlformats-package.relationships+xml"/>
+<Default Extension="xml" ContentType="application/xml"/>
+<Override PartName="/xl/workbook.xml" ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet.main+xml"/>
+<Override PartName="/xl/worksheets/sheet1.xml" ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.worksheet+xml"/>
+</Types>'''
+
+XLSX_RELS = '''<?xml version="1.0" encoding="UTF-8" standalone="yes"?>
+<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">
+<Relationship Id="rId1" Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/officeDocument" Target="xl/workbook.xml"/>
+</Relationships>'''
+
+XLSX_WORKBOOK = '''<?xml version="1.0" encoding="UTF-8" standalone="yes"?>
+<workbook xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main" xmlns:r="http://schemas.openxmlformats.org/officeDocument/2006/relationships">
+<sheets><sheet name="Sheet1" sheetId="1" r:id="rId1"/></sheets>
+</workbook>'''
+
+XLSX_WORKBOOK_RELS = '''<?xml version="1.0" encoding="UTF-8" standalone="yes"?>
+<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">
+<Relationship Id="rId1" Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/worksheet" Target="worksheets/sheet1.xml"/>
+</Relationships>'''
+
+XLSX_SHEET_START = '''<?xml version="1.0" encoding="UTF-8" standalone="yes"?>
+<worksheet xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main"><sheetData>'''
+
+XLSX_SHEET_END = '</sheetData></worksheet>'
+
+
+def xlsx_cell(value: Any) -> str:
+    if isinstance(value, (int, float)) and not isinstance(value, bool):
+        return f'<c><v>{value}</v></c>'
+    return f'<c t="inlineStr"><is><t>{escape(str(value))}</t></is></c>'
+
+
+def stream_xlsx(rows: Iterable[list[Any]]) -> Iterator[bytes]:
+    '''
+    Yields a single sheet workbook. Cells are written as inline strings,
+    so the sheet is produced row by row without a shared strings table.
+    '''
+    buffer = ChunkBuffer()
+    with zipfile.ZipFile(buffer, 'w', zipfile.ZIP_DEFLATED) as archive:
+        archive.writestr('[Content_Types].xml', XLSX_CONTENT_TYPES)
+        archive.writestr('_rels/.rels', XLSX_RELS)
+        archive.writestr('xl/workbook.xml', XLSX_WORKBOOK)
+        archive.writestr('xl/_rels/workbook.xml.rels', XLSX_WORKBOOK_RELS)
+        yield buffer.take()
+
+        with archive.open('xl/worksheets/sheet1.xml', 'w', force_zip64=True) as sheet:
+            sheet.write(XLSX_SHEET_START.encode('utf-8'))
+            for row in rows:
+                cells = ''.join(xlsx_cell(value) for value in row)
+                sheet.write(f'<row>{cells}</row>'.encode('utf-8'))
+                if buffer.chunks:
+                    yield buffer.take()
+            sheet.write(XLSX_SHEET_END.encode('utf-8'))
+    yield buffer.take()
+
+
+EXPORT_FORMATS = {
+    'csv': ('text/plain', 'data.csv'),
+    'xlsx': ('application/vnd.openxmlformats-officedocument.spreadsheetml.sheet', 'data.xlsx'),
+    'jsonl': ('application/x-ndjson', 'data.jsonl'),
+}
+
+
+def with_header(header: list[str], rows: Iterable[list[Any]]) -> Iterator[list[Any]]:
+    yield header
+    yield from rows
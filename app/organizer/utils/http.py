@@ -0,0 +1,160 @@
+import os
+import threading
+import time
+from typing import Any, NamedTuple
+
+import requests
+from flask import Flask, current_app
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+
+class Integration(NamedTuple):
+    '''Outbound connection policy of an external service'''
+    connect_timeout: float
+    read_timeout: float
+    # retries of connection errors and 502-504 answers, POST requests are not retried
+    retries: int
+
+
+INTEGRATIONS = {
+    # emails are sent by jobs, which are retried by the queue
+    'brevo': Integration(connect_timeout=3.05, read_timeout=10.0, retries=0),
+    'recaptcha': Integration(connect_timeout=3.05, read_timeout=5.0, retries=1),
+    'vk': Integration(connect_timeout=3.05, read_timeout=10.0, retries=2),
+}
+
+
+class IntegrationError(RuntimeError):
+    '''Raised when an external service can't be reached or is considered down'''
+
+
+class CircuitBreaker:
+    '''
+    Stops calling a service after several failures in a row. Once the
+    cooldown is over a single trial request is let through, the others are
+    rejected until it succeeds and closes the breaker or fails and opens it.
+    '''
+
+    def __init__(self, threshold: int, cooldown: float):
+        self.threshold = threshold
+        self.cooldown = cooldown
+        self.lock = threading.Lock()
+        self.failures = 0
+        self.opened_at: float | None = None
+        self.probing = False
+
+    def allow(self) -> bool:
+        with self.lock:
+            if self.opened_at is None:
+                return True
+            if self.probing or time.monotonic() - self.opened_at < self.cooldown:
+                return False
+
+            self.probing = True
+            return True
+
+    def record(self, success: bool):
+        with self.lock:
+            if success:
+                self.failures = 0
+                self.opened_at = None
+                self.probing = False
+                return
+
+            self.failures += 1
+            if self.probing or self.failures >= self.threshold:
+                self.opened_at = time.monotonic()
+                self.probing = False
+
+
+class IntegrationStats:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.results: dict[str, int] = {'ok': 0, 'error': 0, 'rejected': 0}
+        self.duration = 0.0
+
+    def record(self, result: str, duration: float = 0.0):
+        with self.lock:
+            self.results[result] += 1
+            self.duration += duration
+
+    def as_dict(self) -> dict[str, Any]:
+        with self.lock:
+            return {'results': dict(self.results), 'duration': self.duration}
+
+
+class HttpClient:
+    '''Keeps a pooled keep-alive session per integration in each worker process'''
+
+    def __init__(self, config):
+        self.pool_size = config['HTTP_POOL_SIZE']
+        self.breakers = {
+            name: CircuitBreaker(config['HTTP_BREAKER_THRESHOLD'], config['HTTP_BREAKER_COOLDOWN'])
+            for name in INTEGRATIONS
+        }
+        self.stats = {name: IntegrationStats() for name in INTEGRATIONS}
+        self.lock = threading.Lock()
+        self.sessions: dict[str, requests.Session] = {}
+        self.pid = os.getpid()
+
+    def get_session(self, name: str) -> requests.Session:
+        with self.lock:
+            # connections inherited from the gunicorn master must not be shared
+            if self.pid != os.getpid():
+                self.sessions = {}
+                self.pid = os.getpid()
+
+            session = self.sessions.get(name)
+            if session is None:
+                retry = Retry(total=INTEGRATIONS[name].retries, read=0, backoff_factor=0.2,
+                              status_forcelist=(502, 503, 504), raise_on_status=False)
+                adapter = HTTPAdapter(pool_connections=1, pool_maxsize=self.pool_size, max_retries=retry)
+                session = requests.Session()
+                session.mount('https://', adapter)
+                session.mount('http://', adapter)
+                self.sessions[name] = session
+            return session
+
+    def request(self, name: str, method: str, url: str, **kwargs) -> requests.Response:
+        integration = INTEGRATIONS[name]
+        breaker = self.breakers[name]
+        if not breaker.allow():
+            self.stats[name].record('rejected')
+            raise IntegrationError(f'{name} is unavailable')
+
+        started = time.perf_counter()
+        try:
+            response = self.get_session(name).request(
+                method, url, timeout=(integration.connect_timeout, integration.read_timeout), **kwargs)
+        except requests.RequestException as exc:
+            breaker.record(False)
+            self.stats[name].record('error', time.perf_counter() - started)
+            raise IntegrationError(f'{name} request failed: {exc}') from exc
+        except Exception:
+            # a trial request must not stay pending forever
+            breaker.record(False)
+            raise
+
+        success = response.status_code < 500
+        breaker.record(success)
+        self.stats[name].record('ok' if success else 'error', time.perf_counter() - started)
+        return response
+
+    def close(self):
+        with self.lock:
+            for session in self.sessions.values():
+                session.close()
+            self.sessions = {}
+
+
+def get_http_client() -> HttpClient:
+    return current_app.extensions['http']
+
+
+def http_request(name: str, method: str, url: str, **kwargs) -> requests.Response:
+    return get_http_client().request(name, method, url, **kwargs)
+
+
+def init_app(app: Flask):
+    app.extensions['http'] = HttpClient(app.config)
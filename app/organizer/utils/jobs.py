@@ -0,0 +1,159 @@
+import json
+import logging
+import time
+from datetime import datetime, timedelta
+from typing import Any, Callable
+
+import click
+from flask import Flask, after_this_request, current_app, has_request_context
+from flask.cli import with_appcontext
+from sentry_sdk import capture_exception
+from sqlalchemy import func, select, update
+from sqlalchemy.orm import Session
+
+from organizer.db import get_session
+from organizer.schema import Job, JobStatus
+
+LOGGER = logging.getLogger(__name__)
+
+JOB_HANDLERS: dict[str, Callable[..., Any]] = {}
+
+
+def job_handler(kind: str):
+    '''Registers a function to run jobs of the kind, payload is passed as keyword arguments'''
+    def register(handler):
+        JOB_HANDLERS[kind] = handler
+        return handler
+    return register
+
+
+def enqueue_job(session: Session, kind: str, **payload):
+    '''
+    Adds a job to the session, it is committed together with the caller changes.
+    Inline mode runs due jobs right after the current request.
+    '''
+    assert kind in JOB_HANDLERS, f'Unknown job kind {kind}'
+    session.add(Job(kind=kind, payload=json.dumps(payload)))
+
+    if not current_app.config['JOBS_RUN_INLINE']:
+        return
+
+    if has_request_context():
+        @after_this_request
+        def run_jobs(response):
+            run_pending_jobs()
+            return response
+    else:
+        session.commit()
+        run_pending_jobs()
+
+
+def retry_delay(attempts: int) -> timedelta:
+    return timedelta(seconds=current_app.config['JOBS_RETRY_DELAY'] * 2 ** (attempts - 1))
+
+
+def job_timeout() -> timedelta:
+    return timedelta(seconds=current_app.config['JOBS_TIMEOUT'])
+
+
+def claim_job(session: Session, job_id: int, now: datetime) -> bool:
+    '''Marks the job as running unless another worker has done it already'''
+    result = session.execute(update(Job).where(
+        Job.id == job_id,
+        Job.status.in_((JobStatus.Pending, JobStatus.Running)),
+        Job.run_at <= now
+    ).values(status=JobStatus.Running,
+             attempts=Job.attempts + 1,
+             started_at=now,
+             # the job is picked up again if its worker dies
+             run_at=now + job_timeout()))
+    session.commit()
+    return result.rowcount == 1  # type: ignore
+
+
+def run_job(session: Session, job: Job):
+    handler = JOB_HANDLERS.get(job.kind)
+    try:
+        if handler is None:
+            raise RuntimeError(f'Unknown job kind {job.kind}')
+        handler(**json.loads(job.payload))
+    except Exception as exc:
+        if job.attempts >= current_app.config['JOBS_MAX_ATTEMPTS']:
+            capture_exception(exc)
+            job.status = JobStatus.Failed
+            job.finished_at = datetime.utcnow()
+        else:
+            job.status = JobStatus.Pending
+            job.run_at = datetime.utcnow() + retry_delay(job.attempts)
+        job.last_error = repr(exc)
+        LOGGER.warning('Job %s (%s) attempt %s failed: %r', job.id, job.kind, job.attempts, exc)
+    else:
+        job.status = JobStatus.Done
+        job.finished_at = datetime.utcnow()
+        job.last_error = None
+    session.commit()
+
+
+def run_pending_jobs(limit: int = 100) -> int:
+    '''Runs due jobs and returns how many of them were run'''
+    now = datetime.utcnow()
+    with get_session() as session:
+        job_ids = session.execute(
+            select(Job.id).where(Job.status.in_((JobStatus.Pending, JobStatus.Running)),
+                                 Job.run_at <= now)
+            .order_by(Job.run_at).limit(limit)
+        ).scalars().all()
+
+        count = 0
+        for job_id in job_ids:
+            if not claim_job(session, job_id, now):
+                continue
+            run_job(session, session.get_one(Job, job_id))
+            count += 1
+        return count
+
+
+def collect_job_metrics(window: timedelta = timedelta(hours=1)) -> dict[str, Any]:
+    '''Queue size by status and latency of the jobs done within the window'''
+    since = datetime.utcnow() - window
+    with get_session() as session:
+        counts = dict(session.execute(
+            select(Job.status, func.count()).group_by(Job.status)
+        ).tuples().all())
+        done = session.execute(
+            select(Job.created_at, Job.started_at, Job.finished_at)
+            .where(Job.status == JobStatus.Done, Job.finished_at >= since)
+        ).all()
+
+    return {
+        'jobs': {status.name.lower(): counts.get(status, 0) for status in JobStatus},
+        'job_latency': {
+            'count': len(done),
+            # from enqueueing to the end of the last attempt
+            'total': sum((finished_at - created_at).total_seconds()
+                         for created_at, _, finished_at in done),
+            'run': sum((finished_at - started_at).total_seconds()
+                       for _, started_at, finished_at in done),
+        },
+    }
+
+
+@click.command('run-jobs')
+@click.option('--once', is_flag=True, help='Run due jobs and exit.')
+@click.option('--poll-interval', default=1.0, show_default=True, help='Seconds between queue polls.')
+@with_appcontext
+def run_jobs_command(once, poll_interval):
+    """Run background jobs, e.g. emails sending."""
+    while True:
+        count = run_pending_jobs()
+        if once:
+            click.echo(f'Jobs run: {count}')
+            return
+        if not count:
+            time.sleep(poll_interval)
+
+
+def init_app(app: Flask):
+    # handlers register themselves when their modules are imported
+    from organizer.utils import email
+    app.cli.add_command(run_jobs_command)
@@ -0,0 +1,78 @@
+import atexit
+import threading
+import weakref
+from datetime import datetime, timedelta, timezone
+
+from flask import Flask, current_app
+from sqlalchemy import update
+
+from organizer.db import get_session
+from organizer.schema import User
+
+
+class LastSeenBuffer:
+    '''Coalesces users last access time and writes it to the DB in bulk'''
+
+    def __init__(self, update_interval: timedelta, flush_interval: timedelta):
+        self.update_interval = update_interval
+        self.flush_interval = flush_interval
+        self.lock = threading.Lock()
+        self.recorded: dict[int, datetime] = {}
+        self.pending: dict[int, datetime] = {}
+        self.last_flush = datetime.now(timezone.utc)
+
+    def touch(self, user_id: int, now: datetime) -> bool:
+        '''Records the access and returns True if the buffer should be flushed'''
+        with self.lock:
+            last_recorded = self.recorded.get(user_id)
+            if last_recorded is None or now - last_recorded >= self.update_interval:
+                self.recorded[user_id] = now
+                self.pending[user_id] = now
+            return bool(self.pending) and now - self.last_flush >= self.flush_interval
+
+    def take_pending(self) -> dict[int, datetime]:
+        with self.lock:
+            pending = self.pending
+            self.pending = {}
+            self.last_flush = datetime.now(timezone.utc)
+            return pending
+
+
+def get_last_seen_buffer() -> LastSeenBuffer:
+    return current_app.extensions['last_seen']
+
+
+def touch_last_seen(user_id: int):
+    buffer = get_last_seen_buffer()
+    if buffer.touch(user_id, datetime.now(timezone.utc)):
+        flush_last_seen()
+
+
+def flush_last_seen():
+    pending = get_last_seen_buffer().take_pending()
+    if not pending:
+        return
+
+    with get_session() as session:
+        session.execute(update(User), [
+            {'id': user_id, 'last_logged_in': last_seen}
+            for user_id, last_seen in pending.items()
+        ])
+        session.commit()
+
+
+def flush_on_exit(app_ref: weakref.ref):
+    app = app_ref()
+    if app is None:
+        return
+
+    with app.app_context():
+        flush_last_seen()
+
+
+def init_app(app: Flask):
+    app.extensions['last_seen'] = LastSeenBuffer(
+        timedelta(seconds=app.config['LAST_SEEN_UPDATE_INTERVAL']),
+        timedelta(seconds=app.config['LAST_SEEN_FLUSH_INTERVAL'])
+    )
+    atexit.register(flush_on_exit, weakref.ref(app))
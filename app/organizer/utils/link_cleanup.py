@@ -0,0 +1,92 @@
+import logging
+import threading
+from datetime import datetime
+
+import click
+from flask import Flask
+from flask.cli import with_appcontext
+from sentry_sdk import capture_exception
+from sqlalchemy import delete, select
+from sqlalchemy.orm import Session
+
+from organizer.db import get_session
+from organizer.schema import PasswordLink, SharingLink
+
+LOGGER = logging.getLogger(__name__)
+
+LINK_MODELS = {
+    'sharing links': SharingLink,
+    'password links': PasswordLink,
+}
+
+
+def purge_expired_links(session: Session, batch_size: int = 1000) -> dict[str, int]:
+    '''
+    Deletes expired links in short transactions, each batch is found by the
+    expiration date index. Returns the number of deleted links per table.
+    '''
+    now = datetime.utcnow()
+    deleted = {}
+    for name, model in LINK_MODELS.items():
+        deleted[name] = 0
+        while True:
+            batch = select(model.uuid).where(
+                model.expiration_date < now
+            ).order_by(model.expiration_date).limit(batch_size)
+            count = session.execute(
+                delete(model).where(model.uuid.in_(batch.scalar_subquery()))
+            ).rowcount  # type: ignore
+            session.commit()
+            deleted[name] += count
+            if count < batch_size:
+                break
+    return deleted
+
+
+class LinkCleanupScheduler:
+    '''Purges expired links in a background thread of the process'''
+
+    def __init__(self, app: Flask, interval: int):
+        self.app = app
+        self.interval = interval
+        self.stopped = threading.Event()
+        self.thread = threading.Thread(target=self.run, name='link-cleanup', daemon=True)
+
+    def start(self):
+        self.thread.start()
+
+    def stop(self):
+        self.stopped.set()
+        self.thread.join()
+
+    def run(self):
+        while not self.stopped.wait(self.interval):
+            try:
+                with self.app.app_context():
+                    with get_session() as session:
+                        deleted = purge_expired_links(session, self.app.config['LINK_CLEANUP_BATCH_SIZE'])
+                LOGGER.info('Expired links purged: %s', deleted)
+            except Exception as exc:
+                capture_exception(exc)
+                LOGGER.exception('Expired links purge failed')
+
+
+@click.command('purge-expired-links')
+@click.option('--batch-size', default=1000, show_default=True, help='Links deleted per transaction.')
+@with_appcontext
+def purge_expired_links_command(batch_size):
+    """Delete expired sharing and password links."""
+    with get_session() as session:
+        deleted = purge_expired_links(session, batch_size)
+    for name, count in deleted.items():
+        click.echo(f'{name}: {count}')
+
+
+def init_app(app: Flask):
+    app.cli.add_command(purge_expired_links_command)
+
+    # disabled by default, the jobs worker is the one process that should run it
+    if app.config['LINK_CLEANUP_INTERVAL'] > 0:
+        scheduler = LinkCleanupScheduler(app, app.config['LINK_CLEANUP_INTERVAL'])
+        app.extensions['link_cleanup'] = scheduler
+        scheduler.start()
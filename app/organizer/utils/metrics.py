@@ -0,0 +1,384 @@
+import fcntl
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any
+
+from flask import Flask, Response, current_app, g, request
+
+from organizer.utils.jobs import collect_job_metrics
+
+# seconds, the last bucket is +Inf
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+CACHES = {
+    'user': 'user_cache',
+    'products_count': 'products_count_cache',
+    'report': 'report_cache',
+}
+
+
+class WorkerMetrics:
+    '''Metrics collected by a single worker process'''
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.in_flight = 0
+        self.requests: dict[str, int] = {}
+        self.exceptions: dict[str, int] = {}
+        self.latency: dict[str, list[float]] = {}
+
+    def request_started(self):
+        with self.lock:
+            self.in_flight += 1
+
+    def request_finished(self, blueprint: str, method: str, status: int, duration: float):
+        labels = json.dumps([blueprint, method, str(status)])
+        latency_labels = json.dumps([blueprint, method])
+        with self.lock:
+            self.requests[labels] = self.requests.get(labels, 0) + 1
+            # per bucket counts, then sum and count of observations
+            histogram = self.latency.setdefault(latency_labels, [0] * (len(LATENCY_BUCKETS) + 3))
+            for i, bound in enumerate(LATENCY_BUCKETS):
+                if duration <= bound:
+                    histogram[i] += 1
+            histogram[-3] += 1
+            histogram[-2] += duration
+            histogram[-1] += 1
+
+    def request_torn_down(self, blueprint: str, failed: bool):
+        with self.lock:
+            self.in_flight -= 1
+            if failed:
+                self.exceptions[blueprint] = self.exceptions.get(blueprint, 0) + 1
+
+    def snapshot(self, app: Flask) -> dict[str, Any]:
+        with self.lock:
+            snapshot: dict[str, Any] = {
+                'requests': dict(self.requests),
+                'exceptions': dict(self.exceptions),
+                'latency': {labels: list(values) for labels, values in self.latency.items()},
+                'in_flight': self.in_flight,
+            }
+
+        snapshot['caches'] = {
+            name: app.extensions[key].stats.as_dict()
+            for name, key in CACHES.items()
+            if app.extensions.get(key) is not None
+        }
+
+        http = app.extensions.get('http')
+        snapshot['integrations'] = {
+            name: stats.as_dict() for name, stats in http.stats.items()
+        } if http is not None else {}
+
+        database = app.extensions.get('database')
+        pool = database.engine.pool if database is not None else None
+        snapshot['pool'] = {
+            name: getattr(pool, name)()
+            for name in ('size', 'checkedin', 'checkedout', 'overflow')
+            if hasattr(pool, name)
+        }
+        return snapshot
+
+
+class MetricsStore:
+    '''
+    Keeps a snapshot file per worker in a directory shared by all workers,
+    so any worker can report metrics of the whole service. Counters of exited
+    workers are accumulated in a separate file to never go back.
+    '''
+
+    def __init__(self, directory: str):
+        self.directory = directory
+        self.dead_path = os.path.join(directory, 'dead.json')
+        self.lock_path = os.path.join(directory, 'metrics.lock')
+
+    def worker_path(self, pid: int) -> str:
+        return os.path.join(self.directory, f'worker-{pid}.json')
+
+    def worker_pids(self) -> list[int]:
+        if not os.path.isdir(self.directory):
+            return []
+
+        return [
+            int(name[len('worker-'):-len('.json')])
+            for name in os.listdir(self.directory)
+            if name.startswith('worker-') and name.endswith('.json')
+        ]
+
+    @contextmanager
+    def locked(self, exclusive: bool):
+        '''Serializes accumulation of exited workers with readers of all the files'''
+        os.makedirs(self.directory, exist_ok=True)
+        with open(self.lock_path, 'a', encoding='utf-8') as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX if exclusive else fcntl.LOCK_SH)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock, fcntl.LOCK_UN)
+
+    def write(self, snapshot: dict[str, Any]):
+        os.makedirs(self.directory, exist_ok=True)
+        self.dump(self.worker_path(os.getpid()), snapshot)
+
+    @staticmethod
+    def dump(path: str, snapshot: dict[str, Any]):
+        # threads of a gthread worker may flush at the same time
+        temp_path = f'{path}.{threading.get_ident()}.tmp'
+        with open(temp_path, 'w', encoding='utf-8') as file:
+            json.dump(snapshot, file)
+        os.replace(temp_path, path)
+
+    @staticmethod
+    def load(path: str) -> dict[str, Any] | None:
+        try:
+            with open(path, encoding='utf-8') as file:
+                return json.load(file)
+        except (OSError, ValueError):
+            return None
+
+    def read(self) -> list[tuple[dict[str, Any], bool]]:
+        snapshots = []
+        with self.locked(exclusive=False):
+            dead = self.load(self.dead_path)
+            if dead is not None:
+                snapshots.append((dead, False))
+            for pid in self.worker_pids():
+                snapshot = self.load(self.worker_path(pid))
+                if snapshot is not None:
+                    snapshots.append((snapshot, is_alive(pid)))
+        return snapshots
+
+    def retire(self, pid: int):
+        '''
+        Adds counters of an exited worker to the accumulated ones and removes
+        its file, its gauges are dropped.
+        '''
+        with self.locked(exclusive=True):
+            snapshot = self.load(self.worker_path(pid))
+            if snapshot is not None:
+                dead = self.load(self.dead_path)
+                snapshots = [(snapshot, False)] if dead is None else [(dead, False), (snapshot, False)]
+                self.dump(self.dead_path, merge(snapshots))
+
+            try:
+                os.remove(self.worker_path(pid))
+            except FileNotFoundError:
+                pass
+
+    def clear(self):
+        '''Removes files of all workers, e.g. left by a previous run of the service'''
+        if not os.path.isdir(self.directory):
+            return
+
+        with self.locked(exclusive=True):
+            for name in os.listdir(self.directory):
+                if name.startswith('worker-') or name == 'dead.json':
+                    os.remove(os.path.join(self.directory, name))
+
+    def prune(self):
+        '''Retires exited workers, so their pids can't be taken for running ones'''
+        for pid in self.worker_pids():
+            if not is_alive(pid):
+                self.retire(pid)
+
+
+def is_alive(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+def merge(snapshots: list[tuple[dict[str, Any], bool]]) -> dict[str, Any]:
+    '''
+    Sums snapshots of all workers. Counters of exited workers are kept,
+    gauges are taken only from the running ones.
+    '''
+    merged: dict[str, Any] = {
+        'requests': {}, 'exceptions': {}, 'latency': {}, 'caches': {}, 'integrations': {}, 'pool': {},
+        'in_flight': 0,
+    }
+    for snapshot, alive in snapshots:
+        for section in ('requests', 'exceptions'):
+            for labels, value in snapshot[section].items():
+                merged[section][labels] = merged[section].get(labels, 0) + value
+        for labels, values in snapshot['latency'].items():
+            total = merged['latency'].setdefault(labels, [0] * len(values))
+            merged['latency'][labels] = [left + right for left, right in zip(total, values)]
+        for name, stats in snapshot['caches'].items():
+            total = merged['caches'].setdefault(name, {'hits': 0, 'misses': 0})
+            total['hits'] += stats['hits']
+            total['misses'] += stats['misses']
+        for name, stats in snapshot.get('integrations', {}).items():
+            total = merged['integrations'].setdefault(name, {'results': {}, 'duration': 0.0})
+            for result, value in stats['results'].items():
+                total['results'][result] = total['results'].get(result, 0) + value
+            total['duration'] += stats['duration']
+
+        if alive:
+            merged['in_flight'] += snapshot['in_flight']
+            for name, value in snapshot['pool'].items():
+                merged['pool'][name] = merged['pool'].get(name, 0) + value
+    return merged
+
+
+def format_labels(**labels: str) -> str:
+    return '{' + ','.join(f'{name}="{value}"' for name, value in labels.items()) + '}'
+
+
+def render(merged: dict[str, Any]) -> str:
+    '''Formats metrics in Prometheus text exposition format'''
+    lines = [
+        '# HELP organizer_requests_total Handled HTTP requests.',
+        '# TYPE organizer_requests_total counter',
+    ]
+    for labels, value in sorted(merged['requests'].items()):
+        blueprint, method, status = json.loads(labels)
+        lines.append('organizer_requests_total'
+                     f'{format_labels(blueprint=blueprint, method=method, status=status)} {value}')
+
+    lines += [
+        '# HELP organizer_request_duration_seconds Time spent handling HTTP requests.',
+        '# TYPE organizer_request_duration_seconds histogram',
+    ]
+    for labels, values in sorted(merged['latency'].items()):
+        blueprint, method = json.loads(labels)
+        for bound, count in zip([str(bound) for bound in LATENCY_BUCKETS] + ['+Inf'], values):
+            lines.append('organizer_request_duration_seconds_bucket'
+                         f'{format_labels(blueprint=blueprint, method=method, le=bound)} {count}')
+        lines.append('organizer_request_duration_seconds_sum'
+                     f'{format_labels(blueprint=blueprint, method=method)} {values[-2]}')
+        lines.append('organizer_request_duration_seconds_count'
+                     f'{format_labels(blueprint=blueprint, method=method)} {values[-1]}')
+
+    lines += [
+        '# HELP organizer_request_exceptions_total Requests failed with unhandled exceptions.',
+        '# TYPE organizer_request_exceptions_total counter',
+    ]
+    for blueprint, value in sorted(merged['exceptions'].items()):
+        lines.append(f'organizer_request_exceptions_total{format_labels(blueprint=blueprint)} {value}')
+
+    lines += [
+        '# HELP organizer_requests_in_flight Requests being handled right now.',
+        '# TYPE organizer_requests_in_flight gauge',
+        f'organizer_requests_in_flight {merged["in_flight"]}',
+        '# HELP organizer_db_pool_connections Database pool connections of running workers.',
+        '# TYPE organizer_db_pool_connections gauge',
+    ]
+    for state, value in sorted(merged['pool'].items()):
+        lines.append(f'organizer_db_pool_connections{format_labels(state=state)} {value}')
+
+    lines += [
+        '# HELP organizer_cache_requests_total Cache lookups by result.',
+        '# TYPE organizer_cache_requests_total counter',
+    ]
+    for cache, stats in sorted(merged['caches'].items()):
+        for result, key in (('hit', 'hits'), ('miss', 'misses')):
+            lines.append('organizer_cache_requests_total'
+                         f'{format_labels(cache=cache, result=result)} {stats[key]}')
+
+    lines += [
+        '# HELP organizer_integration_requests_total Requests to external services by result.',
+        '# TYPE organizer_integration_requests_total counter',
+    ]
+    for integration, stats in sorted(merged['integrations'].items()):
+        for result, value in sorted(stats['results'].items()):
+            lines.append('organizer_integration_requests_total'
+                         f'{format_labels(integration=integration, result=result)} {value}')
+
+    lines += [
+        '# HELP organizer_integration_duration_seconds Time spent in requests to external services.',
+        '# TYPE organizer_integration_duration_seconds summary',
+    ]
+    for integration, stats in sorted(merged['integrations'].items()):
+        # rejected requests are not sent, so they don't count
+        count = stats['results'].get('ok', 0) + stats['results'].get('error', 0)
+        lines.append('organizer_integration_duration_seconds_sum'
+                     f'{format_labels(integration=integration)} {stats["duration"]}')
+        lines.append('organizer_integration_duration_seconds_count'
+                     f'{format_labels(integration=integration)} {count}')
+
+    if 'jobs' in merged:
+        lines += [
+            '# HELP organizer_jobs Background jobs by status.',
+            '# TYPE organizer_jobs gauge',
+        ]
+        for status, value in sorted(merged['jobs'].items()):
+            lines.append(f'organizer_jobs{format_labels(status=status)} {value}')
+
+        # the window slides, so these are gauges rather than a cumulative summary
+        latency = merged['job_latency']
+        lines += [
+            '# HELP organizer_job_latency_seconds_last_hour_sum Latency of jobs done within the last hour.',
+            '# TYPE organizer_job_latency_seconds_last_hour_sum gauge',
+        ]
+        for stage in ('total', 'run'):
+            lines.append(f'organizer_job_latency_seconds_last_hour_sum{format_labels(stage=stage)} {latency[stage]}')
+        lines += [
+            '# HELP organizer_job_latency_seconds_last_hour_count Jobs done within the last hour.',
+            '# TYPE organizer_job_latency_seconds_last_hour_count gauge',
+            f'organizer_job_latency_seconds_last_hour_count {latency["count"]}',
+        ]
+    return '\n'.join(lines) + '\n'
+
+
+def get_worker_metrics() -> WorkerMetrics:
+    return current_app.extensions['metrics']
+
+
+def flush_metrics(app: Flask):
+    app.extensions['metrics_store'].write(app.extensions['metrics'].snapshot(app))
+    app.extensions['metrics_flushed_at'] = time.monotonic()
+
+
+def collect_metrics() -> str:
+    app = current_app._get_current_object()  # type: ignore
+    flush_metrics(app)
+    merged = merge(app.extensions['metrics_store'].read())
+    # the queue is shared by all workers, so it is read from the database
+    merged.update(collect_job_metrics())
+    return render(merged)
+
+
+def request_blueprint() -> str:
+    return request.blueprint or 'none'
+
+
+def start_request():
+    g.metrics_started = time.perf_counter()
+    get_worker_metrics().request_started()
+
+
+def finish_request(response: Response) -> Response:
+    if 'metrics_started' in g:
+        get_worker_metrics().request_finished(request_blueprint(), request.method,
+                                              response.status_code,
+                                              time.perf_counter() - g.metrics_started)
+    return response
+
+
+def teardown_request(exc: BaseException | None):
+    if 'metrics_started' not in g:
+        return
+
+    app = current_app._get_current_object()  # type: ignore
+    get_worker_metrics().request_torn_down(request_blueprint(), exc is not None)
+    if time.monotonic() - app.extensions['metrics_flushed_at'] > app.config['METRICS_FLUSH_INTERVAL']:
+        flush_metrics(app)
+
+
+def init_app(app: Flask):
+    app.extensions['metrics'] = WorkerMetrics()
+    app.extensions['metrics_store'] = MetricsStore(app.config['METRICS_DIR'])
+    app.extensions['metrics_store'].prune()
+    app.extensions['metrics_flushed_at'] = 0.0
+    app.before_request(start_request)
+    app.after_request(finish_request)
+    app.teardown_request(teardown_request)
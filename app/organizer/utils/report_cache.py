@@ -0,0 +1,123 @@
+import functools
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Hashable
+
+from flask import Flask, current_app
+
+from organizer.utils.conditional import get_trips_state, request_trip_uids
+from organizer.utils.ttl_cache import CacheStats
+
+
+class MemoryReportCache:
+    '''Keeps the most recently used reports in the worker memory'''
+
+    def __init__(self, max_entries: int):
+        self.max_entries = max_entries
+        self.lock = threading.Lock()
+        self.entries: OrderedDict[Hashable, Any] = OrderedDict()
+        self.stats = CacheStats()
+
+    def get(self, key: Hashable) -> Any | None:
+        with self.lock:
+            report = self.entries.get(key)
+            if report is not None:
+                self.entries.move_to_end(key)
+        self.stats.record(report is not None)
+        return report
+
+    def put(self, key: Hashable, report: Any):
+        with self.lock:
+            self.entries[key] = report
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+
+
+class SQLiteReportCache:
+    '''Keeps reports in a local SQLite file shared by all workers of the host'''
+
+    def __init__(self, path: str, max_entries: int):
+        self.path = path
+        self.max_entries = max_entries
+        self.local = threading.local()
+        self.stats = CacheStats()
+
+        with self.connect() as connection:
+            connection.execute('PRAGMA journal_mode=WAL')
+            connection.execute('CREATE TABLE IF NOT EXISTS reports '
+                               '(key TEXT PRIMARY KEY, report TEXT NOT NULL, used_at REAL NOT NULL)')
+
+    def connect(self) -> sqlite3.Connection:
+        # connections are opened per thread and per process
+        connection = getattr(self.local, 'connection', None)
+        if connection is None or getattr(self.local, 'pid', None) != os.getpid():
+            connection = sqlite3.connect(self.path, timeout=5.0)
+            self.local.connection = connection
+            self.local.pid = os.getpid()
+        return connection
+
+    def get(self, key: Hashable) -> Any | None:
+        with self.connect() as connection:
+            row = connection.execute('SELECT report FROM reports WHERE key = ?',
+                                     (repr(key),)).fetchone()
+            if row is not None:
+                connection.execute('UPDATE reports SET used_at = ? WHERE key = ?',
+                                   (time.time(), repr(key)))
+        self.stats.record(row is not None)
+        return json.loads(row[0]) if row is not None else None
+
+    def put(self, key: Hashable, report: Any):
+        with self.connect() as connection:
+            connection.execute('INSERT OR REPLACE INTO reports (key, report, used_at) VALUES (?, ?, ?)',
+                               (repr(key), json.dumps(report), time.time()))
+            connection.execute('DELETE FROM reports WHERE key NOT IN '
+                               '(SELECT key FROM reports ORDER BY used_at DESC LIMIT ?)',
+                               (self.max_entries,))
+
+
+def get_report_cache() -> MemoryReportCache | SQLiteReportCache | None:
+    return current_app.extensions.get('report_cache')
+
+
+def cached_report(report_type: str, extra_trips_arg: str | None = None):
+    '''
+    Caches reports built from trips data, the key changes with every trip
+    update and every products catalogue change so no invalidation is needed.
+    '''
+    def cached_report_decorator(view):
+        @functools.wraps(view)
+        def wrapped_view(trip_uid: str, **kwargs):
+            cache = get_report_cache()
+            trip_uids = request_trip_uids(trip_uid, extra_trips_arg)
+            state = get_trips_state(trip_uids) if cache is not None else None
+            if state is None:
+                return view(trip_uid=trip_uid, **kwargs)
+
+            key = (tuple(sorted(trip_uids)), state.last_update.isoformat(),
+                   state.catalogue_version, report_type)
+            report = cache.get(key)
+            if report is None:
+                report = view(trip_uid=trip_uid, **kwargs)
+                cache.put(key, report)
+            return report
+        return wrapped_view
+    return cached_report_decorator
+
+
+def init_app(app: Flask):
+    backend = app.config['REPORT_CACHE']
+    if backend == 'memory':
+        app.extensions['report_cache'] = MemoryReportCache(app.config['REPORT_CACHE_SIZE'])
+    elif backend == 'sqlite':
+        os.makedirs(app.instance_path, exist_ok=True)
+        app.extensions['report_cache'] = SQLiteReportCache(
+            os.path.join(app.instance_path, 'report_cache.sqlite'),
+            app.config['REPORT_CACHE_SIZE']
+        )
+    elif backend != 'none':
+        raise ValueError(f'Unknown report cache backend: {backend}')
@@ -0,0 +1,127 @@
+import json
+import logging
+import re
+import time
+from collections import Counter
+
+from flask import Flask, Response, current_app, g, has_request_context, request
+from sqlalchemy import Engine, event
+
+from organizer.schema import AccessGroup
+
+LITERALS = re.compile(r"'(?:[^']|'')*'|\b\d+(?:\.\d+)?\b")
+SPACES = re.compile(r'\s+')
+PLACEHOLDER_LISTS = re.compile(r'\((?:\s*(?:\?|%\(\w+\)s|\$\d+)\s*,?)+\)')
+
+
+def fingerprint(statement: str) -> str:
+    '''Normalizes the statement, so the same query with other values matches'''
+    statement = LITERALS.sub('?', statement)
+    statement = PLACEHOLDER_LISTS.sub('(?)', statement)
+    return SPACES.sub(' ', statement).strip()
+
+
+class SqlStats:
+    '''Statements executed while handling a single request'''
+
+    def __init__(self):
+        self.count = 0
+        self.duration = 0.0
+        self.status: int | None = None
+        self.fingerprints: Counter[str] = Counter()
+
+    def record(self, statement: str, duration: float):
+        self.count += 1
+        self.duration += duration
+        self.fingerprints[fingerprint(statement)] += 1
+
+    def repeated(self, threshold: int) -> dict[str, int]:
+        return {
+            statement: count
+            for statement, count in self.fingerprints.items()
+            if count >= threshold
+        }
+
+
+def get_sql_stats() -> SqlStats | None:
+    return g.get('sql_stats') if has_request_context() else None
+
+
+def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault('query_start', []).append(time.perf_counter())
+
+
+def after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    started = conn.info['query_start'].pop()
+    stats = get_sql_stats()
+    if stats is not None:
+        stats.record(statement, time.perf_counter() - started)
+
+
+def handle_error(context):
+    if context.connection is not None:
+        starts = context.connection.info.get('query_start')
+        if starts:
+            starts.pop()
+
+
+def instrument_engine(engine: Engine):
+    event.listen(engine, 'before_cursor_execute', before_cursor_execute)
+    event.listen(engine, 'after_cursor_execute', after_cursor_execute)
+    event.listen(engine, 'handle_error', handle_error)
+
+
+def start_request():
+    g.sql_stats = SqlStats()
+
+
+def server_timing_allowed() -> bool:
+    '''Query numbers reveal how handlers work, so they are not shown to everyone'''
+    if current_app.config['SQL_STATS_SERVER_TIMING']:
+        return True
+
+    user = g.get('user')
+    return user is not None and user.access_group == AccessGroup.Administrator
+
+
+def finish_request(response: Response) -> Response:
+    stats = get_sql_stats()
+    if stats is None:
+        return response
+
+    # the body of a streamed response may run more queries, they are reported on teardown
+    stats.status = response.status_code
+    if stats.count and server_timing_allowed():
+        response.headers.add('Server-Timing',
+                             f'db;dur={stats.duration * 1000:.1f};desc="{stats.count} queries"')
+    return response
+
+
+def teardown_request(exc: BaseException | None):
+    stats = get_sql_stats()
+    if stats is None or not stats.count:
+        return
+
+    repeated = stats.repeated(current_app.config['SQL_REPEATED_THRESHOLD'])
+    if current_app.config['SQL_STATS_LOG'] or repeated:
+        current_app.logger.log(
+            # repeated statements are likely N+1 queries
+            logging.WARNING if repeated else logging.INFO,
+            json.dumps({
+                'event': 'sql_stats',
+                'method': request.method,
+                'path': request.path,
+                'status': stats.status if exc is None else 500,
+                'queries': stats.count,
+                'db_ms': round(stats.duration * 1000, 1),
+                'repeated': repeated,
+            })
+        )
+
+
+def init_app(app: Flask):
+    if app.config['SQL_STATS_LOG']:
+        app.logger.setLevel(logging.INFO)
+    app.before_request(start_request)
+    app.after_request(finish_request)
+    app.teardown_request(teardown_request)
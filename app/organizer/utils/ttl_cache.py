@@ -0,0 +1,70 @@
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Hashable
+
+
+class CacheStats:
+    '''Counts cache lookups of a single worker'''
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def record(self, hit: bool):
+        with self.lock:
+            if hit:
+                self.hits += 1
+            else:
+                self.misses += 1
+
+    def as_dict(self) -> dict[str, int]:
+        with self.lock:
+            return {'hits': self.hits, 'misses': self.misses}
+
+
+class TTLCache:
+    '''
+    Thread safe in-process cache which forgets entries after a timeout,
+    least recently used entries are evicted above max_entries.
+    '''
+
+    def __init__(self, ttl: float, max_entries: int):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.lock = threading.Lock()
+        self.entries: OrderedDict[Hashable, tuple[float, Any]] = OrderedDict()
+        self.stats = CacheStats()
+
+    def get(self, key: Hashable) -> Any | None:
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is not None and entry[0] < time.monotonic():
+                del self.entries[key]
+                entry = None
+            elif entry is not None:
+                self.entries.move_to_end(key)
+
+        self.stats.record(entry is not None)
+        return entry[1] if entry is not None else None
+
+    def put(self, key: Hashable, value: Any):
+        now = time.monotonic()
+        with self.lock:
+            self.entries[key] = (now + self.ttl, value)
+            self.entries.move_to_end(key)
+            # expired entries which are not looked up anymore gather at the front
+            while self.entries:
+                oldest_key, (expires_at, _) = next(iter(self.entries.items()))
+                if expires_at >= now and len(self.entries) <= self.max_entries:
+                    break
+                del self.entries[oldest_key]
+
+    def invalidate(self, key: Hashable):
+        with self.lock:
+            self.entries.pop(key, None)
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
@@ -0,0 +1,28 @@
+from typing import Any, Iterable
+
+from sqlalchemy import Select
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.orm import Session
+
+
+def insert_or_increment(session: Session, model: Any, index_elements: list[str],
+                        increment: Iterable[str], columns: list[str] | None = None,
+                        select: Select | None = None):
+    '''
+    Builds INSERT ... ON CONFLICT DO UPDATE statement adding inserted values
+    of the increment columns to the existing row with the same index elements.
+    Values are given either on execution or with INSERT ... SELECT.
+    '''
+    dialect = session.get_bind().dialect.name
+    statement = (postgresql.insert if dialect == 'postgresql' else sqlite.insert)(model)
+    if select is not None:
+        assert columns
+        statement = statement.from_select(columns, select)
+
+    return statement.on_conflict_do_update(
+        index_elements=index_elements,
+        set_={
+            column: getattr(model, column) + getattr(statement.excluded, column)
+            for column in increment
+        },
+    )
@@ -0,0 +1,16 @@
+from flask import Flask, current_app
+
+from organizer.utils.ttl_cache import TTLCache
+
+
+def get_user_cache() -> TTLCache:
+    '''Keeps resolved logged in users for a short time to avoid DB lookups'''
+    return current_app.extensions['user_cache']
+
+
+def invalidate_cached_user(user_id: int):
+    get_user_cache().invalidate(user_id)
+
+
+def init_app(app: Flask):
+    app.extensions['user_cache'] = TTLCache(app.config['USER_CACHE_TTL'], app.config['USER_CACHE_SIZE'])
@@ -2,5 +2,5 @@
 # migrate database
 alembic upgrade head
 
-# then run the app
-exec gunicorn organizer.wsgi:app -b 0.0.0.0:8000 --workers=4 --access-logfile=- --error-logfile=-
+# then run the app, see gunicorn.conf.py for the serving mode settings
+exec gunicorn -c gunicorn.conf.py organizer.wsgi:app
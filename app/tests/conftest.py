@@ -1,21 +1,28 @@
 import os
+import shutil
 import tempfile
+from contextlib import contextmanager
 
+from flask import g, request, request_tearing_down
 from flask.testing import FlaskClient
 import pytest
 from organizer import create_app
-from organizer.db import re_init_schema, init_connection, init_fake_data
+from organizer.db import re_init_schema, init_connection, init_fake_data, close_connection
+from organizer.utils.last_seen import flush_last_seen
 
 
 @pytest.fixture
 def app():
     db_fd, db_path = tempfile.mkstemp()
+    metrics_dir = tempfile.mkdtemp()
 
     application = create_app({
         'ENV': 'production',
         'TESTING': True,
         'DATABASE': 'sqlite:///' + db_path,
-        'VK_CLIENT_ID': 'test_vk_client_id'
+        'VK_CLIENT_ID': 'test_vk_client_id',
+        'METRICS_DIR': metrics_dir,
+        'JOBS_RUN_INLINE': True,
     })
 
     with application.app_context():
@@ -25,8 +32,12 @@ def app():
 
     yield application
 
+    with application.app_context():
+        flush_last_seen()
+    close_connection(application)
     os.close(db_fd)
     os.unlink(db_path)
+    shutil.rmtree(metrics_dir)
 
 
 @pytest.fixture
@@ -59,3 +70,30 @@ def admin_logged_client(client: FlaskClient):
 @pytest.fixture
 def runner(app):
     return app.test_cli_runner()
+
+
+@pytest.fixture
+def query_budget(app):
+    '''
+    Fails the test if any request made inside the block issues more
+    statements than the budget:
+
+        with query_budget(3):
+            client.get('/api/trips/')
+    '''
+    @contextmanager
+    def check_budget(max_queries: int):
+        exceeded: list[str] = []
+
+        # streamed responses run queries until the request is torn down
+        def check_request(sender, **extra):
+            stats = g.get('sql_stats')
+            if stats is not None and stats.count > max_queries:
+                exceeded.append(f'{request.method} {request.path}: {stats.count} queries, '
+                                f'repeated: {stats.repeated(2)}')
+
+        with request_tearing_down.connected_to(check_request, app):
+            yield
+        assert not exceeded, f'Query budget of {max_queries} exceeded by {exceeded}'
+
+    return check_budget
@@ -6,6 +6,7 @@ from flask.testing import FlaskClient
 
 from organizer.db import get_session
 from organizer.schema import User, PasswordLink
+from organizer.utils.last_seen import flush_last_seen, get_last_seen_buffer
 
 
 def test_auth_can_see_login_page(client: FlaskClient):
@@ -24,6 +25,7 @@ def test_auth_any_access_updates_last_login(admin_logged_client: FlaskClient, ap
     assert response.status_code == 200
 
     with app.app_context():
+        flush_last_seen()
         with get_session() as session:
             user = session.query(User).where(User.login == "Administrator").one()
             second_date = user.last_logged_in
@@ -31,6 +33,45 @@ def test_auth_any_access_updates_last_login(admin_logged_client: FlaskClient, ap
     assert first_date != second_date
 
 
+def test_auth_access_does_not_write_before_flush(admin_logged_client: FlaskClient, app: Flask):
+    with app.app_context():
+        with get_session() as session:
+            user = session.query(User).where(User.login == "Administrator").one()
+            first_date = user.last_logged_in
+
+    response = admin_logged_client.get('/api/trips/')
+    assert response.status_code == 200
+
+    with app.app_context():
+        assert get_last_seen_buffer().pending
+        with get_session() as session:
+            user = session.query(User).where(User.login == "Administrator").one()
+            assert user.last_logged_in == first_date
+
+
+def test_auth_access_coalesces_last_login(admin_logged_client: FlaskClient, app: Flask):
+    admin_logged_client.get('/api/trips/')
+    with app.app_context():
+        flush_last_seen()
+
+    admin_logged_client.get('/api/trips/')
+    with app.app_context():
+        assert not get_last_seen_buffer().pending
+
+
+def test_auth_users_list_shows_buffered_last_login(admin_logged_client: FlaskClient, app: Flask):
+    with app.app_context():
+        with get_session() as session:
+            user = session.query(User).where(User.login == "Administrator").one()
+            user.last_logged_in = datetime(2000, 1, 1)
+            session.commit()
+
+    response = admin_logged_client.get('/api/users/')
+    assert response.status_code == 200
+    admin = next(user for user in response.json if user['login'] == 'Administrator')
+    assert '2000' not in admin['last_logged_in']
+
+
 def test_auth_logout_requires_login(client: FlaskClient):
     response = client.get('/auth/logout')
     assert response.status_code == 302
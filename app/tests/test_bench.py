@@ -0,0 +1,98 @@
+import threading
+
+import pytest
+from flask import Flask
+from sqlalchemy import func, select
+from werkzeug.serving import make_server
+
+from organizer.bench.generator import SMALL_SCALE, generate_bench_data
+from organizer.bench.harness import API_MIX, format_load_results, format_results, run_benchmark, \
+    run_load_test
+from organizer.db import get_session, re_init_schema
+from organizer.schema import AccessGroup, MealRecord, Trip, TripAccess, User
+from organizer.utils.day_totals import find_inconsistent_trips
+
+
+def fill_bench_data(app: Flask) -> dict[str, int]:
+    with app.app_context():
+        re_init_schema()
+        with get_session() as session:
+            return generate_bench_data(session, SMALL_SCALE)
+
+
+def test_bench_data_is_consistent(app: Flask):
+    counts = fill_bench_data(app)
+    assert counts['trips'] == SMALL_SCALE.trips
+    assert counts['meal records'] > 0
+
+    with app.app_context():
+        with get_session() as session:
+            assert session.execute(select(func.count(Trip.id))).scalar() == SMALL_SCALE.trips
+            assert not find_inconsistent_trips(session)
+            # trips are never shared with their owners
+            assert not session.execute(
+                select(TripAccess).join(Trip).where(Trip.created_by == TripAccess.user_id)
+            ).first()
+            assert session.execute(select(func.max(MealRecord.day_number))).scalar() <= \
+                SMALL_SCALE.max_trip_days
+
+
+def test_bench_data_is_reproducible(app: Flask):
+    first = fill_bench_data(app)
+    assert fill_bench_data(app) == first
+
+
+def test_bench_runs_api_mix(app: Flask):
+    fill_bench_data(app)
+    results = run_benchmark(app, 80, warmup=5)
+
+    assert set(results) <= {name for name, _, _ in API_MIX}
+    assert sum(summary['requests'] for summary in results.values()) == 80
+    for summary in results.values():
+        assert summary['errors'] == 0
+        assert summary['p50_ms'] <= summary['p95_ms'] <= summary['p99_ms']
+        assert summary['queries_avg'] > 0
+
+    table = format_results(results, results)
+    assert 'p95 change' in table
+    assert '+0.0%' in table
+
+
+def test_init_bench_data_command(app: Flask, runner):
+    result = runner.invoke(args=['init-bench-data', '--small'])
+    assert 'meal records' in result.output
+    with app.app_context():
+        with get_session() as session:
+            assert session.execute(select(func.count(Trip.id))).scalar() == SMALL_SCALE.trips
+
+
+def test_load_test_runs_against_server(app: Flask):
+    fill_bench_data(app)
+    server = make_server('127.0.0.1', 0, app, threaded=True)
+    thread = threading.Thread(target=server.serve_forever)
+    thread.start()
+    try:
+        results = run_load_test(app, f'http://127.0.0.1:{server.port}', 40, concurrency=4)
+    finally:
+        server.shutdown()
+        thread.join()
+
+    assert results['requests'] == 40
+    assert results['errors'] == 0
+    assert results['throughput_rps'] > 0
+    assert results['p50_ms'] <= results['p95_ms'] <= results['p99_ms']
+
+    table = format_load_results(results, results)
+    assert 'throughput change' in table
+    assert '+0.0%' in table
+
+
+def test_bench_rejects_user_without_trips(app: Flask):
+    fill_bench_data(app)
+    with app.app_context():
+        with get_session() as session:
+            session.add(User(login='empty', password='', access_group=AccessGroup.User))
+            session.commit()
+
+    with pytest.raises(RuntimeError, match='empty has no trips'):
+        run_benchmark(app, 10, login='empty')
@@ -0,0 +1,89 @@
+from flask import Flask
+from flask.testing import FlaskClient
+from sqlalchemy import update
+
+from organizer.db import get_session
+from organizer.schema import CatalogueVersion, Product
+from organizer.utils.catalogue import bump_catalogue_version, get_catalogue
+from organizer.utils.day_totals import find_inconsistent_trips
+
+
+def test_catalogue_contains_all_products(app: Flask):
+    with app.test_request_context():
+        with get_session() as session:
+            catalogue = get_catalogue(session)
+
+    sweet = catalogue.get(9)
+    assert sweet
+    assert sweet.name == 'Ptitsa divnaya sweet'
+    assert sweet.grams == 5.5
+    assert catalogue.get(1).grams is None
+    assert catalogue.get(15).archived
+    assert catalogue.get_active(15) is None
+    assert catalogue.get(100) is None
+
+
+def test_catalogue_is_reused_while_version_is_the_same(app: Flask):
+    with app.test_request_context():
+        with get_session() as session:
+            first = get_catalogue(session)
+
+    with app.test_request_context():
+        with get_session() as session:
+            assert get_catalogue(session) is first
+
+
+def test_catalogue_reloads_after_version_bump(app: Flask):
+    with app.test_request_context():
+        with get_session() as session:
+            assert get_catalogue(session).get(2).name == 'Mango'
+
+    # emulate a change made by another worker
+    with app.test_request_context():
+        with get_session() as session:
+            session.execute(update(Product).where(Product.id == 2).values(name='Papaya'))
+            bump_catalogue_version(session)
+            session.commit()
+
+    with app.test_request_context():
+        with get_session() as session:
+            assert session.get(CatalogueVersion, 1).version == 1
+            assert get_catalogue(session).get(2).name == 'Papaya'
+
+
+def test_product_edit_is_visible_in_meals(admin_logged_client: FlaskClient):
+    response = admin_logged_client.get('/api/meals/uid1/1')
+    assert response.json
+    assert response.json['day']['meals']['breakfast'][0]['name'] == 'Multigrain cereal'
+
+    response = admin_logged_client.post('/api/products/1/edit',
+                                        json={
+                                            'name': 'Oatmeal',
+                                            'calories': 100,
+                                            'proteins': 10,
+                                            'fats': 10,
+                                            'carbs': 10
+                                        })
+    assert response.status_code == 200
+
+    response = admin_logged_client.get('/api/meals/uid1/1')
+    assert response.json
+    breakfast = response.json['day']['meals']['breakfast'][0]
+    assert breakfast['name'] == 'Oatmeal'
+    assert breakfast['calories'] == breakfast['mass']
+
+
+def test_product_edit_updates_day_totals(admin_logged_client: FlaskClient):
+    response = admin_logged_client.post('/api/products/1/edit',
+                                        json={
+                                            'name': 'Oatmeal',
+                                            'calories': 100,
+                                            'proteins': 10,
+                                            'fats': 10,
+                                            'carbs': 10
+                                        })
+    assert response.status_code == 200
+
+    with admin_logged_client.application.app_context():
+        with get_session() as session:
+            assert not find_inconsistent_trips(session)
@@ -1,5 +1,11 @@
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from flask import Flask
+
 from organizer import create_app
-from organizer.schema import AccessGroup
+from organizer.db import Database, close_connection, get_database, get_engine, get_session
+from organizer.schema import AccessGroup, MealRecord
 
 
 def test_config():
@@ -59,3 +65,70 @@ def test_create_admin_creates(runner, client):
                             })
     assert response.status_code == 200
     assert 'message' in response.json
+
+
+def test_engine_is_shared_between_app_contexts(app: Flask):
+    with app.app_context():
+        first_engine = get_engine()
+
+    with app.app_context():
+        second_engine = get_engine()
+
+    assert first_engine is second_engine
+
+
+def test_engine_is_created_once_by_concurrent_requests(app: Flask, monkeypatch):
+    created = []
+
+    class SlowDatabase(Database):
+        def __init__(self, config):
+            created.append(True)
+            time.sleep(0.05)
+            super().__init__(config)
+
+    monkeypatch.setattr('organizer.db.Database', SlowDatabase)
+    close_connection(app)
+
+    def get_engine_in_context():
+        with app.app_context():
+            return get_engine()
+
+    with ThreadPoolExecutor(max_workers=4) as executor:
+        engines = list(executor.map(lambda _: get_engine_in_context(), range(4)))
+
+    assert len(created) == 1
+    assert all(engine is engines[0] for engine in engines)
+
+
+def test_engine_pool_is_reset_after_fork(app: Flask, monkeypatch):
+    with app.app_context():
+        database = get_database()
+        engine = database.engine
+
+        disposed = []
+        monkeypatch.setattr(engine, 'dispose', lambda close=True: disposed.append(close))
+        monkeypatch.setattr('organizer.db.os.getpid', lambda: database.pid + 1)
+
+        assert get_engine() is engine
+        assert disposed == [False]
+
+
+def test_rebuild_day_totals_command(runner, app: Flask):
+    result = runner.invoke(args=['rebuild-day-totals', '--check'])
+    assert 'All totals are consistent' in result.output
+    assert result.exit_code == 0
+
+    with app.app_context():
+        with get_session() as session:
+            session.add(MealRecord(trip_id=3, day_number=2, meal_number=1, product_id=1, mass=10))
+            session.commit()
+
+    result = runner.invoke(args=['rebuild-day-totals', '--check'])
+    assert 'Inconsistent totals in trips: 3' in result.output
+    assert result.exit_code == 1
+
+    result = runner.invoke(args=['rebuild-day-totals'])
+    assert 'Rebuilt day totals, 1 trips were inconsistent' in result.output
+
+    result = runner.invoke(args=['rebuild-day-totals', '--check'])
+    assert 'All totals are consistent' in result.output
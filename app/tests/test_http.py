@@ -0,0 +1,105 @@
+import pytest
+import requests
+from flask import Flask
+from flask.testing import FlaskClient
+
+from organizer.utils.http import CircuitBreaker, IntegrationError, get_http_client, http_request
+
+
+class FakeResponse:
+    def __init__(self, status_code):
+        self.status_code = status_code
+
+
+def test_http_client_reuses_sessions(app: Flask, monkeypatch):
+    sessions = []
+
+    def request_interceptor(session, method, url, timeout, **kwargs):
+        sessions.append(session)
+        assert timeout == (3.05, 10.0)
+        return FakeResponse(200)
+
+    monkeypatch.setattr(requests.Session, 'request', request_interceptor)
+    with app.app_context():
+        http_request('vk', 'GET', 'https://api.vk.com/method/users.get')
+        http_request('vk', 'GET', 'https://api.vk.com/method/users.get')
+        http_request('brevo', 'POST', 'https://api.brevo.com/v3/smtp/email')
+
+        assert sessions[0] is sessions[1]
+        assert sessions[0] is not sessions[2]
+        assert get_http_client().stats['vk'].as_dict()['results']['ok'] == 2
+
+
+def test_http_client_recreates_sessions_after_fork(app: Flask, monkeypatch):
+    with app.app_context():
+        client = get_http_client()
+        session = client.get_session('vk')
+        monkeypatch.setattr('organizer.utils.http.os.getpid', lambda: client.pid + 1)
+        assert client.get_session('vk') is not session
+
+
+def test_circuit_breaker_opens_after_failures(monkeypatch):
+    now = [100.0]
+    monkeypatch.setattr('organizer.utils.http.time.monotonic', lambda: now[0])
+    breaker = CircuitBreaker(threshold=2, cooldown=30)
+
+    assert breaker.allow()
+    breaker.record(False)
+    assert breaker.allow()
+    breaker.record(False)
+    assert not breaker.allow()
+
+    now[0] += 30
+    # a single trial request is allowed after the cooldown
+    assert breaker.allow()
+    assert not breaker.allow()
+    breaker.record(False)
+    assert not breaker.allow()
+
+    now[0] += 30
+    assert breaker.allow()
+    breaker.record(True)
+    assert breaker.allow()
+    breaker.record(False)
+    assert breaker.allow()
+
+
+def test_http_client_rejects_requests_to_failing_service(app: Flask, monkeypatch):
+    calls = []
+
+    def request_interceptor(session, method, url, timeout, **kwargs):
+        calls.append(url)
+        raise requests.ConnectionError('refused')
+
+    monkeypatch.setattr(requests.Session, 'request', request_interceptor)
+    with app.app_context():
+        get_http_client().breakers['vk'].threshold = 2
+        for _ in range(3):
+            with pytest.raises(IntegrationError):
+                http_request('vk', 'GET', 'https://api.vk.com/method/users.get')
+
+        assert len(calls) == 2
+        assert get_http_client().stats['vk'].as_dict()['results'] == {'ok': 0, 'error': 2, 'rejected': 1}
+
+
+def test_vk_login_reports_unavailable_service(app: Flask, client: FlaskClient, monkeypatch):
+    def request_interceptor(session, method, url, timeout, **kwargs):
+        raise requests.Timeout('timeout')
+
+    monkeypatch.setattr(requests.Session, 'request', request_interceptor)
+    app.config['VK_APP_SECRET'] = 'secret'
+    response = client.get('/auth/vk_redirect?code=123&state=/trips/')
+    assert response.status_code == 302
+    assert response.location.endswith('/auth/login')
+
+
+def test_integrations_are_reported_in_metrics(app: Flask, client: FlaskClient, monkeypatch):
+    monkeypatch.setattr(requests.Session, 'request',
+                        lambda session, method, url, timeout, **kwargs: FakeResponse(503))
+    app.config['METRICS_TOKEN'] = 'secret'
+    with app.app_context():
+        http_request('recaptcha', 'POST', 'https://www.google.com/recaptcha/api/siteverify')
+
+    text = client.get('/metrics', headers={'Authorization': 'Bearer secret'}).data.decode('utf-8')
+    assert 'organizer_integration_requests_total{integration="recaptcha",result="error"} 1' in text
+    assert 'organizer_integration_duration_seconds_count{integration="recaptcha"} 1' in text
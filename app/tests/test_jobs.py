@@ -0,0 +1,147 @@
+from datetime import datetime, timedelta
+
+from flask import Flask
+from flask.testing import FlaskClient
+
+from organizer.db import get_session
+from organizer.schema import Job, JobStatus
+from organizer.utils.jobs import JOB_HANDLERS, claim_job, enqueue_job, run_pending_jobs
+
+
+class FakeResponse:
+    def __init__(self, status_code):
+        self.status_code = status_code
+        self.content = b'error'
+
+
+def test_jobs_run_after_commit(app: Flask, monkeypatch):
+    calls = []
+    monkeypatch.setitem(JOB_HANDLERS, 'test', lambda value: calls.append(value))
+    app.config['JOBS_RUN_INLINE'] = False
+
+    with app.app_context():
+        with get_session() as session:
+            enqueue_job(session, 'test', value=42)
+            session.commit()
+
+        assert run_pending_jobs() == 1
+        assert calls == [42]
+        assert run_pending_jobs() == 0
+
+        with get_session() as session:
+            job = session.query(Job).one()
+            assert job.status == JobStatus.Done
+            assert job.attempts == 1
+            assert job.finished_at is not None
+
+
+def test_jobs_are_retried_with_backoff(app: Flask, monkeypatch):
+    def failing_handler():
+        raise RuntimeError('unavailable')
+
+    monkeypatch.setitem(JOB_HANDLERS, 'test', failing_handler)
+    app.config['JOBS_RUN_INLINE'] = False
+    app.config['JOBS_MAX_ATTEMPTS'] = 2
+
+    with app.app_context():
+        with get_session() as session:
+            enqueue_job(session, 'test')
+            session.commit()
+
+        assert run_pending_jobs() == 1
+        with get_session() as session:
+            job = session.query(Job).one()
+            assert job.status == JobStatus.Pending
+            assert job.attempts == 1
+            assert job.run_at > datetime.utcnow() + timedelta(seconds=20)
+            assert 'unavailable' in job.last_error
+
+            # not due yet
+            assert run_pending_jobs() == 0
+            job.run_at = datetime.utcnow()
+            session.commit()
+
+        assert run_pending_jobs() == 1
+        with get_session() as session:
+            job = session.query(Job).one()
+            assert job.status == JobStatus.Failed
+            assert job.attempts == 2
+
+
+def test_jobs_are_claimed_once(app: Flask, monkeypatch):
+    monkeypatch.setitem(JOB_HANDLERS, 'test', lambda: None)
+    app.config['JOBS_RUN_INLINE'] = False
+
+    with app.app_context():
+        with get_session() as session:
+            enqueue_job(session, 'test')
+            session.commit()
+            job_id = session.query(Job.id).scalar()
+
+            now = datetime.utcnow()
+            assert claim_job(session, job_id, now)
+            assert not claim_job(session, job_id, now)
+            # the job of a dead worker is picked up after the timeout
+            assert claim_job(session, job_id, now + timedelta(seconds=app.config['JOBS_TIMEOUT']))
+
+
+def test_forgot_sends_email_in_job(app: Flask, client: FlaskClient, monkeypatch):
+    sent = []
+
+    def post_interceptor(name, method, url, headers, json):
+        sent.append(json)
+        return FakeResponse(201)
+
+    monkeypatch.setattr('organizer.utils.email.http_request', post_interceptor)
+    app.config['BREVO_API_KEY'] = 'key'
+
+    response = client.post('/api/auth/forgot/', json={'login': 'Administrator'})
+    assert response.status_code == 200
+    assert len(sent) == 1
+    assert sent[0]['to'][0]['email'] == 'Administrator'
+
+
+def test_forgot_does_not_fail_on_email_error(app: Flask, client: FlaskClient, monkeypatch):
+    monkeypatch.setattr('organizer.utils.email.http_request',
+                        lambda name, method, url, headers, json: FakeResponse(500))
+    app.config['BREVO_API_KEY'] = 'key'
+
+    response = client.post('/api/auth/forgot/', json={'login': 'Administrator'})
+    assert response.status_code == 200
+
+    with app.app_context():
+        with get_session() as session:
+            job = session.query(Job).one()
+            assert job.kind == 'email'
+            assert job.status == JobStatus.Pending
+            assert job.last_error
+
+
+def test_run_jobs_command(app: Flask, runner, monkeypatch):
+    calls = []
+    monkeypatch.setitem(JOB_HANDLERS, 'test', lambda: calls.append(True))
+    app.config['JOBS_RUN_INLINE'] = False
+
+    with app.app_context():
+        with get_session() as session:
+            enqueue_job(session, 'test')
+            session.commit()
+
+    result = runner.invoke(args=['run-jobs', '--once'])
+    assert 'Jobs run: 1' in result.output
+    assert calls == [True]
+
+
+def test_jobs_are_reported_in_metrics(app: Flask, client: FlaskClient, monkeypatch):
+    monkeypatch.setitem(JOB_HANDLERS, 'test', lambda: None)
+    app.config['METRICS_TOKEN'] = 'secret'
+
+    with app.app_context():
+        with get_session() as session:
+            enqueue_job(session, 'test')
+
+    text = client.get('/metrics', headers={'Authorization': 'Bearer secret'}).data.decode('utf-8')
+    assert 'organizer_jobs{status="done"} 1' in text
+    assert 'organizer_jobs{status="pending"} 0' in text
+    assert 'organizer_job_latency_seconds_last_hour_count 1' in text
+    assert '# TYPE organizer_job_latency_seconds_last_hour_sum gauge' in text
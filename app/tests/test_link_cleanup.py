@@ -0,0 +1,64 @@
+import time
+from datetime import datetime, timedelta
+from uuid import uuid4
+
+from flask import Flask
+
+from organizer.db import get_session
+from organizer.schema import PasswordLink, SharingLink
+from organizer.utils.link_cleanup import LinkCleanupScheduler, purge_expired_links
+
+
+def add_links(app: Flask, expired: int, alive: int):
+    now = datetime.utcnow()
+    with app.app_context():
+        with get_session() as session:
+            for i in range(expired + alive):
+                expiration_date = now - timedelta(days=1, minutes=i) if i < expired else now + timedelta(days=1)
+                session.add(SharingLink(uuid=str(uuid4()), user_id=1, trip_id=1,
+                                        expiration_date=expiration_date))
+                session.add(PasswordLink(uuid=str(uuid4()), user_id=1,
+                                         expiration_date=expiration_date))
+            session.commit()
+
+
+def count_links(app: Flask) -> tuple[int, int]:
+    with app.app_context():
+        with get_session() as session:
+            return session.query(SharingLink).count(), session.query(PasswordLink).count()
+
+
+def test_purge_removes_expired_links_in_batches(app: Flask):
+    add_links(app, expired=7, alive=2)
+
+    with app.app_context():
+        with get_session() as session:
+            deleted = purge_expired_links(session, batch_size=3)
+
+    assert deleted == {'sharing links': 7, 'password links': 7}
+    assert count_links(app) == (2, 2)
+
+
+def test_purge_command(app: Flask, runner):
+    add_links(app, expired=2, alive=1)
+
+    result = runner.invoke(args=['purge-expired-links'])
+    assert 'sharing links: 2' in result.output
+    assert 'password links: 2' in result.output
+    assert count_links(app) == (1, 1)
+
+
+def test_scheduler_purges_links_periodically(app: Flask):
+    add_links(app, expired=2, alive=1)
+
+    scheduler = LinkCleanupScheduler(app, interval=0.01)
+    scheduler.start()
+    try:
+        for _ in range(200):
+            if count_links(app) == (1, 1):
+                break
+            time.sleep(0.01)
+    finally:
+        scheduler.stop()
+
+    assert count_links(app) == (1, 1)
@@ -0,0 +1,141 @@
+import json
+import os
+import runpy
+from types import SimpleNamespace
+
+from flask import Flask
+from flask.testing import FlaskClient
+
+from organizer.utils.metrics import LATENCY_BUCKETS, MetricsStore, merge, render
+
+
+def test_metrics_require_administrator(client: FlaskClient, org_logged_client: FlaskClient):
+    response = org_logged_client.get('/metrics')
+    assert response.status_code == 403
+
+
+def test_metrics_accept_token(app: Flask, client: FlaskClient):
+    app.config['METRICS_TOKEN'] = 'secret'
+    assert client.get('/metrics', headers={'Authorization': 'Bearer wrong'}).status_code == 403
+    response = client.get('/metrics', headers={'Authorization': 'Bearer secret'})
+    assert response.status_code == 200
+    assert response.mimetype == 'text/plain'
+
+
+def test_metrics_report_requests(admin_logged_client: FlaskClient):
+    admin_logged_client.get('/api/trips/')
+    admin_logged_client.get('/api/reports/packing/uid1')
+    admin_logged_client.get('/api/reports/packing/uid1')
+    admin_logged_client.get('/api/trips/get/uid100')
+
+    text = admin_logged_client.get('/metrics').data.decode('utf-8')
+    assert 'organizer_requests_total{blueprint="api.trips",method="GET",status="200"} 1' in text
+    assert 'organizer_requests_total{blueprint="api.trips",method="GET",status="404"} 1' in text
+    assert 'organizer_request_duration_seconds_count{blueprint="api.reports",method="GET"} 2' in text
+    assert 'organizer_request_duration_seconds_bucket{blueprint="api.reports",method="GET",le="+Inf"} 2' \
+        in text
+    assert 'organizer_cache_requests_total{cache="report",result="hit"} 1' in text
+    assert 'organizer_cache_requests_total{cache="report",result="miss"} 1' in text
+    # the scrape itself is in flight
+    assert 'organizer_requests_in_flight 1' in text
+    assert 'organizer_db_pool_connections{state="size"}' in text
+
+
+def test_metrics_count_exceptions(app: Flask, client: FlaskClient):
+    @app.get('/test/failure')
+    def failure():
+        raise RuntimeError('failure')
+
+    app.config['PROPAGATE_EXCEPTIONS'] = False
+    app.config['METRICS_TOKEN'] = 'secret'
+    assert client.get('/test/failure').status_code == 500
+
+    text = client.get('/metrics', headers={'Authorization': 'Bearer secret'}).data.decode('utf-8')
+    assert 'organizer_request_exceptions_total{blueprint="none"} 1' in text
+
+
+def test_metrics_are_merged_across_workers(tmp_path):
+    store = MetricsStore(str(tmp_path))
+    store.write({
+        'requests': {json.dumps(['api.meals', 'GET', '200']): 3},
+        'exceptions': {},
+        'latency': {},
+        'caches': {'user': {'hits': 5, 'misses': 1}},
+        'pool': {'checkedout': 2},
+        'in_flight': 1,
+    })
+    # a worker which has exited already
+    with open(os.path.join(tmp_path, 'worker-999999999.json'), 'w', encoding='utf-8') as file:
+        json.dump({
+            'requests': {json.dumps(['api.meals', 'GET', '200']): 4},
+            'exceptions': {'api.meals': 1},
+            'latency': {},
+            'caches': {'user': {'hits': 1, 'misses': 1}},
+            'pool': {'checkedout': 5},
+            'in_flight': 3,
+        }, file)
+
+    text = render(merge(store.read()))
+    assert 'organizer_requests_total{blueprint="api.meals",method="GET",status="200"} 7' in text
+    assert 'organizer_request_exceptions_total{blueprint="api.meals"} 1' in text
+    assert 'organizer_cache_requests_total{cache="user",result="hit"} 6' in text
+    assert 'organizer_db_pool_connections{state="checkedout"} 2' in text
+    assert 'organizer_requests_in_flight 1' in text
+
+
+def worker_snapshot(requests: int, in_flight: int) -> dict:
+    return {
+        'requests': {json.dumps(['api.meals', 'GET', '200']): requests},
+        'exceptions': {},
+        # buckets, +Inf, sum and count
+        'latency': {json.dumps(['api.meals', 'GET']): [requests] * (len(LATENCY_BUCKETS) + 2) + [requests]},
+        'caches': {'user': {'hits': requests, 'misses': 0}},
+        'integrations': {},
+        'pool': {'checkedout': in_flight},
+        'in_flight': in_flight,
+    }
+
+
+def test_metrics_files_are_pruned(tmp_path):
+    store = MetricsStore(str(tmp_path))
+    store.write(worker_snapshot(1, 0))
+    # a worker which has exited already
+    with open(os.path.join(tmp_path, 'worker-999999999.json'), 'w', encoding='utf-8') as file:
+        json.dump(worker_snapshot(2, 3), file)
+
+    store.prune()
+    assert store.worker_pids() == [os.getpid()]
+
+    store.clear()
+    assert not store.worker_pids()
+    assert not os.path.exists(store.dead_path)
+
+
+def test_metrics_counters_survive_child_exit(tmp_path, monkeypatch):
+    for name in ('METRICS_DIR', 'DATABASE_POOL_SIZE', 'HTTP_POOL_SIZE'):
+        monkeypatch.delenv(name, raising=False)
+    monkeypatch.setenv('METRICS_DIR', str(tmp_path))
+    hooks = runpy.run_path(os.path.join(os.path.dirname(__file__), '..', 'gunicorn.conf.py'))
+
+    store = MetricsStore(str(tmp_path))
+    for pid, requests in ((999999998, 4), (999999999, 5)):
+        with open(store.worker_path(pid), 'w', encoding='utf-8') as file:
+            json.dump(worker_snapshot(requests, 2), file)
+    store.write(worker_snapshot(1, 1))
+
+    before = render(merge(store.read()))
+    hooks['child_exit'](None, SimpleNamespace(pid=999999998))
+    hooks['child_exit'](None, SimpleNamespace(pid=999999999))
+    after = render(merge(store.read()))
+
+    assert store.worker_pids() == [os.getpid()]
+    assert after == before
+    assert 'organizer_requests_total{blueprint="api.meals",method="GET",status="200"} 10' in after
+    assert 'organizer_cache_requests_total{cache="user",result="hit"} 10' in after
+    assert 'organizer_request_duration_seconds_count{blueprint="api.meals",method="GET"} 10' in after
+    # gauges of exited workers are dropped
+    assert 'organizer_requests_in_flight 1' in after
+
+    # a new run of the service starts from scratch
+    hooks['on_starting'](None)
+    assert not store.read()
@@ -0,0 +1,71 @@
+import os
+
+from flask import Flask
+from flask.testing import FlaskClient
+
+from organizer.utils.report_cache import MemoryReportCache, SQLiteReportCache
+
+
+def test_memory_cache_evicts_least_recently_used():
+    cache = MemoryReportCache(2)
+    cache.put('a', [1])
+    cache.put('b', [2])
+    assert cache.get('a') == [1]
+    cache.put('c', [3])
+
+    assert cache.get('b') is None
+    assert cache.get('a') == [1]
+    assert cache.get('c') == [3]
+    assert cache.stats.as_dict() == {'hits': 3, 'misses': 1}
+
+
+def test_sqlite_cache_is_shared_between_instances(tmp_path):
+    path = os.path.join(tmp_path, 'reports.sqlite')
+    SQLiteReportCache(path, 2).put(('uid1', 'shopping'), [{'id': 1, 'mass': 10.5}])
+
+    cache = SQLiteReportCache(path, 2)
+    assert cache.get(('uid1', 'shopping')) == [{'id': 1, 'mass': 10.5}]
+    assert cache.get(('uid1', 'packing')) is None
+
+    cache.put('b', [2])
+    cache.put('c', [3])
+    assert cache.get(('uid1', 'shopping')) is None
+    assert cache.stats.as_dict() == {'hits': 1, 'misses': 2}
+
+
+def test_reports_are_served_from_cache(app: Flask, org_logged_client: FlaskClient):
+    stats = app.extensions['report_cache'].stats
+
+    first = org_logged_client.get('/api/reports/shopping/uid1')
+    second = org_logged_client.get('/api/reports/shopping/uid1')
+    assert first.json == second.json
+    assert stats.as_dict() == {'hits': 1, 'misses': 1}
+
+    org_logged_client.get('/api/reports/packing/uid1')
+    assert stats.as_dict() == {'hits': 1, 'misses': 2}
+
+
+def test_reports_cache_is_invalidated_by_trip_change(app: Flask, org_logged_client: FlaskClient):
+    stats = app.extensions['report_cache'].stats
+
+    before = org_logged_client.get('/api/reports/shopping/uid1')
+    org_logged_client.post('/api/meals/clear', json={'trip_uid': 'uid1', 'day_number': 1})
+    after = org_logged_client.get('/api/reports/shopping/uid1')
+
+    assert stats.as_dict() == {'hits': 0, 'misses': 2}
+    assert before.json != after.json
+
+
+def test_reports_cache_is_invalidated_by_product_change(app: Flask,
+                                                        admin_logged_client: FlaskClient):
+    stats = app.extensions['report_cache'].stats
+
+    admin_logged_client.get('/api/reports/shopping/uid1')
+    response = admin_logged_client.post('/api/products/1/edit', json={
+        'name': 'New cereal', 'calories': 100, 'proteins': 10, 'fats': 10, 'carbs': 10,
+    })
+    assert response.status_code == 200
+    report = admin_logged_client.get('/api/reports/shopping/uid1')
+
+    assert stats.as_dict() == {'hits': 0, 'misses': 2}
+    assert report.json[0]['name'] == 'New cereal'
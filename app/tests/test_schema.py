@@ -0,0 +1,62 @@
+from datetime import datetime, timedelta
+
+from flask import Flask
+import pytest
+from sqlalchemy import text
+
+from organizer.db import get_engine, get_session
+from organizer.schema import MealRecord, PasswordLink, SharingLink
+
+
+@pytest.fixture
+def filled_app(app: Flask):
+    with app.app_context():
+        with get_session() as session:
+            # every (trip, product, meal) combination appears once per day
+            session.execute(MealRecord.__table__.insert(), [
+                {'trip_id': 1 + i % 3, 'product_id': 1 + i % 14, 'day_number': 10 + i // 84,
+                 'meal_number': i % 4, 'mass': 10}
+                for i in range(5000)
+            ])
+            expiration_date = datetime.utcnow()
+            session.execute(SharingLink.__table__.insert(), [
+                {'uuid': f'share{i}', 'user_id': 1, 'trip_id': 1,
+                 'expiration_date': expiration_date + timedelta(minutes=i)}
+                for i in range(1000)
+            ])
+            session.execute(PasswordLink.__table__.insert(), [
+                {'uuid': f'password{i}', 'user_id': 1,
+                 'expiration_date': expiration_date + timedelta(minutes=i)}
+                for i in range(1000)
+            ])
+            session.commit()
+
+        with get_engine().connect() as connection:
+            connection.execute(text('ANALYZE'))
+    return app
+
+
+def query_plan(app: Flask, query: str) -> str:
+    with app.app_context():
+        with get_engine().connect() as connection:
+            rows = connection.execute(text(f'EXPLAIN QUERY PLAN {query}')).all()
+    return ' '.join(row[-1] for row in rows)
+
+
+@pytest.mark.parametrize('query, index', [
+    ('SELECT id FROM meal_records WHERE trip_id = 1 AND day_number = 2',
+     'ix_meal_records_trip_day_meal_product'),
+    ('SELECT id FROM meal_records WHERE trip_id = 1 AND product_id = 2 '
+     'AND day_number = 2 AND meal_number = 1',
+     'ix_meal_records_trip_day_meal_product'),
+    ('SELECT user_id FROM tripaccess WHERE trip_id = 1',
+     'ix_tripaccess_trip_user'),
+    ("SELECT uuid FROM sharinglinks WHERE expiration_date < '2000-01-01'",
+     'ix_sharinglinks_expiration_date'),
+    ("SELECT uuid FROM passwordlinks WHERE expiration_date < '2000-01-01'",
+     'ix_passwordlinks_expiration_date'),
+    ("SELECT id FROM users WHERE login = 'Organizer'",
+     'ix_users_login'),
+])
+def test_hot_queries_use_indexes(filled_app: Flask, query: str, index: str):
+    assert index in query_plan(filled_app, query)
@@ -0,0 +1,75 @@
+import logging
+
+from flask import Flask
+from flask.testing import FlaskClient
+import pytest
+from sqlalchemy import text
+
+from organizer.db import get_session
+from organizer.utils.sql_stats import fingerprint
+
+
+def test_fingerprint_ignores_values():
+    assert fingerprint("SELECT * FROM trips WHERE id = 12 AND uid = 'uid1'") == \
+        fingerprint("SELECT *\n  FROM trips WHERE id = 3 AND uid = 'it''s'")
+    assert fingerprint('SELECT * FROM trips WHERE id IN (?, ?, ?)') == \
+        fingerprint('SELECT * FROM trips WHERE id IN (?)')
+    assert fingerprint('SELECT * FROM trips') != fingerprint('SELECT * FROM users')
+
+
+def test_server_timing_reports_queries(app: Flask, org_logged_client: FlaskClient):
+    app.config['SQL_STATS_SERVER_TIMING'] = True
+    response = org_logged_client.get('/api/trips/')
+    assert response.status_code == 200
+    timing = response.headers['Server-Timing']
+    assert timing.startswith('db;dur=')
+    assert 'queries"' in timing
+
+
+def test_server_timing_is_hidden_from_users(org_logged_client: FlaskClient):
+    response = org_logged_client.get('/api/trips/')
+    assert response.status_code == 200
+    assert 'Server-Timing' not in response.headers
+
+
+def test_server_timing_is_shown_to_administrators(admin_logged_client: FlaskClient):
+    response = admin_logged_client.get('/api/trips/')
+    assert response.status_code == 200
+    assert 'Server-Timing' in response.headers
+
+
+def test_streamed_queries_are_counted(app: Flask, org_logged_client: FlaskClient, caplog):
+    # every statement is reported as repeated
+    app.config['SQL_REPEATED_THRESHOLD'] = 1
+    with caplog.at_level(logging.WARNING, logger=app.logger.name):
+        response = org_logged_client.get('/api/trips/download/uid1')
+        assert response.status_code == 200
+        response.get_data()
+
+    assert '"status": 200' in caplog.text
+    # the rows are selected while the body is streamed
+    assert 'FROM meal_records JOIN products' in caplog.text
+
+
+def test_repeated_queries_are_logged(app: Flask, client: FlaskClient, caplog):
+    @app.get('/test/n-plus-one')
+    def n_plus_one():
+        with get_session() as session:
+            for trip_id in range(10):
+                session.execute(text('SELECT name FROM trips WHERE id = :id'), {'id': trip_id})
+        return 'ok'
+
+    with caplog.at_level(logging.WARNING, logger=app.logger.name):
+        client.get('/test/n-plus-one')
+
+    assert '"queries": 10' in caplog.text
+    assert 'SELECT name FROM trips WHERE id = ?' in caplog.text
+
+
+def test_query_budget_fails_on_exceeded_budget(org_logged_client: FlaskClient, query_budget):
+    with query_budget(10):
+        org_logged_client.get('/api/trips/')
+
+    with pytest.raises(AssertionError):
+        with query_budget(0):
+            org_logged_client.get('/api/trips/')
@@ -0,0 +1,85 @@
+from flask import Flask, g
+from sqlalchemy import event
+from werkzeug.exceptions import Forbidden, NotFound
+import pytest
+
+from organizer.db import get_engine, get_session
+from organizer.schema import AccessGroup, TripAccess, User
+from organizer.utils.auth import get_trip_info, require_trip
+
+
+def login(session, login_name: str):
+    g.user = session.query(User).filter(User.login == login_name).one()
+
+
+def test_trip_info_contains_access(app: Flask):
+    with app.test_request_context():
+        with get_session() as session:
+            login(session, 'Organizer')
+            own = get_trip_info(session, 'uid1')
+            assert own
+            assert own.has_access
+            assert own.days_count == 5
+
+            foreign = get_trip_info(session, 'uid3')
+            assert foreign
+            assert not foreign.has_access
+            assert get_trip_info(session, 'uid100') is None
+
+
+def test_trip_info_sees_shared_trip(app: Flask):
+    with app.app_context():
+        with get_session() as session:
+            session.add(TripAccess(trip_id=3, user_id=2))
+            session.commit()
+
+    with app.test_request_context():
+        with get_session() as session:
+            login(session, 'Organizer')
+            trip = get_trip_info(session, 'uid3')
+            assert trip
+            assert trip.has_access
+
+
+def test_trip_info_allows_administrator(app: Flask):
+    with app.test_request_context():
+        with get_session() as session:
+            login(session, 'Administrator')
+            assert g.user.access_group == AccessGroup.Administrator
+            trip = get_trip_info(session, 'uid1')
+            assert trip
+            assert trip.has_access
+
+
+def test_trip_info_is_loaded_once_per_request(app: Flask):
+    statements = []
+
+    def record(conn, cursor, statement, *args):
+        statements.append(statement)
+
+    with app.test_request_context():
+        with get_session() as session:
+            login(session, 'Organizer')
+            engine = get_engine()
+            event.listen(engine, 'before_cursor_execute', record)
+            try:
+                by_uid = get_trip_info(session, 'uid3')
+                assert by_uid
+                assert get_trip_info(session, 'uid3') is by_uid
+                assert get_trip_info(session, trip_id=by_uid.id) is by_uid
+            finally:
+                event.remove(engine, 'before_cursor_execute', record)
+
+    assert len(statements) == 1
+    assert 'tripaccess' in statements[0]
+
+
+def test_require_trip_aborts(app: Flask):
+    with app.test_request_context():
+        with get_session() as session:
+            login(session, 'Organizer')
+            assert require_trip(session, 'uid3').uid == 'uid3'
+            with pytest.raises(Forbidden):
+                require_trip(session, 'uid3', edit=True)
+            with pytest.raises(NotFound):
+                require_trip(session, 'uid100')
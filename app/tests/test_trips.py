@@ -116,7 +116,7 @@ def test_trips_access_expired_links_redirect(org_logged_client: FlaskClient):
             assert count == 0
 
 
-def test_trips_access_dead_links_removed(org_logged_client: FlaskClient):
+def test_trips_access_leaves_dead_links_to_cleanup(org_logged_client: FlaskClient):
     with org_logged_client.application.app_context():
         with get_session() as session:
             session.add(SharingLink(uuid='42', user_id=1, trip_id=3,
@@ -127,12 +127,10 @@ def test_trips_access_dead_links_removed(org_logged_client: FlaskClient):
                                     expiration_date=datetime.now(timezone.utc) + timedelta(days=1)))
             session.commit()
 
-    org_logged_client.get('/trips/access/uid42')
+    response = org_logged_client.get('/trips/access/54')
+    assert '/trips/incorrect' in response.location
 
     with org_logged_client.application.app_context():
         with get_session() as session:
             count = session.query(SharingLink).count()
-            assert count == 1
-
-            link = session.query(SharingLink).one()
-            assert link.uuid == '66'
+            assert count == 3
@@ -0,0 +1,27 @@
+from organizer.utils.ttl_cache import TTLCache
+
+
+def test_ttl_cache_evicts_least_recently_used():
+    cache = TTLCache(ttl=60, max_entries=2)
+    cache.put('first', 1)
+    cache.put('second', 2)
+    assert cache.get('first') == 1
+
+    cache.put('third', 3)
+    assert cache.get('second') is None
+    assert cache.get('first') == 1
+    assert cache.get('third') == 3
+    assert len(cache.entries) == 2
+
+
+def test_ttl_cache_sweeps_expired_entries_on_put(monkeypatch):
+    now = [100.0]
+    monkeypatch.setattr('organizer.utils.ttl_cache.time.monotonic', lambda: now[0])
+    cache = TTLCache(ttl=10, max_entries=100)
+    for term in ('a', 'ab', 'abc'):
+        cache.put(term, len(term))
+
+    now[0] += 11
+    assert cache.get('abc') is None
+    cache.put('b', 1)
+    assert list(cache.entries) == ['b']
@@ -85,3 +85,21 @@ def test_vk_login_logins_for_existing_user(client, monkeypatch):
     assert fake_redirect in response.location
     assert Recorder.token_called
     assert Recorder.user_info_called
+
+
+def test_vk_login_refreshes_user_photo(client, monkeypatch):
+    photos = ['first.url', 'second.url']
+
+    monkeypatch.setattr('organizer.auth.request_vk_access_token',
+                        lambda code: ('token', 1234, 87654))
+    monkeypatch.setattr('organizer.auth.request_vk_user_name_and_photo',
+                        lambda access_token: ('Adams Brown', photos[0]))
+
+    client.get('/auth/vk_redirect?' + urlencode({'code': 'code', 'state': '/'}))
+    response = client.get('/api/auth/user')
+    assert response.json['photo_url'] == 'first.url'
+
+    photos.pop(0)
+    client.get('/auth/vk_redirect?' + urlencode({'code': 'code', 'state': '/'}))
+    response = client.get('/api/auth/user')
+    assert response.json['photo_url'] == 'second.url'
@@ -1,10 +1,14 @@
+from datetime import timedelta
+
 import pytest
 
 from flask import Flask
 from flask.testing import FlaskClient
+from sqlalchemy import func, select
 
 from organizer.db import get_session
 from organizer.schema import MealRecord, Trip, TripAccess, Units
+from organizer.utils.day_totals import find_inconsistent_trips
 
 
 def test_rejects_adding_without_logged_in(client: FlaskClient):
@@ -227,7 +231,7 @@ def test_add_adds_a_product_with_pcs(org_logged_client: FlaskClient, app: Flask)
                     MealRecord.trip_id == 1,
                     MealRecord.meal_number == 0,
                     MealRecord.day_number == 1,
-                    MealRecord.mass == 5 * 5.5,
+                    MealRecord.mass == int(5 * 5.5),
                     MealRecord.product_id == 9,
                 )
                 .first()
@@ -448,6 +452,23 @@ def test_edit_edits_with_pieces(org_logged_client: FlaskClient, app: Flask):
             assert record.mass == 6 * 5.5
 
 
+def test_meals_are_not_changed_for_products_missing_from_catalogue(org_logged_client: FlaskClient,
+                                                                   monkeypatch):
+    monkeypatch.setattr('organizer.utils.catalogue.ProductCatalogue.get', lambda self, product_id: None)
+
+    result = org_logged_client.post('/api/meals/edit', json={'meal_id': 5, 'mass': 6, 'unit': Units.GRAMMS.value})
+    assert result.status_code == 400
+
+    result = org_logged_client.post('/api/meals/uid1/batch', json={'operations': [
+        {'op': 'edit', 'meal_id': 5, 'mass': 6, 'unit': Units.GRAMMS.value},
+    ]})
+    assert result.json
+    assert result.json['operations'][0] == {'result': False, 'error': 'Unknown product'}
+
+    result = org_logged_client.get('/api/meals/uid1')
+    assert result.status_code == 500
+
+
 def test_edit_updates_trip(org_logged_client: FlaskClient, app: Flask):
     with app.app_context():
         with get_session() as session:
@@ -657,6 +678,22 @@ def test_get_trip_meals_returns_meals(org_logged_client: FlaskClient):
     assert 5 == len(response.json['days'])
 
 
+def test_get_trip_meals_matches_day_meals(org_logged_client: FlaskClient):
+    response = org_logged_client.get('/api/meals/uid1')
+    assert response.status_code == 200
+    assert response.json
+
+    for day in response.json['days']:
+        day_response = org_logged_client.get(day['reload_link'])
+        assert day_response.status_code == 200
+        assert day_response.json
+        assert day_response.json['day'] == day
+
+    empty_day = response.json['days'][3]
+    assert all(not records for records in empty_day['meals'].values())
+    assert len(response.json['days'][0]['meals']['breakfast']) == 4
+
+
 def test_get_trip_meals_allows_non_owned_trip(org_logged_client: FlaskClient):
     response = org_logged_client.get('/api/meals/uid3')
     assert response.status_code == 200
@@ -746,6 +783,43 @@ def test_meals_cycle_rejects_non_existing_trip(org_logged_client: FlaskClient):
     assert response.status_code == 404
 
 
+@pytest.mark.parametrize('trip_uid, status', [('uid3', 403), ('100', 404)])
+def test_meals_cycle_checks_trip_before_data(org_logged_client: FlaskClient, trip_uid, status):
+    response = org_logged_client.post(f'/api/meals/{trip_uid}/cycle', json={'src-start': '1'})
+    assert response.status_code == status
+
+
+def test_meals_cycle_cycles_long_trip(org_logged_client: FlaskClient, app: Flask):
+    with app.app_context():
+        with get_session() as session:
+            trip = session.execute(select(Trip).where(Trip.uid == 'uid1')).scalar_one()
+            trip.till_date = trip.from_date + timedelta(days=599)
+            session.commit()
+            src_count = session.execute(
+                select(func.count()).select_from(MealRecord)
+                .where(MealRecord.trip_id == trip.id, MealRecord.day_number == 1)
+            ).scalar_one()
+
+    response = org_logged_client.post('/api/meals/uid1/cycle', json={
+        'src-start': '1',
+        'src-end': '1',
+        'dst-start': '2',
+        'dst-end': '600',
+        'overwrite': True
+    })
+    assert response.status_code == 200
+    assert response.json
+    assert response.json['inserted'] == src_count * 599
+
+    with app.app_context():
+        with get_session() as session:
+            days = session.execute(
+                select(func.count(MealRecord.day_number.distinct())).where(MealRecord.trip_id == trip.id)
+            ).scalar_one()
+            assert days == 600
+            assert not find_inconsistent_trips(session)
+
+
 def test_meals_cycle_cycles(org_logged_client: FlaskClient):
     with org_logged_client.application.app_context():
         with get_session() as session:
@@ -760,7 +834,7 @@ def test_meals_cycle_cycles(org_logged_client: FlaskClient):
                                           'dst-end': '5'
                                       })
     assert response.status_code == 200
-    assert response.json == {'result': 'ok'}
+    assert response.json == {'result': 'ok', 'inserted': 56}
 
     with org_logged_client.application.app_context():
         with get_session() as session:
@@ -787,7 +861,7 @@ def test_meals_cycle_cycles_shared_trip(org_logged_client: FlaskClient):
                                           'dst-end': '3'
                                       })
     assert response.status_code == 200
-    assert response.json == {'result': 'ok'}
+    assert response.json == {'result': 'ok', 'inserted': 2}
 
     with org_logged_client.application.app_context():
         with get_session() as session:
@@ -813,7 +887,7 @@ def test_meals_cycle_cycles_with_overwrite(org_logged_client: FlaskClient):
                                           'dst-end': '2'
                                       })
     assert response.status_code == 200
-    assert response.json == {'result': 'ok'}
+    assert response.json == {'result': 'ok', 'inserted': 14}
 
     with org_logged_client.application.app_context():
         with get_session() as session:
@@ -836,7 +910,7 @@ def test_meals_cycle_cycles_with_overwrite(org_logged_client: FlaskClient):
                                           'overwrite': True
                                       })
     assert response.status_code == 200
-    assert response.json == {'result': 'ok'}
+    assert response.json == {'result': 'ok', 'inserted': 10}
 
     with org_logged_client.application.app_context():
         with get_session() as session:
@@ -846,6 +920,100 @@ def test_meals_cycle_cycles_with_overwrite(org_logged_client: FlaskClient):
             assert not records
 
 
+def test_meals_cycle_merges_existing_products(org_logged_client: FlaskClient, app: Flask):
+    with app.app_context():
+        with get_session() as session:
+            records_count = session.query(MealRecord).filter(MealRecord.trip_id == 1).count()
+
+    response = org_logged_client.post('/api/meals/uid1/cycle',
+                                      json={
+                                          'src-start': '1',
+                                          'src-end': '1',
+                                          'dst-start': '2',
+                                          'dst-end': '2'
+                                      })
+    assert response.status_code == 200
+
+    with app.app_context():
+        with get_session() as session:
+            # products of the second day are planned for the first day too
+            assert session.query(MealRecord).filter(MealRecord.trip_id == 1).count() == \
+                records_count + 14 - 8
+            cereal = session.query(MealRecord).filter(MealRecord.trip_id == 1,
+                                                      MealRecord.day_number == 2,
+                                                      MealRecord.meal_number == 0,
+                                                      MealRecord.product_id == 1).one()
+            assert cereal.mass == 120
+            assert not find_inconsistent_trips(session)
+
+
+def test_meals_cycle_cycles_multiple_ranges(org_logged_client: FlaskClient):
+    with org_logged_client.application.app_context():
+        with get_session() as session:
+            session.query(MealRecord).filter(MealRecord.day_number > 2).delete()
+            session.commit()
+
+    response = org_logged_client.post('/api/meals/uid1/cycle',
+                                      json={
+                                          'src-start': '1',
+                                          'src-end': '2',
+                                          'dst-ranges': [
+                                              {'start': '3', 'end': '3'},
+                                              {'start': '4', 'end': '5'},
+                                          ]
+                                      })
+    assert response.status_code == 200
+
+    with org_logged_client.application.app_context():
+        with get_session() as session:
+            def day_products(day_number):
+                return [record.product_id for record in session.query(MealRecord).filter(
+                    MealRecord.trip_id == 1,
+                    MealRecord.day_number == day_number).order_by(MealRecord.id)]
+
+            assert day_products(3) == day_products(1)
+            assert day_products(4) == day_products(1)
+            assert day_products(5) == day_products(2)
+            assert response.json == {
+                'result': 'ok',
+                'inserted': 2 * len(day_products(1)) + len(day_products(2))
+            }
+
+
+def test_meals_cycle_rejects_overlapping_destinations(org_logged_client: FlaskClient):
+    response = org_logged_client.post('/api/meals/uid1/cycle',
+                                      json={
+                                          'src-start': '1',
+                                          'src-end': '1',
+                                          'dst-ranges': [
+                                              {'start': '2', 'end': '4'},
+                                              {'start': '3', 'end': '5'},
+                                          ]
+                                      })
+    assert response.status_code == 400
+
+
+def test_meals_cycle_updates_trip(org_logged_client: FlaskClient, app: Flask):
+    with app.app_context():
+        with get_session() as session:
+            trip = session.query(Trip).filter(Trip.uid == 'uid1').one()
+            last_update = trip.last_update
+
+    response = org_logged_client.post('/api/meals/uid1/cycle',
+                                      json={
+                                          'src-start': '1',
+                                          'src-end': '1',
+                                          'dst-start': '2',
+                                          'dst-end': '2'
+                                      })
+    assert response.status_code == 200
+
+    with app.app_context():
+        with get_session() as session:
+            trip = session.query(Trip).filter(Trip.uid == 'uid1').one()
+            assert trip.last_update != last_update
+
+
 def test_meals_cycle_rejects_overlapping_ranges(org_logged_client: FlaskClient):
     response = org_logged_client.post('/api/meals/uid1/cycle',
                                       json={
@@ -899,3 +1067,280 @@ def test_meals_cycle_rejects_incorrect_days(org_logged_client: FlaskClient, data
 def test_meals_cycle_rejects_missing_data(org_logged_client: FlaskClient, data):
     response = org_logged_client.post('/api/meals/uid1/cycle', json=data)
     assert response.status_code == 400
+
+
+def test_get_totals_rejects_not_logged_in(client: FlaskClient):
+    response = client.get('/api/meals/uid1/totals')
+    assert response.status_code == 401
+
+
+def test_get_totals_rejects_non_existing_trip(org_logged_client: FlaskClient):
+    response = org_logged_client.get('/api/meals/uid100/totals')
+    assert response.status_code == 404
+
+
+def test_get_totals_match_meals(org_logged_client: FlaskClient):
+    meals = org_logged_client.get('/api/meals/uid1')
+    totals = org_logged_client.get('/api/meals/uid1/totals')
+    assert totals.status_code == 200
+    assert meals.json and totals.json
+    assert len(totals.json['days']) == 5
+
+    for day, day_totals in zip(meals.json['days'], totals.json['days']):
+        assert day['number'] == day_totals['number']
+        for meal_name, records in day['meals'].items():
+            for column in ['calories', 'proteins', 'fats', 'carbs', 'mass']:
+                expected = sum(record[column] for record in records)
+                assert day_totals['meals'][meal_name][column] == pytest.approx(expected)
+
+    assert totals.json['days'][3]['total']['mass'] == 0
+
+
+def test_meal_changes_keep_totals_consistent(org_logged_client: FlaskClient, app: Flask):
+    org_logged_client.post('/api/meals/add', json={
+        'trip_uid': 'uid1',
+        'meal_name': 'lunch',
+        'day_number': 4,
+        'mass': 100,
+        'unit': Units.GRAMMS.value,
+        'product_id': 3,
+    })
+    org_logged_client.post('/api/meals/add', json={
+        'trip_uid': 'uid1',
+        'meal_name': 'breakfast',
+        'day_number': 1,
+        'mass': 3,
+        'unit': Units.PIECES.value,
+        'product_id': 9,
+    })
+    org_logged_client.post('/api/meals/edit', json={'meal_id': 1, 'mass': 10, 'unit': 0})
+    org_logged_client.delete('/api/meals/remove', json={'meal_id': 2})
+    org_logged_client.post('/api/meals/clear', json={'trip_uid': 'uid1', 'day_number': 2})
+    org_logged_client.post('/api/meals/uid1/cycle', json={
+        'src-start': '4',
+        'src-end': '4',
+        'dst-start': '5',
+        'dst-end': '5',
+        'overwrite': True
+    })
+    response = org_logged_client.post('/api/trips/copy/uid1', json={'name': 'Copy'})
+    assert response.status_code == 200
+
+    with app.app_context():
+        with get_session() as session:
+            assert not find_inconsistent_trips(session)
+
+    response = org_logged_client.get('/api/meals/uid1/totals')
+    assert response.json
+    assert response.json['days'][4]['total']['mass'] == 100
+
+
+def test_pieces_of_fractional_grams_keep_totals_consistent(org_logged_client: FlaskClient, app: Flask):
+    # a piece of the product weighs 5.5 grams
+    org_logged_client.post('/api/meals/add', json={
+        'trip_uid': 'uid1',
+        'meal_name': 'breakfast',
+        'day_number': 1,
+        'mass': 5,
+        'unit': Units.PIECES.value,
+        'product_id': 9,
+    })
+    response = org_logged_client.post('/api/meals/uid1/batch', json={'operations': [
+        {'op': 'add', 'meal_name': 'lunch', 'day_number': 1, 'mass': 3,
+         'unit': Units.PIECES.value, 'product_id': 9},
+    ]})
+    assert response.json
+    assert response.json['result'] is True
+
+    with app.app_context():
+        with get_session() as session:
+            masses = session.execute(
+                select(MealRecord.mass)
+                .where(MealRecord.trip_id == 1, MealRecord.day_number == 1, MealRecord.product_id == 9)
+                .order_by(MealRecord.meal_number)
+            ).scalars().all()
+            assert masses[0] == 27
+            assert all(isinstance(mass, int) for mass in masses)
+            assert not find_inconsistent_trips(session)
+
+
+def test_get_trip_meals_supports_conditional_requests(org_logged_client: FlaskClient):
+    response = org_logged_client.get('/api/meals/uid1')
+    assert response.status_code == 200
+    assert response.headers['ETag']
+    assert response.headers['Last-Modified']
+    etag = response.headers['ETag']
+
+    response = org_logged_client.get('/api/meals/uid1', headers={'If-None-Match': etag})
+    assert response.status_code == 304
+    assert not response.data
+
+    response = org_logged_client.get('/api/meals/uid1/1', headers={'If-None-Match': etag})
+    assert response.status_code == 200
+
+
+def test_get_trip_meals_etag_changes_after_meal_change(org_logged_client: FlaskClient):
+    etag = org_logged_client.get('/api/meals/uid1').headers['ETag']
+
+    org_logged_client.post('/api/meals/clear', json={'trip_uid': 'uid1', 'day_number': 1})
+
+    response = org_logged_client.get('/api/meals/uid1', headers={'If-None-Match': etag})
+    assert response.status_code == 200
+    assert response.headers['ETag'] != etag
+
+
+def test_get_trip_meals_etag_changes_after_product_change(admin_logged_client: FlaskClient):
+    etag = admin_logged_client.get('/api/meals/uid1').headers['ETag']
+
+    admin_logged_client.post('/api/products/1/archive')
+
+    response = admin_logged_client.get('/api/meals/uid1', headers={'If-None-Match': etag})
+    assert response.status_code == 200
+
+
+def test_meals_batch_rejects_not_logged_in(client: FlaskClient):
+    response = client.post('/api/meals/uid1/batch', json={'operations': []})
+    assert response.status_code == 401
+
+
+def test_meals_batch_rejects_non_shared_trip(org_logged_client: FlaskClient):
+    response = org_logged_client.post('/api/meals/uid3/batch', json={'operations': []})
+    assert response.status_code == 403
+
+
+def test_meals_batch_rejects_non_existing_trip(org_logged_client: FlaskClient):
+    response = org_logged_client.post('/api/meals/uid100/batch', json={'operations': []})
+    assert response.status_code == 404
+
+
+def test_meals_batch_rejects_invalid_body(org_logged_client: FlaskClient):
+    response = org_logged_client.post('/api/meals/uid1/batch', json={'operations': 'add'})
+    assert response.status_code == 400
+
+
+def test_meals_batch_rejects_array_body(org_logged_client: FlaskClient):
+    response = org_logged_client.post('/api/meals/uid1/batch', json=[{'op': 'remove', 'meal_id': 1}])
+    assert response.status_code == 400
+
+
+def test_meals_batch_merges_adds_with_edits(app: Flask, org_logged_client: FlaskClient):
+    with app.app_context():
+        with get_session() as session:
+            cereal, mango = session.execute(
+                select(MealRecord.id)
+                .where(MealRecord.trip_id == 1, MealRecord.day_number == 1)
+                .where(MealRecord.product_id.in_([1, 2]))
+                .order_by(MealRecord.product_id)
+            ).scalars().all()
+
+    response = org_logged_client.post('/api/meals/uid1/batch', json={'operations': [
+        {'op': 'edit', 'meal_id': cereal, 'mass': 10, 'unit': Units.GRAMMS.value},
+        {'op': 'add', 'meal_name': 'breakfast', 'day_number': 1, 'mass': 40,
+         'unit': Units.GRAMMS.value, 'product_id': 1},
+        {'op': 'add', 'meal_name': 'breakfast', 'day_number': 1, 'mass': 40,
+         'unit': Units.GRAMMS.value, 'product_id': 2},
+        {'op': 'edit', 'meal_id': mango, 'mass': 15, 'unit': Units.GRAMMS.value},
+    ]})
+    assert response.json
+    assert response.json['result'] is True
+    assert [result.get('meal_id') for result in response.json['operations']] == [None, cereal, mango, None]
+
+    with app.app_context():
+        with get_session() as session:
+            assert session.get(MealRecord, cereal).mass == 50
+            assert session.get(MealRecord, mango).mass == 15
+            assert find_inconsistent_trips(session) == []
+
+
+def test_meals_batch_applies_operations(app: Flask, org_logged_client: FlaskClient):
+    with app.app_context():
+        with get_session() as session:
+            last_update = session.query(Trip.last_update).filter(Trip.uid == 'uid1').scalar()
+            cereal, mango, cheese = session.execute(
+                select(MealRecord.id)
+                .where(MealRecord.trip_id == 1, MealRecord.day_number == 1)
+                .where(MealRecord.product_id.in_([1, 2, 3]))
+                .order_by(MealRecord.product_id)
+            ).scalars().all()
+
+    response = org_logged_client.post('/api/meals/uid1/batch', json={'operations': [
+        {'op': 'add', 'meal_name': 'lunch', 'day_number': 4, 'mass': 2,
+         'unit': Units.PIECES.value, 'product_id': 9},
+        {'op': 'add', 'meal_name': 'breakfast', 'day_number': 1, 'mass': 40,
+         'unit': Units.GRAMMS.value, 'product_id': 1},
+        {'op': 'edit', 'meal_id': mango, 'mass': 25, 'unit': Units.GRAMMS.value},
+        {'op': 'remove', 'meal_id': cheese},
+    ]})
+    assert response.status_code == 200
+    assert response.json
+    assert response.json['result'] is True
+    results = response.json['operations']
+    assert [result['result'] for result in results] == [True] * 4
+    assert results[1]['meal_id'] == cereal
+
+    with app.app_context():
+        with get_session() as session:
+            added = session.get(MealRecord, results[0]['meal_id'])
+            assert added
+            assert added.day_number == 4
+            assert added.meal_number == 1
+            assert added.mass == 11
+            assert session.get(MealRecord, cereal).mass == 100
+            assert session.get(MealRecord, mango).mass == 25
+            assert session.get(MealRecord, cheese) is None
+            assert session.query(Trip.last_update).filter(Trip.uid == 'uid1').scalar() > last_update
+            assert find_inconsistent_trips(session) == []
+
+
+def test_meals_batch_applies_nothing_on_invalid_operation(app: Flask, org_logged_client: FlaskClient):
+    response = org_logged_client.post('/api/meals/uid1/batch', json={'operations': [
+        {'op': 'remove', 'meal_id': 1},
+        {'op': 'add', 'meal_name': 'lunch', 'day_number': 10, 'mass': 20,
+         'unit': Units.GRAMMS.value, 'product_id': 1},
+        {'op': 'edit', 'meal_id': 2, 'mass': 2, 'unit': Units.PIECES.value},
+        {'op': 'remove', 'meal_id': 1000},
+        {'op': 'rename'},
+    ]})
+    assert response.status_code == 200
+    assert response.json
+    assert response.json['result'] is False
+    assert [result['result'] for result in response.json['operations']] == [
+        True, False, False, False, False
+    ]
+
+    with app.app_context():
+        with get_session() as session:
+            assert session.get(MealRecord, 1)
+            assert session.get(MealRecord, 2).mass == 50
+
+
+def test_meals_endpoints_fit_query_budget(org_logged_client: FlaskClient, query_budget):
+    # auth and conditional GET checks are included
+    with query_budget(6):
+        org_logged_client.get('/api/meals/uid1')
+        org_logged_client.get('/api/meals/uid1/2')
+        org_logged_client.get('/api/meals/uid1/totals')
+        org_logged_client.post('/api/meals/add', json={
+            'trip_uid': 'uid1',
+            'meal_name': 'lunch',
+            'day_number': 4,
+            'mass': 100,
+            'unit': Units.GRAMMS.value,
+            'product_id': 3,
+        })
+
+
+def test_meals_add_fits_query_budget(org_logged_client: FlaskClient, query_budget):
+    json = {
+        'trip_uid': 'uid1',
+        'meal_name': 'lunch',
+        'day_number': 4,
+        'mass': 100,
+        'unit': Units.GRAMMS.value,
+        'product_id': 3,
+    }
+    # loads the catalogue
+    org_logged_client.post('/api/meals/add', json=json)
+    with query_budget(5):
+        response = org_logged_client.post('/api/meals/add', json=json)
+    assert response.json == {'result': True}
@@ -120,6 +120,73 @@ def test_api_search_searches(org_logged_client: FlaskClient):
     assert any(map(lambda x: 'jerk' in x['name'], result.json['products']))
 
 
+def test_api_search_pages_with_cursor(org_logged_client: FlaskClient):
+    result = org_logged_client.get('/api/products/search')
+    assert result.json
+    assert result.json['next']
+    names = [product['name'] for product in result.json['products']]
+
+    result = org_logged_client.get('/api/products/search',
+                                   query_string={'after': result.json['next']})
+    assert result.status_code == 200
+    assert result.json
+    assert result.json['next'] is None
+    names += [product['name'] for product in result.json['products']]
+
+    assert len(names) == 14
+    assert len(set(names)) == 14
+
+
+def test_api_search_rejects_incorrect_cursor(org_logged_client: FlaskClient):
+    result = org_logged_client.get('/api/products/search',
+                                   query_string={'after': 'something'})
+    assert result.status_code == 400
+
+
+def test_api_search_ranks_prefix_matches_first(org_logged_client: FlaskClient):
+    result = org_logged_client.get('/api/products/search',
+                                   query_string={'search': 'ch'})
+    assert result.status_code == 200
+    assert result.json
+    names = [product['name'] for product in result.json['products']]
+    assert names == ['Chicken pate', 'Chicken jerk', 'Chocolate',
+                     'Cream cheese', 'Borsch concentrate']
+
+
+def test_api_search_ranks_non_ascii_prefix_matches_first(org_logged_client: FlaskClient):
+    for name in ('Плавленый Сыр', 'Сыр плавленый'):
+        org_logged_client.post('/api/products/add',
+                               json={'name': name, 'calories': 300, 'proteins': 20, 'fats': 25, 'carbs': 2})
+
+    result = org_logged_client.get('/api/products/search',
+                                   query_string={'search': 'Сыр'})
+    assert result.status_code == 200
+    assert result.json
+    names = [product['name'] for product in result.json['products']]
+    assert names == ['Сыр плавленый', 'Плавленый Сыр']
+
+
+def test_api_search_count_is_updated_after_add(org_logged_client: FlaskClient):
+    result = org_logged_client.get('/api/products/search',
+                                   query_string={'search': 'Mango'})
+    assert result.json
+    assert result.json['total_count'] == 1
+
+    org_logged_client.post('/api/products/add',
+                           json={
+                               'name': 'Mango juice',
+                               'calories': 50,
+                               'proteins': 1,
+                               'fats': 1,
+                               'carbs': 10
+                           })
+
+    result = org_logged_client.get('/api/products/search',
+                                   query_string={'search': 'Mango'})
+    assert result.json
+    assert result.json['total_count'] == 2
+
+
 def test_api_add_rejects_not_logged_in(client: FlaskClient):
     result = client.post('/api/products/add')
     assert result.status_code == 401
@@ -38,6 +38,44 @@ def test_shopping_shows_non_shared_trip(org_logged_client: FlaskClient):
     assert response.json[0]["name"] == "Multigrain cereal"
 
 
+def test_shopping_combines_several_trips(org_logged_client: FlaskClient):
+    response = org_logged_client.get("/api/reports/shopping/uid1?trips=uid3")
+    assert response.status_code == 200
+    assert response.json
+    assert len(response.json) == 14
+    assert response.json[0]["id"] == 1
+    assert response.json[0]["mass"] == 1200 + 60
+    assert response.json[8]["id"] == 2
+    assert response.json[8]["mass"] == 100
+
+
+def test_shopping_ignores_duplicated_trips(org_logged_client: FlaskClient):
+    response = org_logged_client.get("/api/reports/shopping/uid1?trips=uid1")
+    assert response.status_code == 200
+    assert response.json
+    assert response.json[0]["mass"] == 1200
+
+
+def test_shopping_returns_404_on_invalid_additional_trip(org_logged_client: FlaskClient):
+    response = org_logged_client.get("/api/reports/shopping/uid1?trips=uid3,uid100")
+    assert response.status_code == 404
+
+
+def test_shopping_etag_depends_on_all_trips(org_logged_client: FlaskClient):
+    response = org_logged_client.get("/api/reports/shopping/uid1?trips=uid2")
+    etag = response.headers["ETag"]
+
+    response = org_logged_client.get("/api/reports/shopping/uid1?trips=uid2",
+                                     headers={"If-None-Match": etag})
+    assert response.status_code == 304
+
+    org_logged_client.post("/api/meals/clear", json={"trip_uid": "uid2", "day_number": 1})
+
+    response = org_logged_client.get("/api/reports/shopping/uid1?trips=uid2",
+                                     headers={"If-None-Match": etag})
+    assert response.status_code == 200
+
+
 def test_packing_rejects_not_logged_in(client: FlaskClient):
     response = client.get("/api/reports/packing/uid1")
     assert response.status_code == 401
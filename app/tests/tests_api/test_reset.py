@@ -73,7 +73,7 @@ def test_reset_removes_link(client: FlaskClient):
             assert not link
 
 
-def test_reset_removes_other_dead_links(client: FlaskClient):
+def test_reset_leaves_dead_links_to_cleanup(client: FlaskClient):
     uuid = uuid4()
     with client.application.app_context():
         with get_session() as session:
@@ -91,8 +91,7 @@ def test_reset_removes_other_dead_links(client: FlaskClient):
 
     with client.application.app_context():
         with get_session() as session:
-            link = session.query(PasswordLink).all()
-            assert not link
+            assert session.query(PasswordLink).count() == 3
 
 
 def test_reset_rejects_expired_link(client: FlaskClient):
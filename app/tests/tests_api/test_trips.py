@@ -1,10 +1,14 @@
+import io
+import json
+import zipfile
 from datetime import date, datetime, timedelta, timezone
 
 from flask.testing import FlaskClient
 import pytest
+from sqlalchemy import event
 
-from organizer.db import get_session
-from organizer.schema import SharingLink, Trip, TripAccess, MealRecord
+from organizer.db import get_engine, get_session
+from organizer.schema import Group, SharingLink, Trip, TripAccess, MealRecord
 from organizer.strings import STRING_TABLE
 
 
@@ -55,6 +59,60 @@ def test_can_get_shared_trips(org_logged_client: FlaskClient):
     assert response.json[1]['uid'] == 'uid3'
 
 
+def count_trips_list_queries(client: FlaskClient):
+    statements = []
+
+    def record(conn, cursor, statement, *args):
+        statements.append(statement)
+
+    with client.application.app_context():
+        engine = get_engine()
+
+    event.listen(engine, 'before_cursor_execute', record)
+    try:
+        response = client.get('/api/trips/')
+    finally:
+        event.remove(engine, 'before_cursor_execute', record)
+
+    assert response.status_code == 200
+    return len(statements), len(response.json)
+
+
+def add_trips(client: FlaskClient, count: int, shared_count: int):
+    with client.application.app_context():
+        with get_session() as session:
+            for i in range(count + shared_count):
+                trip = Trip(uid=f'bench{i}', name=f'Bench {i}',
+                            from_date=date(2020, 1, 1), till_date=date(2020, 1, 10),
+                            created_by=2 if i < count else 1)
+                trip.groups.append(Group(group_number=0, persons=2))
+                trip.groups.append(Group(group_number=1, persons=3))
+                session.add(trip)
+                session.flush()
+                if i >= count:
+                    session.add(TripAccess(trip_id=trip.id, user_id=2))
+            session.commit()
+
+
+def test_trips_list_query_count_does_not_depend_on_trips_count(org_logged_client: FlaskClient):
+    org_logged_client.get('/api/trips/')
+
+    few_queries, few_trips = count_trips_list_queries(org_logged_client)
+    add_trips(org_logged_client, 30, 10)
+    many_queries, many_trips = count_trips_list_queries(org_logged_client)
+
+    assert many_trips == few_trips + 40
+    assert many_queries == few_queries
+
+
+def test_trips_list_returns_own_trips_before_shared(org_logged_client: FlaskClient):
+    add_trips(org_logged_client, 2, 2)
+
+    response = org_logged_client.get('/api/trips/')
+    assert response.json
+    assert [trip['type'] for trip in response.json] == ['user'] * 3 + ['shared'] * 2
+
+
 def test_trips_returns_correct_data_for_admin(admin_logged_client: FlaskClient):
     response = admin_logged_client.get('/api/trips/')
     assert response.status_code == 200
@@ -584,6 +642,40 @@ def test_trips_download_returns_empty_csv(admin_logged_client: FlaskClient):
     ])
 
 
+def test_trips_download_returns_json_lines(org_logged_client: FlaskClient):
+    response = org_logged_client.get('/api/trips/download/uid1?format=jsonl')
+    assert response.status_code == 200
+    assert response.mimetype == 'application/x-ndjson'
+
+    records = [json.loads(line) for line in response.data.decode('utf-8').splitlines()]
+    assert len(records) == 38
+    assert {
+        'name': 'Multigrain cereal',
+        'day': 3,
+        'meal': STRING_TABLE['Meals breakfast title'],
+        'mass': 60,
+        'calories': 362.0,
+    } in records
+
+
+def test_trips_download_returns_xlsx(org_logged_client: FlaskClient):
+    response = org_logged_client.get('/api/trips/download/uid3?format=xlsx')
+    assert response.status_code == 200
+    assert 'data.xlsx' in response.headers['Content-Disposition']
+
+    with zipfile.ZipFile(io.BytesIO(response.data)) as archive:
+        assert '[Content_Types].xml' in archive.namelist()
+        sheet = archive.read('xl/worksheets/sheet1.xml').decode('utf-8')
+    assert sheet.count('<row>') == 2
+    assert '<t>Multigrain cereal</t>' in sheet
+    assert '<v>60</v>' in sheet
+
+
+def test_trips_download_rejects_unknown_format(org_logged_client: FlaskClient):
+    response = org_logged_client.get('/api/trips/download/uid1?format=pdf')
+    assert response.status_code == 400
+
+
 def test_trips_download_returns_404_for_non_existing_trip(org_logged_client: FlaskClient):
     response = org_logged_client.get('/api/trips/download/uid42')
     assert response.status_code == 404
@@ -629,3 +721,41 @@ def test_trips_can_copy(org_logged_client: FlaskClient):
             old_records = session.query(MealRecord).where(MealRecord.trip_id == 1).all()
             new_records = session.query(MealRecord).where(MealRecord.trip_id == 4).all()
             assert len(old_records) == len(new_records)
+
+
+def test_trips_copy_copies_large_trip(admin_logged_client: FlaskClient):
+    with admin_logged_client.application.app_context():
+        with get_session() as session:
+            trip = Trip(uid='large', name='Large trip',
+                        from_date=date(2020, 1, 1), till_date=date(2020, 1, 30),
+                        created_by=1)
+            trip.groups.append(Group(group_number=3, persons=4))
+            trip.groups.append(Group(group_number=5, persons=1))
+            session.add(trip)
+            session.flush()
+            session.execute(MealRecord.__table__.insert(), [
+                {'trip_id': trip.id, 'product_id': 1 + i % 14, 'day_number': 1 + i // 28,
+                 'meal_number': i % 4, 'mass': i}
+                for i in range(30 * 28)
+            ])
+            session.commit()
+            source_id = trip.id
+
+    response = admin_logged_client.post('/api/trips/copy/large', json={'name': 'Copy'})
+    assert response.status_code == 200
+    assert response.json
+    assert response.json['trip']['groups'] == [4, 1]
+
+    with admin_logged_client.application.app_context():
+        with get_session() as session:
+            new_trip = session.query(Trip).where(Trip.uid == response.json['uid']).one()
+            assert [group.group_number for group in new_trip.groups] == [0, 1]
+
+            def records(trip_id):
+                return session.query(MealRecord.product_id, MealRecord.day_number,
+                                     MealRecord.meal_number, MealRecord.mass) \
+                              .where(MealRecord.trip_id == trip_id) \
+                              .order_by(MealRecord.id).all()
+
+            assert len(records(new_trip.id)) == 30 * 28
+            assert records(new_trip.id) == records(source_id)
@@ -245,3 +245,50 @@ def test_edit_rejects_incorrect_data(admin_logged_client: FlaskClient, json_data
             user = session.query(User).where(User.id == 1).first()
             assert user
             assert user.access_group == AccessGroup.Administrator
+
+
+def test_edit_user_applies_new_access_group_immediately(admin_logged_client: FlaskClient):
+    response = admin_logged_client.get("/api/users/")
+    assert response.status_code == 200
+
+    response = admin_logged_client.put(
+        "/api/users/1",
+        json={
+            "access_group": AccessGroup.User.name,
+        },
+    )
+    assert response.status_code == 200
+
+    response = admin_logged_client.get("/api/users/")
+    assert response.status_code == 403
+
+
+def test_logged_in_user_is_cached(org_logged_client: FlaskClient):
+    response = org_logged_client.get("/api/auth/user")
+    assert response.status_code == 200
+
+    with org_logged_client.application.app_context():
+        with get_session() as session:
+            user = session.query(User).where(User.login == "Organizer").one()
+            user.displayed_name = "Changed name"
+            session.commit()
+
+    response = org_logged_client.get("/api/auth/user")
+    assert response.status_code == 200
+    assert response.json
+    assert response.json["displayed_name"] is None
+
+
+def test_administrator_is_not_cached(admin_logged_client: FlaskClient):
+    response = admin_logged_client.get("/api/users/")
+    assert response.status_code == 200
+
+    # demoted by another worker, its cache can't be invalidated from here
+    with admin_logged_client.application.app_context():
+        with get_session() as session:
+            user = session.query(User).where(User.login == "Administrator").one()
+            user.access_group = AccessGroup.User
+            session.commit()
+
+    response = admin_logged_client.get("/api/users/")
+    assert response.status_code == 403